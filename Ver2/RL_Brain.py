@@ -1,13 +1,173 @@
 """
 As the filename, this script implement an Reinforment Learning brain.
 """
+import os
 import sys
+import json
+import time
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import numpy as np
 from collections import deque
 
+
+class ReplayMemory(object):
+    """
+    Ring buffer of experiences (s, a, r, s_) stored in preallocated typed columns:
+        states, nextStates: float32, capacity x nStates
+        actions: int8
+        rewards: float32
+    The columns are torch tensors and store() writes in place through numpy views of the same memory, so no 
+    float64 row nor temporary array is built per experience. 
+    sample() gathers the selected rows directly into reusable torch tensors (pinned if pinMemory), ready for the 
+    network. The returned tensors are overwritten by the next sample().
+    shareMemory puts the columns in shared memory so that they can be handed to other processes.
+    save() / load() store the columns as .npy files of a directory. load() can memory-map them instead of reading
+    them, the rows are then only read from disk when sampled.
+    """
+    columnNames = ["states", "actions", "rewards", "nextStates"]
+
+    def __init__(self, capacity, nStates, shareMemory=False, pinMemory=False):
+        self.capacity = int(capacity)
+        self.nStates = nStates
+        self.counter = 0 # experiences stored so far
+
+        self.states = torch.zeros((self.capacity, nStates), dtype=torch.float32)
+        self.actions = torch.zeros(self.capacity, dtype=torch.int8)
+        self.rewards = torch.zeros(self.capacity, dtype=torch.float32)
+        self.nextStates = torch.zeros((self.capacity, nStates), dtype=torch.float32)
+        if shareMemory:
+            for column in [self.states, self.actions, self.rewards, self.nextStates]:
+                column.share_memory_()
+
+        # numpy views, for in place writes
+        self._states = self.states.numpy()
+        self._actions = self.actions.numpy()
+        self._rewards = self.rewards.numpy()
+        self._nextStates = self.nextStates.numpy()
+
+        # output buffers of sample()
+        self._batchSize = 0
+        self.pinMemory = pinMemory
+
+    def store(self, s, a, r, s_):
+        storageAddr = self.counter % self.capacity
+        self._states[storageAddr] = s
+        self._actions[storageAddr] = a
+        self._rewards[storageAddr] = r
+        self._nextStates[storageAddr] = s_
+        self.counter += 1
+
+    def size(self):
+        return min(self.capacity, self.counter)
+
+    def save(self, dirname):
+        """write the columns and the counter to dirname"""
+        os.makedirs(dirname, exist_ok=True)
+        for name in ReplayMemory.columnNames:
+            # to a new file first: a memory mapped by load() keeps reading the file it was loaded from
+            filename = os.path.join(dirname, name + ".npy")
+            np.save(filename + ".tmp.npy", getattr(self, "_" + name))
+            os.replace(filename + ".tmp.npy", filename)
+        with open(os.path.join(dirname, "memory.json"), "w") as f:
+            json.dump({"capacity": self.capacity, "nStates": self.nStates, "counter": self.counter}, f)
+
+    def load(self, dirname, mmapMode="c"):
+        """
+        replace the experiences (and capacity) by the ones saved in dirname.
+        mmapMode: "c" maps the files copy on write, new experiences never reach the files. "r+" writes them to
+                  the files. None reads the files into memory
+        """
+        assert mmapMode in {None, "c", "r+"}, "mmapMode should be None, c or r+"
+        with open(os.path.join(dirname, "memory.json")) as f:
+            info = json.load(f)
+        assert info["nStates"] == self.nStates, "the saved memory has states of dimension {}".format(info["nStates"])
+
+        self.capacity = info["capacity"]
+        for name in ReplayMemory.columnNames:
+            column = np.load(os.path.join(dirname, name + ".npy"), mmap_mode=mmapMode)
+            setattr(self, "_" + name, column)
+            setattr(self, name, torch.from_numpy(column))
+        self.counter = info["counter"]
+
+    def sample(self, idxs):
+        """return states, actions (int64, n x 1), rewards (n x 1) and nextStates of the experiences at idxs"""
+        batchSize = len(idxs)
+        if batchSize > self._batchSize:
+            self._allocBatch(batchSize)
+        idxs = torch.from_numpy(np.asarray(idxs, dtype=np.int64))
+
+        states = torch.index_select(self.states, 0, idxs, out=self._batchStates[:batchSize])
+        actions = self._batchActions[:batchSize].copy_(self.actions[idxs].view(-1, 1))
+        rewards = torch.index_select(self.rewards, 0, idxs, out=self._batchRewards[:batchSize]).view(-1, 1)
+        nextStates = torch.index_select(self.nextStates, 0, idxs, out=self._batchNextStates[:batchSize])
+        return states, actions, rewards, nextStates
+
+    def _allocBatch(self, batchSize):
+        self._batchSize = batchSize
+        self._batchStates = torch.zeros((batchSize, self.nStates), dtype=torch.float32)
+        self._batchActions = torch.zeros((batchSize, 1), dtype=torch.int64)
+        self._batchRewards = torch.zeros(batchSize, dtype=torch.float32)
+        self._batchNextStates = torch.zeros((batchSize, self.nStates), dtype=torch.float32)
+        if self.pinMemory:
+            self._batchStates = self._batchStates.pin_memory()
+            self._batchActions = self._batchActions.pin_memory()
+            self._batchRewards = self._batchRewards.pin_memory()
+            self._batchNextStates = self._batchNextStates.pin_memory()
+
+
+class SharedReplayMemory(ReplayMemory):
+    """
+    ReplayMemory in shared memory, written by several processes (e.g. simulation actors) and sampled by another one
+    (a learner), see actorLearner.py. The counter is shared as well, writers reserve their rows under lock
+    (a multiprocessing lock of the context the processes are started with). The rows are written before the
+    counter moves, but sample() does not take the lock: once the ring buffer wraps around, a sampled row may be
+    overwritten at the same time.
+    Hand it to the processes of a torch.multiprocessing context, the columns are then shared instead of copied.
+    """
+
+    def __init__(self, capacity, nStates, lock):
+        self.sharedCounter = torch.zeros(1, dtype=torch.int64).share_memory_()
+        self.lock = lock
+        super(SharedReplayMemory, self).__init__(capacity, nStates, shareMemory=True)
+
+    @property
+    def counter(self):
+        return int(self.sharedCounter[0])
+
+    @counter.setter
+    def counter(self, value):
+        self.sharedCounter[0] = value
+
+    def store(self, s, a, r, s_):
+        self.storeMany([s], [a], [r], [s_])
+
+    def storeMany(self, states, actions, rewards, nextStates):
+        """store a block of experiences under one lock"""
+        with self.lock:
+            counter = self.counter
+            storageAddrs = (counter + np.arange(len(actions))) % self.capacity
+            self._states[storageAddrs] = states
+            self._actions[storageAddrs] = actions
+            self._rewards[storageAddrs] = rewards
+            self._nextStates[storageAddrs] = nextStates
+            self.counter = counter + len(actions)
+
+    def __getstate__(self):
+        # the tensors are pickled as handles to the shared memory, the numpy views and sample buffers are rebuilt
+        state = {key: val for key, val in self.__dict__.items() if not key.startswith("_")}
+        state["_batchSize"] = 0
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._states = self.states.numpy()
+        self._actions = self.actions.numpy()
+        self._rewards = self.rewards.numpy()
+        self._nextStates = self.nextStates.numpy()
+
+
 class DQN(object):
 
     def __init__(self, 
@@ -26,6 +186,8 @@ class DQN(object):
         weight_decay=0.995,
         epsilon_decay=0.99,  
         verbose=False,
+        rng=None,               # source of the exploration and of the replay sampling, a np.random.RandomState. Default the global numpy RNG
+        memory=None,            # ReplayMemory to learn from (e.g. a SharedReplayMemory). Default a new one of memoryCapacity
         ):
 
         self.nActions = nActions
@@ -54,9 +216,11 @@ class DQN(object):
         self.updateFrequencyFinal = updateFrequency # how often to update the network parameter
         self.updateFrequencyCur = self.updateFrequencyFinal/2
 
-        self.memoryCounter = 0  # experience pieces
-        self.memoryCapacity = int(memoryCapacity)
-        self.memory = np.zeros((self.memoryCapacity, nStates*2+2)) # storing [curState, action, reward, nextState], so nStates*2 + 2
+        # storing [curState, action, reward, nextState]
+        if memory is None:
+            memory = ReplayMemory(int(memoryCapacity), nStates, pinMemory=(deviceStr.startswith("cuda")))
+        self.memory = memory
+        self.memoryCapacity = self.memory.capacity
 
         # other input parameters
         self.epsilon_init = epsilon
@@ -70,6 +234,7 @@ class DQN(object):
         self.device = torch.device(deviceStr)
 
         self.verbose = verbose
+        self.rng = rng if rng is not None else np.random
 
         
 
@@ -78,8 +243,9 @@ class DQN(object):
         state = torch.unsqueeze(torch.FloatTensor(state), 0) # to vector
 
         # epsilon greedy
-        if evalOn or self.globalEvalOn or np.random.uniform() < self.epsilon:
-            actionRewards = self.evalNet.forward(state) # actionRewards if of shape 1 x nAction
+        if evalOn or self.globalEvalOn or self.rng.uniform() < self.epsilon:
+            with torch.no_grad():
+                actionRewards = self.evalNet.forward(state) # actionRewards if of shape 1 x nAction
             # print(actionRewards)
             # action = torch.argmax(actionRewards, 1)
             action = torch.max(actionRewards, 1)[1] # the [1] pointed to argmax
@@ -89,18 +255,81 @@ class DQN(object):
             # print(state)
             # print(actionRewards)
         else:
-            action = np.random.randint(0, self.nActions)
+            action = self.rng.randint(0, self.nActions)
         return action
+
+    def chooseActions(self, states, evalOn=False):
+        """
+        Batched version of chooseAction. states is a list of states (or an array of shape n x nStates).
+        Each row follows the epsilon greedy policy independently, and all greedy rows share one forward pass.
+        Returns an int array of n actions.
+        """
+        states = np.asarray(states, dtype=np.float32).reshape(-1, self.nStates)
+        numStates = states.shape[0]
+
+        # epsilon greedy, per row
+        if evalOn or self.globalEvalOn:
+            greedyMask = np.ones(numStates, dtype=bool)
+        else:
+            greedyMask = self.rng.uniform(size=numStates) < self.epsilon
+        actions = np.empty(numStates, dtype=np.int64)
+
+        exploreMask = ~greedyMask
+        if exploreMask.any(): # random actions only for the exploring rows, as chooseAction
+            actions[exploreMask] = self.rng.randint(0, self.nActions, size=int(exploreMask.sum()))
+        if greedyMask.any():
+            with torch.no_grad():
+                actionRewards = self.evalNet.forward(torch.from_numpy(states[greedyMask])) # of shape n x nAction
+            actions[greedyMask] = torch.max(actionRewards, 1)[1].cpu().numpy()
+        
+        return actions
     
     def storeExperience(self, s, a, r, s_):
-        experience = np.hstack((s, [a, r], s_))
-        storageAddr = self.memoryCounter % self.memoryCapacity
-        self.memory[storageAddr, :] = experience
-        self.memoryCounter += 1
+        self.memory.store(s, a, r, s_)
+
+    def save(self, dirname, saveMemory=True):
+        """
+        checkpoint of the training to dirname: evalNet, tgtNet, the state of the optimizer, the epsilon schedule,
+        the convergence status and, if saveMemory, the replay memory (in dirname/memory, see ReplayMemory.save)
+        """
+        os.makedirs(dirname, exist_ok=True)
+        torch.save({
+            "evalNet": self.evalNet.state_dict(),
+            "tgtNet": self.tgtNet.state_dict(),
+            "optimizer": self.optimizer.state_dict(),
+            "epsilon": self.epsilon,
+            "epsilon_init": self.epsilon_init,
+            "epsilon_decay": self.epsilon_decay,
+            "learningCounter": self.learningCounter,
+            "updateFrequencyCur": self.updateFrequencyCur,
+            "loss": float(self.loss),
+            "isConverge": self.isConverge,
+            "convergeCounter": self.convergeCounter,
+            }, os.path.join(dirname, "dqn.pt"))
+        if saveMemory:
+            self.memory.save(os.path.join(dirname, "memory"))
+
+    def load(self, dirname, loadMemory=True, mmapMode="c"):
+        """
+        warm start from a checkpoint of save(). The networks must have the structure of the saved ones.
+        loadMemory: also load the replay memory if the checkpoint has one, memory-mapped as mmapMode (see ReplayMemory.load)
+        """
+        checkpoint = torch.load(os.path.join(dirname, "dqn.pt"), map_location=self.device)
+        self.evalNet.load_state_dict(checkpoint["evalNet"])
+        self.tgtNet.load_state_dict(checkpoint["tgtNet"])
+        self.optimizer.load_state_dict(checkpoint["optimizer"])
+        for key in ["epsilon", "epsilon_init", "epsilon_decay", "learningCounter", "updateFrequencyCur", "loss", 
+            "isConverge", "convergeCounter"]:
+            setattr(self, key, checkpoint[key])
+
+        memoryDir = os.path.join(dirname, "memory")
+        if loadMemory and os.path.exists(memoryDir):
+            self.memory.load(memoryDir, mmapMode=mmapMode)
+            self.memoryCapacity = self.memory.capacity
     
     def learn(self):
         # check whether to update tgtNet
-        if self.memoryCounter <= 0:
+        if self.memory.counter <= 0:
             return
 
         # if self.learningCounter > self.updateFrequencyCur:
@@ -111,17 +340,13 @@ class DQN(object):
         self.learningCounter += 1
 
         # randomly sample $batch experiences 
-        availableExperiences = min(self.memoryCapacity, self.memoryCounter)
+        availableExperiences = self.memory.size()
 
-        sampleIdxs = np.random.choice(availableExperiences, min(availableExperiences, self.batchSize))
-        experiences = self.memory[sampleIdxs, :]
+        sampleIdxs = self.rng.choice(availableExperiences, min(availableExperiences, self.batchSize))
 
         # use the history state, history action, reward, and the ground truth new state
         # to train a regression network that predicts the reward correct.
-        states = torch.FloatTensor(experiences[:, :self.nStates])
-        actions = torch.LongTensor(experiences[:, self.nStates:self.nStates+1].astype(int))
-        rewards = torch.FloatTensor(experiences[:, self.nStates+1:self.nStates+2])
-        nextStates = torch.FloatTensor(experiences[:, -self.nStates:])
+        states, actions, rewards, nextStates = self.memory.sample(sampleIdxs)
 
 
         # q value based on evalNet
@@ -152,4 +377,86 @@ class DQN(object):
         # back propagation
         self.optimizer.zero_grad()
         loss.backward()
-        self.optimizer.step()
\ No newline at end of file
+        self.optimizer.step()
+
+
+class TrainScheduler(object):
+    """
+    Decides when a DQN runs a gradient step (DQN.learn), so that learning fidelity can be traded against 
+    simulation throughput.
+
+    mode:
+        "experience": one step per new experience until the network converges, 
+                      then one step every convergedPeriod experiences
+        "every":      one step every K new experiences
+        "tick":       stepsPerTick steps at the end of each tick
+        "budget":     at the end of each tick, steps as long as the time spent in learn() stays within 
+                      budget seconds per tick. Unused budget carries over for at most 10 ticks. 
+                      Depends on the wall clock, hence not reproducible.
+    """
+    modes = {"experience", "every", "tick", "budget"}
+
+    def __init__(self, brain, mode="experience", K=8, stepsPerTick=1, budget=1e-3, convergedPeriod=8):
+        assert mode in TrainScheduler.modes, "mode should be one of " + TrainScheduler.modes.__str__()
+        assert K >= 1 and stepsPerTick >= 0 and budget >= 0, "K >= 1, stepsPerTick >= 0 and budget >= 0 are required"
+        self.brain = brain
+        self.mode = mode
+        self.K = K
+        self.stepsPerTick = stepsPerTick
+        self.budget = budget
+        self.convergedPeriod = convergedPeriod
+
+        self.experienceCounter = 0
+        self.budgetLeft = 0
+
+        # performance check
+        self.learnSteps = 0
+        self.learnTime = 0 # seconds spent in brain.learn()
+        self.ticks = 0
+
+    def experienceAdded(self):
+        if self.mode == "experience":
+            if not self.brain.isConverge:
+                self._learn()
+            else:
+                self.experienceCounter += 1
+                if self.experienceCounter >= self.convergedPeriod:
+                    self.experienceCounter = 0
+                    self._learn()
+
+        elif self.mode == "every":
+            self.experienceCounter += 1
+            if self.experienceCounter >= self.K:
+                self.experienceCounter = 0
+                self._learn()
+
+    def tickEnded(self):
+        self.ticks += 1
+        if self.brain.memory.counter <= 0: # nothing to learn from
+            return
+
+        if self.mode == "tick":
+            for _ in range(self.stepsPerTick):
+                self._learn()
+
+        elif self.mode == "budget":
+            self.budgetLeft = min(self.budgetLeft + self.budget, 10 * self.budget)
+            while self.budgetLeft > 0:
+                self.budgetLeft -= self._learn()
+
+    def _learn(self):
+        startTime = time.perf_counter()
+        self.brain.learn()
+        duration = time.perf_counter() - startTime
+
+        self.learnSteps += 1
+        self.learnTime += duration
+        return duration
+
+    def getPerf(self):
+        return {
+            "learnSteps": self.learnSteps,
+            "learnTime": self.learnTime,
+            "learnStepsPerSec": self.learnSteps / self.learnTime if self.learnTime else 0,
+            "learnStepsPerTick": self.learnSteps / self.ticks if self.ticks else 0,
+        }
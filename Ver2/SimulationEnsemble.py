@@ -0,0 +1,57 @@
+"""
+The scenario of SimulationEnvironment2.py (4 UDP flows as background traffic and the protocol under test), run with
+several seeds in parallel (see ensemble.py). Reports mean and 95% confidence interval of the delivery rate, delay and
+utility of the protocol under test.
+
+python3 SimulationEnsemble.py [protocol] [number of seeds] [simulationPeriod] [alpha] [beta1] [beta2]
+    protocol: mcp, udp, arq, arq_inf or tcp
+"""
+import sys
+
+from eventScheduler import EventScheduler
+from ensemble import runEnsemble, printEnsemble
+from vecEnv import makeMCPScenario
+
+
+protocolSettings = {
+    "mcp": ("mcp", {"maxTxAttempts":-1, "timeout":30, "maxPktTxDDL":-1, "gamma":0.9, "learnRetransmissionOnly": True}, "SACK"),
+    "udp": ("UDP", {}, None),
+    "arq": ("window arq", {"cwnd": 140, "maxTxAttempts":-1, "timeout":30, "maxPktTxDDL":-1, "ACKMode": "SACK"}, "SACK"),
+    "arq_inf": ("window arq", {"cwnd": -1, "maxTxAttempts":-1, "timeout":30, "maxPktTxDDL":-1, "ACKMode": "SACK"}, "SACK"),
+    "tcp": ("tcp_newreno", {"timeout":30, "IW":4}, "LC"),
+}
+
+
+def scenario(rngs, protocol, simulationPeriod, alpha, beta1, beta2):
+    protocolName, transportParam, ACKMode = protocolSettings[protocol]
+    if protocolName == "mcp":
+        transportParam = dict(transportParam, alpha=alpha, beta1=beta1, beta2=beta2)
+    clientList, serverList, channel, rng = makeMCPScenario(None, transportParam=transportParam,
+        protocolName=protocolName, ACKMode=ACKMode, rngs=rngs)
+
+    EventScheduler(clientList, serverList, channel, rng=rng).run(startTime=1, endTime=simulationPeriod)
+
+    client, server = clientList[-1], serverList[-1]
+    _, deliveryRate, avgDelay = server.serverSidePerf(client.getPktGen())
+    util = client.transportObj.instance.calcUtility(
+        deliveryRate=deliveryRate, avgDelay=avgDelay, alpha=alpha, beta1=beta1, beta2=beta2)
+    return {"deliveryRate": deliveryRate, "avgDelay": avgDelay, "utility": util}
+
+
+if __name__ == "__main__":
+    protocol = sys.argv[1].lower() if len(sys.argv) > 1 else "mcp"
+    numSeeds = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    simulationPeriod = int(sys.argv[3]) if len(sys.argv) > 3 else 20000
+    if len(sys.argv) > 6:
+        alpha, beta1, beta2 = int(sys.argv[4]), float(sys.argv[5]), float(sys.argv[6])
+    else:
+        alpha, beta1, beta2 = 2, 0.8, 0.2
+
+    assert protocol in protocolSettings, "protocol should be one of " + ", ".join(protocolSettings)
+
+    params = {"protocol": protocol, "simulationPeriod": simulationPeriod, "alpha": alpha, "beta1": beta1, "beta2": beta2}
+    results = runEnsemble(scenario, seeds=range(numSeeds), params=params)
+
+    for seed, metrics in results:
+        print("seed", seed, metrics)
+    printEnsemble(results)
@@ -6,10 +6,13 @@ from os import path
 import numpy as np
 from tabulate import tabulate
 import matplotlib.pyplot as plt
-import pickle as pkl
 
 from application import EchoClient, EchoServer
 from channel import SingleModeChannel
+from eventScheduler import EventScheduler
+from resultIO import saveResult, resultName, ResultCache, codeVersion
+from metricsSink import ChunkedFileSink
+from profiler import Profiler
 
 if len(sys.argv) > 3:
     alpha = int(sys.argv[1])
@@ -26,9 +29,9 @@ print("beta1={beta1}, beta2={beta2}".format(beta1=beta1, beta2=beta2))
 
 utilityCalcHandlerParams = {"beta1":beta1, "beta2":beta2, "alpha":alpha}
 if len(sys.argv) > 4:
-    pklFilename = sys.argv[4]
+    pklFilename = resultName(sys.argv[4]) + ".res"
 else:
-    pklFilename = "perfData2_{alpha}_{beta1}_{beta2}.pkl".format(alpha=alpha, beta1=beta1, beta2=beta2)
+    pklFilename = "perfData2_{alpha}_{beta1}_{beta2}.res".format(alpha=alpha, beta1=beta1, beta2=beta2)
 
 print("results save to \\result\\"+pklFilename)
 
@@ -38,6 +41,33 @@ if len(sys.argv) > 5:
 else:
     simulationPeriod = int(20000) # unit ticks / time slots
 
+# channel settings: processRate bufferSize rtt pktDropProb
+channelParam = {"processRate":3, "bufferSize":300, "rtt":100, "pktDropProb":0.1}
+if len(sys.argv) > 9:
+    channelParam = {"processRate":int(sys.argv[6]), "bufferSize":int(sys.argv[7]), "rtt":int(sys.argv[8]), "pktDropProb":float(sys.argv[9])}
+
+seed = None # an int for reproducible runs
+if seed is not None:
+    np.random.seed(seed)
+
+# baseline (non MCP) results are computed once per configuration, see test_client
+resultCache = ResultCache()
+
+# a directory to stream the series of the servers (pktsPerTick, delayPerPkt, perfRecords) to, instead of keeping 
+# them in memory
+metricsDir = None
+metricsSink = ChunkedFileSink(metricsDir) if metricsDir else None
+
+# a .json or .csv file to store the time spent in each component (servers, clients, protocols, channel, DQN) of 
+# the simulated runs to, see profiler.py
+profileFilename = None
+profiler = Profiler() if profileFilename else None
+
+# a directory of a DQN checkpoint (see RL_Brain.DQN.save): MCP warm starts from it if it exists, and the trained DQN 
+# is saved to it at the end of the run
+checkpointDir = None
+warmStartDir = checkpointDir if checkpointDir and path.exists(path.join(checkpointDir, "dqn.pt")) else None
+
 """
 add background traffic
 """
@@ -49,7 +79,7 @@ for clientId in range(1, 4+1):
         protocolName="UDP", transportParam={}, 
         trafficMode="periodic", trafficParam={"period":1, "pktsPerPeriod":1}, 
         verbose=False)
-    server = EchoServer(serverId=10+clientId, ACKMode=None, verbose=False)
+    server = EchoServer(serverId=10+clientId, ACKMode=None, verbose=False, metricsSink=metricsSink)
     
     env_clients.append(client)
     env_servers.append(server)
@@ -67,34 +97,36 @@ client_RL = EchoClient(clientId=101, serverId=111,
     "alpha":alpha,
     "beta1":beta1, "beta2":beta2, # beta1: emphasis on delivery, beta2: emphasis on delay
     "gamma":0.9,
-    "learnRetransmissionOnly": True}, # whether only learn the data related to retransmission
+    "learnRetransmissionOnly": True, # whether only learn the data related to retransmission
+    "checkpoint": warmStartDir,
+    "metricsSink": metricsSink}, # pktIgnoredCounter
     trafficMode="periodic", trafficParam={"period":1, "pktsPerPeriod":1}, 
     verbose=False)
-server_RL = EchoServer(serverId=111, ACKMode="SACK", verbose=False)
+server_RL = EchoServer(serverId=111, ACKMode="SACK", verbose=False, metricsSink=metricsSink)
 
 client_ARQ_finit = EchoClient(clientId=201, serverId=211, 
     protocolName="window arq", transportParam={"cwnd": 140, "maxTxAttempts":-1, "timeout":30, "maxPktTxDDL":-1, "ACKMode": "SACK"}, 
     trafficMode="periodic", trafficParam={"period":1, "pktsPerPeriod":1},
     verbose=False)
-server_ARQ_finit = EchoServer(serverId=211, ACKMode="SACK", verbose=False)
+server_ARQ_finit = EchoServer(serverId=211, ACKMode="SACK", verbose=False, metricsSink=metricsSink)
 
 client_ARQ_infinit_cwnd = EchoClient(clientId=301, serverId=311, 
     protocolName="window arq", transportParam={"cwnd": -1, "maxTxAttempts":-1, "timeout":30, "maxPktTxDDL":-1, "ACKMode": "SACK"}, 
     trafficMode="periodic", trafficParam={"period":1, "pktsPerPeriod":1},
     verbose=False)
-server_ARQ_infinit_cwnd = EchoServer(serverId=311, ACKMode="SACK", verbose=False)
+server_ARQ_infinit_cwnd = EchoServer(serverId=311, ACKMode="SACK", verbose=False, metricsSink=metricsSink)
 
 client_UDP = EchoClient(clientId=401, serverId=411, 
     protocolName="UDP", transportParam={}, 
     trafficMode="periodic", trafficParam={"period":1, "pktsPerPeriod":1}, 
     verbose=False)
-server_UDP = EchoServer(serverId=411, ACKMode=None, verbose=False)
+server_UDP = EchoServer(serverId=411, ACKMode=None, verbose=False, metricsSink=metricsSink)
 
 client_TCP_Reno = EchoClient(clientId=501, serverId=511,
     protocolName="tcp_newreno", transportParam={"timeout":30, "IW":4}, # IW=2 if SMSS>2190, IW=3 if SMSS>3, else IW=4
     trafficMode="periodic", trafficParam={"period":1, "pktsPerPeriod":1}, 
     verbose=False)
-server_TCP_Reno = EchoServer(serverId=511, ACKMode="LC", verbose=False)
+server_TCP_Reno = EchoServer(serverId=511, ACKMode="LC", verbose=False, metricsSink=metricsSink)
 
 # test_clients = [client_UDP]
 # test_servers = [server_UDP]
@@ -115,12 +147,20 @@ def test_client(client, server):
 
     ignored_pkt, retrans_pkt, retransProb = 0, 0, 0
 
-    serverPerfFilename = client.getProtocolName()+"_perf.pkl"
+    isBaseline = client.getProtocolName().lower() not in {"mcp"}
+
+    # everything but the utility parameters, that are applied when loading the cached result
+    runConfig = {
+        "client": client.getConfig(), "server": server.getConfig(), 
+        "envClients": [c.getConfig() for c in env_clients], "envServers": [s.getConfig() for s in env_servers],
+        "channel": channelParam, "simulationPeriod": simulationPeriod, "seed": seed,
+        "codeVersion": codeVersion([__file__])
+    }
 
-    if client.getProtocolName().lower() not in {"mcp"}:
+    if isBaseline:
         #check whether can load the previous performance file directly
-        
-        if path.exists(serverPerfFilename):
+        serverPerfFilename = resultCache.get(runConfig)
+        if serverPerfFilename:
             print("find file ", serverPerfFilename)
             clientSidePerf, distincPktsSent, clientPid = server.calcPerfBasedOnDataFile(
                 serverPerfFilename,
@@ -137,15 +177,13 @@ def test_client(client, server):
 
     # system time
     # A suggested bufferSize >= processRate * rtt
-    channel = SingleModeChannel(processRate=3, bufferSize=300, rtt=100, pktDropProb=0.1, verbose=False)
+    channel = SingleModeChannel(**channelParam, verbose=False)
 
 
     clientList = env_clients + [client]
     serverList = env_servers + [server]
 
     ACKPacketList = []
-    packetList_enCh = []
-    packetList_deCh = []
 
     # clear each client server
     for c, s in zip(clientList, serverList):
@@ -164,56 +202,56 @@ def test_client(client, server):
     
     channel.time=0
 
-    packetList_enCh = []
-    for time in range(1, simulationPeriod+1):
-        ACKPacketList = []
-        # step 1: each server processes remaining pkts 
-        for serverId in range(len(serverList)):
-            ACKPacketList += serverList[serverId].ticking(packetList_deCh)
-
-        # step 2: clients generate packets
-        packetList_enCh = []
-        # for client in clientSet:
-        for clientId in np.random.permutation(len(clientList)):
-            packetList_enCh += clientList[clientId].ticking(ACKPacketList)
-
-        # step 3: feed packets to channel
-        # ACKPacketList += channel.putPackets(packetList_enCh) # allow channel feedback 
-        channel.putPackets(packetList_enCh)
-
-        # step 3: get packets from channel
-        packetList_deCh = channel.getPackets()
-
-        if time % 30 == 0: # record performance for the past 30 slots
-            server.recordPerfInThisTick(client.getPktGen(), 
-                utilityCalcHandler=client.transportObj.instance.calcUtility,
-                utilityCalcHandlerParams=utilityCalcHandlerParams)
-
-        if time % (simulationPeriod//10) == 0:
-            print("time ", time, " =================")
-            print("RTT", client.transportObj.instance.SRTT)
-            print("RTO", client.transportObj.instance.timeout)
-            client.transportObj.instance.clientSidePerf()
-            server.printPerf(
-                client.getPktGen(),
-                client.getProtocolName())
-            
+    def recordPerf(time): # record performance for the past 30 slots
+        server.recordPerfInThisTick(client.getPktGen(), 
+            utilityCalcHandler=client.transportObj.instance.calcUtility,
+            utilityCalcHandlerParams=utilityCalcHandlerParams)
+
+    def printProgress(time):
+        nonlocal ignored_pkt, retrans_pkt, retransProb
+        print("time ", time, " =================")
+        print("RTT", client.transportObj.instance.SRTT)
+        print("RTO", client.transportObj.instance.timeout)
+        client.transportObj.instance.clientSidePerf()
+        server.printPerf(
+            client.getPktGen(),
+            client.getProtocolName())
+        
 
-            if client.getProtocolName().lower() in {"mcp"}:
-                ignored_pkt = client.transportObj.instance.perfDict["ignorePkts"] - ignored_pkt
-                retrans_pkt = client.transportObj.instance.perfDict["retransAttempts"] - retrans_pkt
-                retransProb = retrans_pkt / (retrans_pkt + ignored_pkt)
-                client.transportObj.instance.perfDict["retranProb"] = retransProb # debug
+        if client.getProtocolName().lower() in {"mcp"}:
+            ignored_pkt = client.transportObj.instance.perfDict["ignorePkts"] - ignored_pkt
+            retrans_pkt = client.transportObj.instance.perfDict["retransAttempts"] - retrans_pkt
+            retransProb = retrans_pkt / (retrans_pkt + ignored_pkt)
+            client.transportObj.instance.perfDict["retranProb"] = retransProb # debug
+
+    # each tick: servers process remaining pkts, clients generate packets, channel accepts and releases packets.
+    # Idle ticks are skipped
+    scheduler = EventScheduler(clientList, serverList, channel, profiler=profiler)
+    scheduler.addPeriodicHook(30, recordPerf)
+    scheduler.addPeriodicHook(simulationPeriod//10, printProgress)
+    scheduler.run(startTime=1, endTime=simulationPeriod)
+    if profiler:
+        profiler.restore()
     
-    server.storePerf(serverPerfFilename,
-        clientPid=client.pid,
-        distincPktsSent=client.getPktGen(),
-        clientSidePerf=client.transportObj.instance.clientSidePerf())
+    if isBaseline:
+        server.storePerf(resultCache.path(runConfig),
+            clientPid=client.pid,
+            distincPktsSent=client.getPktGen(),
+            clientSidePerf=client.transportObj.instance.clientSidePerf())
+        resultCache.evict()
 
 # test each pair of client and server
 for client, server in zip(test_clients, test_servers):
     test_client(client, server)
 
+if checkpointDir and client_RL in test_clients:
+    client_RL.transportObj.instance.RL_Brain.save(checkpointDir)
+    print("DQN checkpoint saved to", checkpointDir)
+
+# write the last partial chunk of every series to its file
+if metricsSink:
+    metricsSink.close()
+
 
 """
 check contents, performance ....
@@ -272,10 +310,13 @@ deliveredPktsPerSlot["general"] = table
 deliveredPktsPerSlot["header"] = header
 print(tabulate(table, headers=header))
 
+if profiler:
+    profiler.printReport()
+    profiler.save(profileFilename)
+
 # store data
 pklFilePath = path.join("results", "alpha{alpha}".format(alpha=alpha), pklFilename)
-with open(pklFilePath, 'wb') as handle:
-    pkl.dump(deliveredPktsPerSlot, handle, protocol=pkl.HIGHEST_PROTOCOL)
+saveResult(deliveredPktsPerSlot, pklFilePath)
 print("save to ", pklFilename)
 
 # plot MCP packet ignored time diagram
@@ -284,4 +325,4 @@ print("save to ", pklFilename)
 
 # np.set_printoptions(suppress=True)
 # csvFileName="results/MCP_RL_perf_{beta1}_{beta2}.csv".format(beta1=beta1, beta2=beta2)
-# np.savetxt(csvFileName, client_RL.transportObj.instance.RL_Brain.memory, delimiter=",", fmt='%f')
+# np.savetxt(csvFileName, client_RL.transportObj.instance.RL_Brain.memory.states.numpy(), delimiter=",", fmt='%f')
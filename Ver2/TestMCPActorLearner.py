@@ -0,0 +1,34 @@
+"""
+Train MCP with the actor/learner split (see actorLearner.py): numActors simulation processes acting with the
+published policy, one learner process training on their experiences. Reports the performance of each actor and
+the training done by the learner, next to the single process MCP of SimulationEnvironment2.py.
+
+python3 TestMCPActorLearner.py [numActors] [simulationPeriod]
+"""
+import sys
+import time
+from tabulate import tabulate
+
+from vecEnv import runScenario
+from actorLearner import runActorLearner
+
+
+if __name__ == "__main__":
+    numActors = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    simulationPeriod = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    # MCP acting and learning in one process, as in SimulationEnvironment2.py
+    mcp, perf = runScenario(simulationPeriod)
+    print("single process: {:.2f}s, {} experiences, {} learn steps, delivery rate {:.3f}, avg delay {:.1f}, utility {:.3f}".format(
+        perf["time"], mcp.RL_Brain.memory.counter, mcp.trainScheduler.learnSteps, perf["deliveryRate"], perf["avgDelay"],
+        perf["utility"]))
+
+    startTime = time.perf_counter()
+    actorResults, learnerResult, policyStore = runActorLearner(numActors, simulationPeriod)
+    duration = time.perf_counter() - startTime
+
+    header = ["actor", "time (s)", "delivery rate", "avg delay", "utility", "policy refreshes"]
+    table = [[r["actor"], r["time"], r["deliveryRate"], r["avgDelay"], r["utility"], r["refreshes"]] for r in actorResults]
+    print(tabulate(table, headers=header, floatfmt=".3f"))
+    print("{} actors x {} ticks in {:.2f}s".format(numActors, simulationPeriod, duration))
+    print("learner: {learnSteps} learn steps ({learnTime:.2f}s), {experiences} experiences, converged at step {convergeStep}, loss {loss:.4f}, epsilon {epsilon:.3f}".format(**learnerResult))
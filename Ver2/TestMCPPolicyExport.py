@@ -0,0 +1,53 @@
+"""
+Train MCP in the SimulationEnvironment2.py scenario, export its network to a numpy policy (see numpyPolicy.py), then
+    1. check that the numpy policy takes the greedy actions of the DQN on the experienced states
+    2. compare the cost per decision of torch and numpy
+    3. run the scenario again with MCP evaluating the frozen policy (param "policy")
+
+python3 TestMCPPolicyExport.py [trainPeriod] [evalPeriod] [policy filename]
+"""
+import sys
+import numpy as np
+from tabulate import tabulate
+
+from vecEnv import runScenario, perCall
+from numpyPolicy import NumpyPolicy
+
+
+trainPeriod = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+evalPeriod = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+policyFilename = sys.argv[3] if len(sys.argv) > 3 else "MCP_policy.npz"
+
+
+def perfRow(perf):
+    return [perf["time"], perf["deliveryRate"], perf["avgDelay"], perf["utility"]]
+
+
+# train and export
+mcp, trainPerf = runScenario(trainPeriod)
+trainPerf = perfRow(trainPerf)
+brain = mcp.RL_Brain
+NumpyPolicy.fromNet(brain.evalNet).save(policyFilename)
+policy = NumpyPolicy.load(policyFilename)
+print("policy saved to", policyFilename)
+
+# 1. same greedy actions
+states = brain.memory.states[:brain.memory.size()].numpy()
+brain.globalEvalOn = True
+torchActions = brain.chooseActions(states)
+numpyActions = policy.chooseActions(states)
+print("{} states, {} same actions".format(len(states), np.sum(torchActions == numpyActions)))
+
+# 2. cost per decision
+batch = states[:32]
+table = [
+    ["chooseAction (1 state)", perCall(brain.chooseAction, (states[0], )), perCall(policy.chooseAction, (states[0], ))],
+    ["chooseActions (32 states)", perCall(brain.chooseActions, (batch, )), perCall(policy.chooseActions, (batch, ))],
+]
+print(tabulate(table, headers=["us per call", "torch", "numpy"], floatfmt=".1f"))
+
+# 3. evaluation run
+_, evalPerf = runScenario(evalPeriod, transportParam={"policy": policyFilename})
+evalPerf = perfRow(evalPerf)
+print(tabulate([["train ({} ticks)".format(trainPeriod)] + trainPerf, ["eval ({} ticks)".format(evalPeriod)] + evalPerf],
+    headers=["run", "time (s)", "delivery rate", "avg delay", "utility"], floatfmt=".3f"))
@@ -0,0 +1,49 @@
+"""
+Train MCP in the SimulationEnvironment2.py scenario, compile its policy into lookup tables of several resolutions
+(see policyTable.py), then for each table
+    1. the size of the table, and the ratio of the experienced states on which it takes the action of the DQN
+    2. the cost per decision
+    3. the performance of MCP deciding with the table (param "policy"), next to the DQN policy itself
+
+python3 TestMCPPolicyTable.py [trainPeriod] [evalPeriod]
+"""
+import sys
+import time
+from tabulate import tabulate
+
+from vecEnv import runScenario, perCall
+from numpyPolicy import NumpyPolicy
+from policyTable import PolicyTable, quantileGrids
+
+
+trainPeriod = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+evalPeriod = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+
+def perfRow(perf):
+    return [perf["time"], perf["deliveryRate"], perf["avgDelay"], perf["utility"]]
+
+
+# train
+mcp, _ = runScenario(trainPeriod)
+policy = NumpyPolicy.fromNet(mcp.RL_Brain.evalNet)
+states = mcp.RL_Brain.memory.states[:mcp.RL_Brain.memory.size()].numpy()
+
+# an eval run of the DQN policy as reference
+_, evalPerf = runScenario(evalPeriod, transportParam={"policy": policy})
+table = [["DQN (numpy)", None, None, 1.0, perCall(policy.chooseAction, (states[0], ))] + perfRow(evalPerf)]
+
+for cellsPerDim in [4, 8, 16, 32]:
+    startTime = time.perf_counter()
+    policyTable = PolicyTable.compile(policy, quantileGrids(states, cellsPerDim=cellsPerDim))
+    compileTime = time.perf_counter() - startTime
+
+    _, evalPerf = runScenario(evalPeriod, transportParam={"policy": policyTable})
+    table.append(["table {}".format("x".join(str(len(grid)) for grid in policyTable.grids)),
+        policyTable.nbytes(), compileTime, policyTable.agreement(policy, states),
+        perCall(policyTable.chooseAction, (states[0], ))] + perfRow(evalPerf))
+    print(cellsPerDim, "cells per dim done")
+
+print("{} experienced states".format(len(states)))
+print(tabulate(table, headers=["policy", "bytes", "compile (s)", "agreement", "us / decision",
+    "eval time (s)", "delivery rate", "avg delay", "utility"], floatfmt=".3f"))
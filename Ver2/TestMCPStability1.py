@@ -10,6 +10,7 @@ import pickle as pkl
 
 from application import EchoClient, EchoServer
 from channel import SingleModeChannel
+from eventScheduler import EventScheduler
 
 if len(sys.argv) > 3:
     alpha = int(sys.argv[1])
@@ -38,6 +39,10 @@ if len(sys.argv) > 5:
 else:
     simulationPeriod = int(10000) # unit ticks / time slots
 
+# a directory of a DQN checkpoint (see RL_Brain.DQN.save, e.g. saved by SimulationEnvironment2.py) to warm start the 
+# MCP flows from. None: train from scratch
+checkpointDir = None
+
 
 
 
@@ -71,7 +76,8 @@ def test_channel(processRate=3):
             "alpha":alpha,
             "beta1":beta1, "beta2":beta2, # beta1: emphasis on delivery, beta2: emphasis on delay
             "gamma":0.9,
-            "learnRetransmissionOnly": True}, # whether only learn the data related to retransmission
+            "learnRetransmissionOnly": True, # whether only learn the data related to retransmission
+            "checkpoint": checkpointDir},
             trafficMode="periodic", trafficParam={"period":1, "pktsPerPeriod":1}, 
             verbose=False)
         server = EchoServer(serverId=10+clientId, ACKMode="SACK", verbose=False)
@@ -81,8 +87,6 @@ def test_channel(processRate=3):
 
 
     ACKPacketList = []
-    packetList_enCh = []
-    packetList_deCh = []
 
     # clear each client server
     for c, s in zip(clientList, serverList):
@@ -99,36 +103,23 @@ def test_channel(processRate=3):
         channel.putPackets(packetList_enCh)
     
 
-    packetList_enCh = []
-    for time in range(1, simulationPeriod+1):
-        ACKPacketList = []
-        # step 1: each server processes remaining pkts 
-        for serverId in range(len(serverList)):
-            ACKPacketList += serverList[serverId].ticking(packetList_deCh)
-
-        # step 2: clients generate packets
-        packetList_enCh = []
-        # for client in clientSet:
-        for clientId in np.random.permutation(len(clientList)):
-            packetList_enCh += clientList[clientId].ticking(ACKPacketList)
-
-        # step 3: feed packets to channel
-        # ACKPacketList += channel.putPackets(packetList_enCh) # allow channel feedback 
-        channel.putPackets(packetList_enCh)
-
-        # step 3: get packets from channel
-        packetList_deCh = channel.getPackets()
-
-        if time % (simulationPeriod//10) == 0:
-            print("time ", time, " =================")
-            print("RTT", client.transportObj.instance.SRTT)
-            print("RTO", client.transportObj.instance.timeout)
-            client, server = clientList[-1], serverList[-1]
-
-            client.transportObj.instance.clientSidePerf()
-            server.printPerf(
-                client.getPktGen(),
-                client.getProtocolName())
+    def printProgress(time):
+        nonlocal client, server
+        print("time ", time, " =================")
+        print("RTT", client.transportObj.instance.SRTT)
+        print("RTO", client.transportObj.instance.timeout)
+        client, server = clientList[-1], serverList[-1]
+
+        client.transportObj.instance.clientSidePerf()
+        server.printPerf(
+            client.getPktGen(),
+            client.getProtocolName())
+
+    # each tick: servers process remaining pkts, clients generate packets, channel accepts and releases packets.
+    # Idle ticks are skipped
+    scheduler = EventScheduler(clientList, serverList, channel)
+    scheduler.addPeriodicHook(simulationPeriod//10, printProgress)
+    scheduler.run(startTime=1, endTime=simulationPeriod)
 
 
     # summarize throughput
@@ -6,10 +6,11 @@ from os import path
 import numpy as np
 from tabulate import tabulate
 import matplotlib.pyplot as plt
-import pickle as pkl
 
 from application import EchoClient, EchoServer
 from channel import SingleModeChannel
+from eventScheduler import EventScheduler
+from resultIO import saveResult
 
 if len(sys.argv) > 3:
     alpha = int(sys.argv[1])
@@ -38,6 +39,10 @@ if len(sys.argv) > 5:
 else:
     simulationPeriod = int(10000) # unit ticks / time slots
 
+# a directory of a DQN checkpoint (see RL_Brain.DQN.save, e.g. saved by SimulationEnvironment2.py) to warm start the 
+# MCP flows from. None: train from scratch
+checkpointDir = None
+
 
 
 
@@ -84,7 +89,8 @@ def test_channel(processRate=3, recordingPeriod=30):
         "alpha":alpha,
         "beta1":beta1, "beta2":beta2, # beta1: emphasis on delivery, beta2: emphasis on delay
         "gamma":0.9,
-        "learnRetransmissionOnly": True}, # whether only learn the data related to retransmission
+        "learnRetransmissionOnly": True, # whether only learn the data related to retransmission
+        "checkpoint": checkpointDir},
         trafficMode="periodic", trafficParam={"period":1, "pktsPerPeriod":1}, 
         verbose=False)
     server_RL = EchoServer(serverId=111, ACKMode="SACK", verbose=False)
@@ -113,8 +119,6 @@ def test_channel(processRate=3, recordingPeriod=30):
 
 
     ACKPacketList = []
-    packetList_enCh = []
-    packetList_deCh = []
 
     # clear each client server
     for c, s in zip(clientList, serverList):
@@ -131,43 +135,30 @@ def test_channel(processRate=3, recordingPeriod=30):
         channel.putPackets(packetList_enCh)
     
 
-    packetList_enCh = []
-    for time in range(1, simulationPeriod+1):
-        ACKPacketList = []
-        # step 1: each server processes remaining pkts 
-        for serverId in range(len(serverList)):
-            ACKPacketList += serverList[serverId].ticking(packetList_deCh)
-
-        # step 2: clients generate packets
-        packetList_enCh = []
-        # for client in clientSet:
-        for clientId in np.random.permutation(len(clientList)):
-            packetList_enCh += clientList[clientId].ticking(ACKPacketList)
-
-        # step 3: feed packets to channel
-        # ACKPacketList += channel.putPackets(packetList_enCh) # allow channel feedback 
-        channel.putPackets(packetList_enCh)
-
-        # step 3: get packets from channel
-        packetList_deCh = channel.getPackets()
-
-        if time % recordingPeriod == 0:
-            print("time ", time, " =================")
-            print("RTT", client.transportObj.instance.SRTT)
-            print("RTO", client.transportObj.instance.timeout)
-            client, server = clientList[-1], serverList[-1]
+    def recordThroughput(time):
+        nonlocal client, server
+        print("time ", time, " =================")
+        print("RTT", client.transportObj.instance.SRTT)
+        print("RTO", client.transportObj.instance.timeout)
+        client, server = clientList[-1], serverList[-1]
+
+        client.transportObj.instance.clientSidePerf()
+        server.printPerf(
+            client.getPktGen(),
+            client.getProtocolName())
+        
+        deliveredPktEachServer = []
+        for c, s in zip(clientList, serverList):
+            deliveredPkts, deliveryRate, avgDelay = s.serverSidePerf(c.getPktGen())
+            deliveredPktEachServer.append(deliveredPkts)
 
-            client.transportObj.instance.clientSidePerf()
-            server.printPerf(
-                client.getPktGen(),
-                client.getProtocolName())
-            
-            deliveredPktEachServer = []
-            for c, s in zip(clientList, serverList):
-                deliveredPkts, deliveryRate, avgDelay = s.serverSidePerf(c.getPktGen())
-                deliveredPktEachServer.append(deliveredPkts)
+        throughputDetail.append(deliveredPktEachServer)
 
-            throughputDetail.append(deliveredPktEachServer)
+    # each tick: servers process remaining pkts, clients generate packets, channel accepts and releases packets.
+    # Idle ticks are skipped
+    scheduler = EventScheduler(clientList, serverList, channel)
+    scheduler.addPeriodicHook(recordingPeriod, recordThroughput)
+    scheduler.run(startTime=1, endTime=simulationPeriod)
 
     throughputDesc = []
     for c, s in zip(clientList, serverList):
@@ -193,6 +184,5 @@ data = {
     "processRate": ch_processRates
     }
 
-with open("throughput_data.pkl", 'wb') as handle:
-    pkl.dump(data, handle, protocol=pkl.HIGHEST_PROTOCOL)
-print("save to ", "throughput_data.pkl")
\ No newline at end of file
+saveResult(data, "throughput_data.res")
+print("save to ", "throughput_data.res")
\ No newline at end of file
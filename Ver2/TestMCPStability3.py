@@ -6,10 +6,11 @@ from os import path
 import numpy as np
 from tabulate import tabulate
 import matplotlib.pyplot as plt
-import pickle as pkl
 
 from application import EchoClient, EchoServer
 from channel import SingleModeChannel
+from eventScheduler import EventScheduler
+from resultIO import saveResult
 
 if len(sys.argv) > 3:
     alpha = int(sys.argv[1])
@@ -38,6 +39,10 @@ if len(sys.argv) > 5:
 else:
     simulationPeriod = int(25000) # unit ticks / time slots
 
+# a directory of a DQN checkpoint (see RL_Brain.DQN.save, e.g. saved by SimulationEnvironment2.py) to warm start the 
+# MCP flows from. None: train from scratch
+checkpointDir = None
+
 
 
 
@@ -61,7 +66,6 @@ def test_channel(chParamInst=[[0, 3]], recordingPeriod=30):
     chParamInst: list of list, instruction to modify the channel parameter. each inner list is [time, target rate]
     recordingPeriod: how often to note down the number of delivered packets for each client-server
     """
-    chParamInst_ptr = 1 
     throughputDetail = [] # record the throughput of each server in each recording period
     deliveryRateDetail = []
     delayDetail = []
@@ -86,7 +90,8 @@ def test_channel(chParamInst=[[0, 3]], recordingPeriod=30):
         "alpha":alpha,
         "beta1":beta1, "beta2":beta2, # beta1: emphasis on delivery, beta2: emphasis on delay
         "gamma":0.9,
-        "learnRetransmissionOnly": True}, # whether only learn the data related to retransmission
+        "learnRetransmissionOnly": True, # whether only learn the data related to retransmission
+        "checkpoint": checkpointDir},
         trafficMode="periodic", trafficParam={"period":1, "pktsPerPeriod":1}, 
         verbose=False)
     server_RL = EchoServer(serverId=111, ACKMode="SACK", verbose=False)
@@ -114,8 +119,6 @@ def test_channel(chParamInst=[[0, 3]], recordingPeriod=30):
 
 
     ACKPacketList = []
-    packetList_enCh = []
-    packetList_deCh = []
 
     # clear each client server
     for c, s in zip(clientList, serverList):
@@ -134,68 +137,46 @@ def test_channel(chParamInst=[[0, 3]], recordingPeriod=30):
 
     channel.time = 0
 
-    packetList_enCh = []
-    for time in range(1, simulationPeriod+1):
-
-        # check whether to change channel param
-        if chParamInst_ptr < len(chParamInst):
-            if time == chParamInst[chParamInst_ptr][0]:
-                channel.setProcessRate(chParamInst[chParamInst_ptr][1])
-                chParamInst_ptr += 1
-
-
-        ACKPacketList = []
-        # step 1: each server processes remaining pkts 
-        for serverId in range(len(serverList)):
-            ACKPacketList += serverList[serverId].ticking(packetList_deCh)
-
-        # step 2: clients generate packets
-        packetList_enCh = []
-        # pktPerClt = []
-        # for client in clientSet:
-        for clientId in np.random.permutation(len(clientList)):
-            pkts = clientList[clientId].ticking(ACKPacketList)
-            # pktPerClt.append(len(pkts))
-            packetList_enCh += pkts
-
-        # print(time, pktPerClt, channel.channelBuffer.numPacketsInBuffer)
-
-        # step 3: feed packets to channel
-        # ACKPacketList += channel.putPackets(packetList_enCh) # allow channel feedback 
-        channel.putPackets(packetList_enCh)
-
-        # step 3: get packets from channel
-        packetList_deCh = channel.getPackets()
-
-        if time % 1000 == 0:
-            print("time ", time, " =================")
-            print("RTT", client.transportObj.instance.SRTT)
-            print("RTO", client.transportObj.instance.timeout)
-            client, server = clientList[-1], serverList[-1]
-
-            clientSidePerf = client_RL.transportObj.instance.clientSidePerf(verbose=True)
-            server_RL.printPerf(
-                client_RL.getPktGen(),
-                client_RL.getProtocolName())
-        
-        if time % recordingPeriod == 0:
-            deliveredPktEachServer = []
-            deliveryRateEachServer = []
-            delayEachServer = []
-            for c, s in zip(clientList, serverList):
-                deliveredPkts, deliveryRate, avgDelay = s.serverSidePerf(c.getPktGen())
-                deliveredPktEachServer.append(deliveredPkts)
-                deliveryRateEachServer.append(deliveryRate)
-                delayEachServer.append(avgDelay)
-
-            # monitor MCP
-            clientSidePerf = client_RL.transportObj.instance.clientSidePerf()
-            MCPPerfPerEpoch["retranProb"].append(clientSidePerf["retranProb"])
-            MCPPerfPerEpoch["retransAttempts"].append(clientSidePerf["retransAttempts"])
-
-            throughputDetail.append(deliveredPktEachServer)
-            deliveryRateDetail.append(deliveryRateEachServer)
-            delayDetail.append(delayEachServer)
+    def printProgress(time):
+        nonlocal client, server
+        print("time ", time, " =================")
+        print("RTT", client.transportObj.instance.SRTT)
+        print("RTO", client.transportObj.instance.timeout)
+        client, server = clientList[-1], serverList[-1]
+
+        client_RL.transportObj.instance.clientSidePerf(verbose=True)
+        server_RL.printPerf(
+            client_RL.getPktGen(),
+            client_RL.getProtocolName())
+
+    def recordPerf(time):
+        deliveredPktEachServer = []
+        deliveryRateEachServer = []
+        delayEachServer = []
+        for c, s in zip(clientList, serverList):
+            deliveredPkts, deliveryRate, avgDelay = s.serverSidePerf(c.getPktGen())
+            deliveredPktEachServer.append(deliveredPkts)
+            deliveryRateEachServer.append(deliveryRate)
+            delayEachServer.append(avgDelay)
+
+        # monitor MCP
+        clientSidePerf = client_RL.transportObj.instance.clientSidePerf()
+        MCPPerfPerEpoch["retranProb"].append(clientSidePerf["retranProb"])
+        MCPPerfPerEpoch["retransAttempts"].append(clientSidePerf["retransAttempts"])
+
+        throughputDetail.append(deliveredPktEachServer)
+        deliveryRateDetail.append(deliveryRateEachServer)
+        delayDetail.append(delayEachServer)
+
+    # each tick: servers process remaining pkts, clients generate packets, channel accepts and releases packets.
+    # Idle ticks are skipped
+    scheduler = EventScheduler(clientList, serverList, channel)
+    # channel parameter changes take place at the beginning of tick chParamInst[i][0], i.e. right after the previous tick
+    for instTime, processRate in chParamInst[1:]:
+        scheduler.addHook(instTime-1, lambda time, processRate=processRate: channel.setProcessRate(processRate))
+    scheduler.addPeriodicHook(1000, printProgress)
+    scheduler.addPeriodicHook(recordingPeriod, recordPerf)
+    scheduler.run(startTime=1, endTime=simulationPeriod)
 
 
     # # check pkts in channel
@@ -236,6 +217,5 @@ data = {
     "utilParam": [alpha, beta1, beta2]
     }
 
-with open("throughput_data3.pkl", 'wb') as handle:
-    pkl.dump(data, handle, protocol=pkl.HIGHEST_PROTOCOL)
-print("save to ", "throughput_data3.pkl")
\ No newline at end of file
+saveResult(data, "throughput_data3.res")
+print("save to ", "throughput_data3.res")
\ No newline at end of file
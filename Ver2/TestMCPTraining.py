@@ -0,0 +1,101 @@
+"""
+Compare the training schedules of MCP (see RL_Brain.TrainScheduler): simulation speed, gradient steps taken
+and the resulting performance of the MCP flow.
+
+The scenario is the one of SimulationEnvironment2.py: 4 UDP flows as background traffic and one MCP flow.
+
+At the end, the schedules are checked to take the same learn steps in the event driven loop as in the tick loop,
+with sparse traffic (one packet every 5 ticks) so that ticks are skipped.
+
+python3 TestMCPTraining.py [simulationPeriod]
+"""
+import sys
+import time
+import random
+import numpy as np
+import torch
+from tabulate import tabulate
+
+from application import EchoClient, EchoServer
+from channel import SingleModeChannel
+from eventScheduler import EventScheduler
+
+
+if len(sys.argv) > 1:
+    simulationPeriod = int(sys.argv[1])
+else:
+    simulationPeriod = int(5000) # unit ticks / time slots
+
+alpha, beta1, beta2 = 2, 0.8, 0.2
+
+trainSchedules = [
+    ("experience", {"trainMode": "experience"}),
+    ("every 4", {"trainMode": "every", "trainEveryK": 4}),
+    ("every 32", {"trainMode": "every", "trainEveryK": 32}),
+    ("tick 1", {"trainMode": "tick", "trainStepsPerTick": 1}),
+    ("tick 4", {"trainMode": "tick", "trainStepsPerTick": 4}),
+    ("budget 0.5ms", {"trainMode": "budget", "trainBudget": 5e-4}),
+]
+
+
+def runMCP(trainParam, eventDriven=True, trafficPeriod=1):
+    random.seed(1) # loss decisions of the channel
+    np.random.seed(1)
+    torch.manual_seed(1)
+
+    clientList, serverList = [], []
+    for clientId in range(1, 4+1):
+        clientList.append(EchoClient(clientId=clientId, serverId=10+clientId,
+            protocolName="UDP", transportParam={},
+            trafficMode="periodic", trafficParam={"period":1, "pktsPerPeriod":1},
+            verbose=False))
+        serverList.append(EchoServer(serverId=10+clientId, ACKMode=None, verbose=False))
+
+    transportParam = {"maxTxAttempts":-1, "timeout":30, "maxPktTxDDL":-1,
+        "alpha":alpha, "beta1":beta1, "beta2":beta2, "gamma":0.9,
+        "learnRetransmissionOnly": True}
+    transportParam.update(trainParam)
+    client = EchoClient(clientId=101, serverId=111,
+        protocolName="mcp", transportParam=transportParam,
+        trafficMode="periodic", trafficParam={"period":trafficPeriod, "pktsPerPeriod":1},
+        verbose=False)
+    server = EchoServer(serverId=111, ACKMode="SACK", verbose=False)
+    clientList.append(client)
+    serverList.append(server)
+
+    channel = SingleModeChannel(processRate=3, bufferSize=300, rtt=100, pktDropProb=0.1, verbose=False)
+
+    startTime = time.perf_counter()
+    EventScheduler(clientList, serverList, channel, eventDriven=eventDriven).run(startTime=1, endTime=simulationPeriod)
+    duration = time.perf_counter() - startTime
+
+    protocol = client.transportObj.instance
+    perfDict = protocol.clientSidePerf()
+    _, deliveryRate, avgDelay = server.serverSidePerf(client.getPktGen())
+    util = protocol.calcUtility(deliveryRate=deliveryRate, avgDelay=avgDelay, alpha=alpha, beta1=beta1, beta2=beta2)
+
+    return [duration, simulationPeriod/duration,
+        perfDict["learnSteps"], perfDict["learnStepsPerSec"], perfDict["learnSteps"]/duration,
+        deliveryRate, avgDelay, util]
+
+
+header = ["schedule", "time (s)", "ticks / s", "learn steps", "steps / s (learn)", "steps / s (wall)",
+    "delivery rate", "avg delay", "utility"]
+table = []
+for name, trainParam in trainSchedules:
+    table.append([name] + runMCP(trainParam))
+    print(name, "done")
+
+print(tabulate(table, headers=header, floatfmt=".3f"))
+
+# skipped ticks must not cost gradient steps. "budget" depends on the wall clock, its steps are not comparable
+table = []
+for name, trainParam in trainSchedules:
+    if trainParam["trainMode"] == "budget":
+        continue
+    tickLoopSteps = runMCP(trainParam, eventDriven=False, trafficPeriod=5)[2]
+    eventDrivenSteps = runMCP(trainParam, eventDriven=True, trafficPeriod=5)[2]
+    table.append([name, tickLoopSteps, eventDrivenSteps])
+    assert tickLoopSteps == eventDrivenSteps, "{}: {} learn steps in the tick loop, {} event driven".format(
+        name, tickLoopSteps, eventDrivenSteps)
+print(tabulate(table, headers=["schedule (traffic period 5)", "learn steps (tick loop)", "learn steps (event driven)"]))
@@ -0,0 +1,62 @@
+"""
+Train MCP on K copies of the SimulationEnvironment2.py scenario in lockstep (see vecEnv.py), for several K:
+simulation speed, experiences and gradient steps of the shared DQN, when it converges (tick and wall clock) and the
+performance of the MCP flows.
+
+python3 TestMCPVecEnv.py [simulationPeriod] [trainMode]
+    trainMode: experience, every, tick or budget (see RL_Brain.TrainScheduler), default tick
+"""
+import sys
+import numpy as np
+import torch
+from tabulate import tabulate
+
+from RL_Brain import TrainScheduler
+from protocols.mcp_v2 import MCP
+from vecEnv import VecEnv, makeMCPScenario
+
+
+if len(sys.argv) > 1:
+    simulationPeriod = int(sys.argv[1])
+else:
+    simulationPeriod = int(5000) # unit ticks / time slots
+
+trainMode = sys.argv[2] if len(sys.argv) > 2 else "tick"
+
+alpha, beta1, beta2 = 2, 0.8, 0.2
+
+
+def runVecEnv(numEnvs):
+    np.random.seed(1)
+    torch.manual_seed(1)
+
+    trainScheduler = TrainScheduler(MCP.newBrain(), mode=trainMode, K=8, stepsPerTick=1, budget=1e-3, convergedPeriod=8)
+    envs = [makeMCPScenario(trainScheduler, transportParam={"alpha":alpha, "beta1":beta1, "beta2":beta2},
+        rng=np.random.RandomState(envIdx)) for envIdx in range(numEnvs)]
+    vecEnv = VecEnv(envs, trainScheduler)
+    vecEnv.run(startTime=1, endTime=simulationPeriod)
+
+    utils = []
+    for clientList, serverList, _, _ in envs:
+        client, server = clientList[-1], serverList[-1]
+        _, deliveryRate, avgDelay = server.serverSidePerf(client.getPktGen())
+        utils.append(client.transportObj.instance.calcUtility(
+            deliveryRate=deliveryRate, avgDelay=avgDelay, alpha=alpha, beta1=beta1, beta2=beta2))
+
+    perf = vecEnv.perfDict
+    trainPerf = trainScheduler.getPerf()
+    converged = perf["convergeAt"] <= simulationPeriod
+    return [numEnvs, perf["runTime"], simulationPeriod * numEnvs / perf["runTime"],
+        trainScheduler.brain.memory.counter, perf["decisions"], trainPerf["learnSteps"],
+        perf["convergeAt"] if converged else "-", perf["convergeTime"] if converged else "-", np.mean(utils)]
+
+
+header = ["envs", "time (s)", "env ticks / s", "experiences", "decisions", "learn steps",
+    "converge tick", "converge time (s)", "mean utility"]
+table = []
+for numEnvs in [1, 2, 4, 8]:
+    table.append(runVecEnv(numEnvs))
+    print(numEnvs, "envs done")
+
+print("train mode", trainMode)
+print(tabulate(table, headers=header, floatfmt=".3f"))
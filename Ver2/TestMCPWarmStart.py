@@ -0,0 +1,51 @@
+"""
+Pretrain MCP in the SimulationEnvironment2.py scenario and save its DQN (RL_Brain.DQN.save), then compare a run from
+scratch with a run warm started from the checkpoint (MCP param "checkpoint"): when the DQN converges
+(perfDict["convergeAt"]) and the performance of the flow.
+
+python3 TestMCPWarmStart.py [pretrainPeriod] [simulationPeriod] [checkpoint dir]
+"""
+import sys
+import torch
+from tabulate import tabulate
+
+from vecEnv import runScenario
+
+
+pretrainPeriod = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+simulationPeriod = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+checkpointDir = sys.argv[3] if len(sys.argv) > 3 else "MCP_checkpoint"
+
+
+def perfRow(perf, simulationPeriod):
+    convergeAt = perf["convergeAt"] if perf["convergeAt"] <= simulationPeriod else "-"
+    return [convergeAt, perf["time"], perf["deliveryRate"], perf["avgDelay"], perf["utility"]]
+
+
+# pretrain and save
+pretrained, pretrainPerf = runScenario(pretrainPeriod, seed=0)
+pretrained.RL_Brain.save(checkpointDir)
+print("checkpoint of {} experiences saved to {}".format(pretrained.RL_Brain.memory.counter, checkpointDir))
+
+# the checkpoint restores the training state
+mcp, _ = runScenario(0, transportParam={"checkpoint": checkpointDir})
+saved, loaded = pretrained.RL_Brain, mcp.RL_Brain
+size = saved.memory.size()
+assert all(torch.equal(saved.evalNet.state_dict()[key], loaded.evalNet.state_dict()[key]) for key in saved.evalNet.state_dict())
+assert all(torch.equal(saved.tgtNet.state_dict()[key], loaded.tgtNet.state_dict()[key]) for key in saved.tgtNet.state_dict())
+assert saved.optimizer.state_dict()["state"].keys() == loaded.optimizer.state_dict()["state"].keys()
+assert (saved.epsilon, saved.learningCounter, saved.isConverge) == (loaded.epsilon, loaded.learningCounter, loaded.isConverge)
+assert saved.memory.counter == loaded.memory.counter
+assert torch.equal(saved.memory.states[:size], loaded.memory.states[:size])
+assert torch.equal(saved.memory.rewards[:size], loaded.memory.rewards[:size])
+
+# from scratch vs warm start, on another seed than the pretraining
+_, coldPerf = runScenario(simulationPeriod)
+warm, warmPerf = runScenario(simulationPeriod, transportParam={"checkpoint": checkpointDir})
+warm.RL_Brain.save(checkpointDir + "_continued") # keeps training the memory-mapped experiences, the checkpoint stays unchanged
+
+print(tabulate([
+        ["pretrain ({} ticks)".format(pretrainPeriod)] + perfRow(pretrainPerf, pretrainPeriod),
+        ["from scratch ({} ticks)".format(simulationPeriod)] + perfRow(coldPerf, simulationPeriod),
+        ["warm start ({} ticks)".format(simulationPeriod)] + perfRow(warmPerf, simulationPeriod),
+    ], headers=["run", "converge tick", "time (s)", "delivery rate", "avg delay", "utility"], floatfmt=".3f"))
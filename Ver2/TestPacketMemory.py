@@ -0,0 +1,70 @@
+"""
+Compare the memory footprint and the creation speed of the __slots__ based Packet / PacketInfo
+with the former __dict__ based classes.
+
+python3 TestPacketMemory.py [number of objects]
+"""
+import sys
+import time
+import tracemalloc
+from tabulate import tabulate
+
+from packet import Packet, PacketInfo
+
+
+class DictPacket(object):
+    """Packet before __slots__"""
+    def __init__(self, pid=0, suid=0, duid=0, genTime=0, txTime=0, packetType=Packet.MSG):
+        self.pid = pid
+        self.suid= suid
+        self.duid= duid
+        self.packetType = packetType
+        self.genTime = genTime
+        self.txTime=txTime
+
+
+class DictPacketInfo(object):
+    """PacketInfo before __slots__"""
+    def __init__(self, pid, suid, duid, genTime=0, txTime=0, initTxTime=0, txAttempts=0, isFlying=True, util=0, RLState=[]):
+        self.pid=pid
+        self.suid=suid
+        self.duid=duid
+        self.genTime=genTime
+        self.txTime=txTime
+        self.initTxTime=initTxTime
+        self.txAttempts=txAttempts
+        self.isFlying=isFlying
+        self.RLState=RLState
+        self.util=util
+
+
+def measure(cls, num):
+    """return (bytes per object, objects created per second)"""
+    # memory: keep all objects alive, like an infinite window does
+    tracemalloc.start()
+    objs = [cls(pid=pid, suid=1, duid=2, genTime=pid, txTime=pid) for pid in range(num)]
+    memSize, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objs
+
+    # speed: create and drop, like the packets going through the channel
+    startTime = time.perf_counter()
+    for pid in range(num):
+        cls(pid=pid, suid=1, duid=2, genTime=pid, txTime=pid)
+    duration = time.perf_counter() - startTime
+
+    return memSize / num, num / duration
+
+
+if len(sys.argv) > 1:
+    num = int(sys.argv[1])
+else:
+    num = int(1e6)
+
+header = ["class", "bytes / obj", "objs / sec"]
+table = []
+for cls in [DictPacket, Packet, DictPacketInfo, PacketInfo]:
+    bytesPerObj, objsPerSec = measure(cls, num)
+    table.append([cls.__name__, bytesPerObj, objsPerSec])
+
+print(tabulate(table, headers=header, floatfmt=".1f"))
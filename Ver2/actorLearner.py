@@ -0,0 +1,235 @@
+"""
+Actor/learner split of the MCP training.
+
+MCP normally acts and learns in one call stack: each new experience may be followed by DQN.learn. Here
+    actors:  numActors simulation processes, each running the SimulationEnvironment2.py scenario (see
+             vecEnv.makeMCPScenario). The MCP flow acts with a local copy of DQNNet (ActorBrain), refreshed from
+             the PolicyStore every refreshPeriod ticks, and pushes its experiences to a SharedReplayMemory.
+    learner: one process training evalNet/tgtNet (DQN.learn) on the SharedReplayMemory as fast as it can, and
+             publishing the weights, epsilon and convergence of its DQN to the PolicyStore every publishPeriod steps.
+The processes are started with the spawn method of torch.multiprocessing, the shared tensors are handed over
+instead of copied. The results depend on the scheduling of the processes, hence are not reproducible.
+
+Usage:
+    actorResults, learnerResult, policyStore = runActorLearner(numActors=4, simulationPeriod=20000)
+    policyStore.net # trained DQNNet
+"""
+import sys
+import time
+import queue
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from RL_Brain import DQN, SharedReplayMemory, TrainScheduler
+from protocols.mcp_v2 import MCP
+from protocols.mcpNet import DQNNet
+from eventScheduler import EventScheduler
+from vecEnv import makeMCPScenario, scenarioPerf
+
+
+class PolicyStore(object):
+    """
+    weights of the learner's evalNet and its epsilon / loss / convergence, in shared memory.
+    Publishing and pulling the weights are done under lock, so an actor never copies a half written network.
+    """
+    VERSION, EPSILON, LOSS, IS_CONVERGE = range(4)
+
+    def __init__(self, lock, nStates=5, nActions=2):
+        self.net = DQNNet(nStates=nStates, nActions=nActions)
+        self.net.share_memory()
+        self.info = torch.zeros(4, dtype=torch.float64).share_memory_()
+        self.info[PolicyStore.VERSION] = -1 # nothing published yet
+        self.lock = lock
+
+    def version(self):
+        return int(self.info[PolicyStore.VERSION])
+
+    def publish(self, brain):
+        with self.lock:
+            self.net.load_state_dict(brain.evalNet.state_dict())
+            self.info[PolicyStore.EPSILON] = brain.epsilon
+            self.info[PolicyStore.LOSS] = float(brain.loss)
+            self.info[PolicyStore.IS_CONVERGE] = float(brain.isConverge)
+            self.info[PolicyStore.VERSION] += 1
+
+    def pull(self, net):
+        """copy the published weights to net. Returns the info (version, epsilon, loss, isConverge)"""
+        with self.lock:
+            net.load_state_dict(self.net.state_dict())
+            return self.info.tolist()
+
+
+class ActorBrain(object):
+    """
+    the acting half of a DQN, for MCP (param "trainScheduler"): chooses actions with a local copy of the learner's
+    network and epsilon, and sends the experiences to the shared memory in blocks of flushSize. learn() does nothing.
+    """
+    def __init__(self, policyStore, memory, nStates=5, nActions=2, flushSize=64, rng=None):
+        self.policyStore = policyStore
+        self.memory = memory
+        self.nStates = nStates
+        self.nActions = nActions
+        self.flushSize = flushSize
+        self.rng = rng if rng is not None else np.random
+
+        self.evalNet = DQNNet(nStates=nStates, nActions=nActions)
+        self.globalEvalOn = False
+        self.version = -1
+        self.epsilon = 0
+        self.loss = sys.maxsize
+        self.isConverge = False
+
+        self.experiences = [] # not yet in the shared memory
+
+        # performance check
+        self.refreshes = 0
+
+    # the acting code of DQN works on the same attributes
+    chooseAction = DQN.chooseAction
+    chooseActions = DQN.chooseActions
+
+    def refresh(self):
+        """push the pending experiences, and pull the newest policy of the learner if any"""
+        self.flush()
+        if self.policyStore.version() == self.version:
+            return
+        version, epsilon, loss, isConverge = self.policyStore.pull(self.evalNet)
+        self.version = int(version)
+        self.epsilon = epsilon
+        self.loss = loss
+        self.isConverge = bool(isConverge)
+        self.refreshes += 1
+
+    def storeExperience(self, s, a, r, s_):
+        self.experiences.append((s, a, r, s_))
+        if len(self.experiences) >= self.flushSize:
+            self.flush()
+
+    def flush(self):
+        if not self.experiences:
+            return
+        states, actions, rewards, nextStates = zip(*self.experiences)
+        self.memory.storeMany(states, actions, rewards, nextStates)
+        self.experiences = []
+
+    def learn(self):
+        pass
+
+
+def _actor(actorIdx, seed, memory, policyStore, simulationPeriod, transportParam, refreshPeriod, startTimeout,
+    resultQueue):
+    torch.set_num_threads(1)
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+
+    rng = np.random.RandomState(seed)
+    brain = ActorBrain(policyStore, memory, rng=rng)
+    deadline = time.perf_counter() + startTimeout
+    while policyStore.version() < 0: # the initial weights of the learner
+        if time.perf_counter() > deadline:
+            raise RuntimeError("actor {}: no policy published by the learner in {}s".format(actorIdx, startTimeout))
+        time.sleep(1e-3)
+    brain.refresh()
+
+    # the learner trains, the MCP flow only stores experiences
+    trainScheduler = TrainScheduler(brain, mode="tick", stepsPerTick=0)
+    clientList, serverList, channel, rng = makeMCPScenario(trainScheduler, transportParam=transportParam, rng=rng)
+    scheduler = EventScheduler(clientList, serverList, channel, rng=rng)
+    scheduler.addPeriodicHook(refreshPeriod, lambda tick: brain.refresh())
+
+    startTime = time.perf_counter()
+    scheduler.run(startTime=1, endTime=simulationPeriod)
+    duration = time.perf_counter() - startTime
+    brain.flush()
+
+    result = scenarioPerf(clientList, serverList)
+    result.update({"actor": actorIdx, "time": duration, "refreshes": brain.refreshes})
+    resultQueue.put(result)
+
+
+def _learner(seed, memory, policyStore, publishPeriod, stopEvent, resultQueue):
+    torch.set_num_threads(1)
+    torch.manual_seed(seed)
+
+    brain = MCP.newBrain(memory=memory)
+    brain.rng = np.random.RandomState(seed)
+    policyStore.publish(brain)
+
+    learnSteps, learnTime, convergeStep = 0, 0, -1
+    while not stopEvent.is_set():
+        if memory.size() < brain.batchSize:
+            time.sleep(1e-3)
+            continue
+        startTime = time.perf_counter()
+        brain.learn()
+        learnTime += time.perf_counter() - startTime
+        learnSteps += 1
+        if brain.isConverge and convergeStep < 0:
+            convergeStep = learnSteps
+        if learnSteps % publishPeriod == 0:
+            policyStore.publish(brain)
+    policyStore.publish(brain)
+
+    resultQueue.put({"learnSteps": learnSteps, "learnTime": learnTime, "experiences": memory.counter,
+        "convergeStep": convergeStep, "loss": float(brain.loss), "epsilon": brain.epsilon})
+
+
+def _terminate(processes):
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+
+def runActorLearner(numActors, simulationPeriod, transportParam={}, memoryCapacity=1e5, refreshPeriod=100,
+    publishPeriod=50, seed=0, startTimeout=60):
+    """
+    run numActors actors of simulationPeriod ticks each, and one learner until the actors are done.
+    transportParam: MCP params of the actors (see vecEnv.makeMCPScenario)
+    startTimeout: seconds the actors wait for the first policy of the learner, and the parent waits for the
+        final result of the learner
+    Raises RuntimeError, after terminating the other processes, if the learner or an actor dies.
+    Returns ([result of each actor], learner result, PolicyStore holding the trained network)
+    """
+    ctx = mp.get_context("spawn")
+    memory = SharedReplayMemory(memoryCapacity, nStates=5, lock=ctx.Lock())
+    policyStore = PolicyStore(ctx.Lock())
+    stopEvent = ctx.Event()
+    actorQueue, learnerQueue = ctx.Queue(), ctx.Queue()
+
+    learner = ctx.Process(target=_learner, args=(seed, memory, policyStore, publishPeriod, stopEvent, learnerQueue))
+    learner.start()
+    actors = []
+    for actorIdx in range(numActors):
+        actors.append(ctx.Process(target=_actor, args=(actorIdx, seed+1+actorIdx, memory, policyStore,
+            simulationPeriod, transportParam, refreshPeriod, startTimeout, actorQueue)))
+        actors[-1].start()
+
+    # results first, a process does not exit before its queue is consumed
+    actorResults = []
+    while len(actorResults) < numActors:
+        try:
+            actorResults.append(actorQueue.get(timeout=1))
+        except queue.Empty:
+            if not learner.is_alive(): # the learner only exits once stopEvent is set
+                _terminate(actors)
+                raise RuntimeError("learner died with exitcode {}".format(learner.exitcode))
+            if not any(actor.is_alive() for actor in actors) and actorQueue.empty():
+                break
+    for actor in actors:
+        actor.join()
+    actorResults.sort(key=lambda result: result["actor"])
+    stopEvent.set()
+    if len(actorResults) != numActors:
+        _terminate([learner])
+        raise RuntimeError("{} actors failed, exitcodes {}".format(numActors - len(actorResults),
+            [actor.exitcode for actor in actors]))
+    try:
+        learnerResult = learnerQueue.get(timeout=startTimeout)
+    except queue.Empty:
+        _terminate([learner])
+        raise RuntimeError("no result from the learner, exitcode {}".format(learner.exitcode))
+    learner.join()
+
+    return actorResults, learnerResult, policyStore
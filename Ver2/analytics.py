@@ -0,0 +1,73 @@
+"""
+Vectorized analytics for the recorded series, shared by the analysis scripts (plotPerformance.py, analyze_*.py).
+
+All functions take numpy arrays (or the np.memmap series of resultIO.loadResult) and work along axis 0 (time),
+so per slot / per stream loops become a few array operations. Extra axes (e.g. streams) are carried along.
+"""
+import numpy as np
+
+from protocols.baseTransportLayerProtocol import BaseTransportLayerProtocol
+
+
+def toIncrements(cumulative):
+    """cumulative counters (e.g. delivered pkts recorded every 30 ticks) -> increment in each record, the first record is kept"""
+    cumulative = np.asarray(cumulative)
+    return np.diff(cumulative, axis=0, prepend=np.zeros_like(cumulative[:1]))
+
+
+def rollingSum(data, window):
+    """
+    sum over the trailing $window records, partial windows at the beginning.
+    Same as np.convolve(data, np.ones(window))[:len(data)] for 1-d data
+    """
+    assert window >= 1, "window should be at least one record"
+    cumsum = np.cumsum(np.asarray(data, dtype=np.float64), axis=0)
+    rolling = cumsum.copy()
+    rolling[window:] -= cumsum[:-window]
+    return rolling
+
+
+def rollingMean(data, window):
+    """mean over the trailing $window records, partial windows at the beginning are averaged over the available records"""
+    data = np.asarray(data)
+    counts = np.minimum(np.arange(1, len(data)+1), window).reshape((-1, ) + (1, ) * (data.ndim-1))
+    return rollingSum(data, window) / counts
+
+
+def windowSum(data, window):
+    """sum over consecutive non overlapping windows of $window records, the last window may be partial"""
+    data = np.asarray(data)
+    if len(data) == 0:
+        return data[:0]
+    return np.add.reduceat(data, np.arange(0, len(data), window), axis=0)
+
+
+def windowDeliveryDelay(pktsPerTick, delayPerPkt, window, pktsGenPerTick=1):
+    """
+    delivery rate and average delay of each window of $window ticks, from the series of an EchoServer:
+        pktsPerTick: new packets delivered in each tick
+        delayPerPkt: delay of each new packet, in delivery order
+        pktsGenPerTick: packets generated by the client per tick
+    Returns (deliveryRate, avgDelay), avgDelay is 0 for windows without delivery
+    """
+    pktsPerTick = np.asarray(pktsPerTick)
+    deliveredPkts = windowSum(pktsPerTick, window)
+
+    # the packets delivered in window i are delayPerPkt[pktIdx[i]:pktIdx[i+1]]
+    pktIdx = np.concatenate(([0], np.cumsum(deliveredPkts)))
+    delayCumsum = np.concatenate(([0], np.cumsum(np.asarray(delayPerPkt, dtype=np.float64))))
+    sumDelay = delayCumsum[pktIdx[1:]] - delayCumsum[pktIdx[:-1]]
+
+    windowLen = np.minimum(window, len(pktsPerTick) - np.arange(0, len(pktsPerTick), window))
+    deliveryRate = deliveredPkts / (pktsGenPerTick * windowLen)
+    avgDelay = np.divide(sumDelay, deliveredPkts, out=np.zeros_like(sumDelay), where=deliveredPkts != 0)
+    return deliveryRate, avgDelay
+
+
+def utility(deliveryRate, avgDelay, alpha, beta1, beta2, **references):
+    """
+    BaseTransportLayerProtocol.calcUtility broadcast over arrays.
+    references: UDP_delivery, ARQ_delivery, UDP_delay, ARQ_delay overriding the defaults of calcUtility
+    """
+    return BaseTransportLayerProtocol.calcUtility(np.asarray(deliveryRate), np.asarray(avgDelay),
+        alpha, beta1, beta2, **references)
@@ -1,21 +1,20 @@
-import pickle as pkl
 import sys
 import argparse
 import numpy as np
 import matplotlib.pyplot as plt
+from resultIO import loadResult
 
 
 parser = argparse.ArgumentParser(description='Analyze MCP Stability 2 Data')
 parser.add_argument("-p", "--path", type=str,
-                    help="pkl file to be analyzed")
+                    help="result (.res or .pkl) to be analyzed")
 args = parser.parse_args()
 
 # get the ip and port of the server
 pklFilename = args.path
 
 
-with open(pklFilename, 'rb') as handle:
-    data = pkl.load(handle)
+data = loadResult(pklFilename)
 
 processRate = data["processRate"]
 
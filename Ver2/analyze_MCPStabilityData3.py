@@ -1,36 +1,14 @@
-import pickle as pkl
 import sys
 import argparse
 import numpy as np
 import matplotlib.pyplot as plt
+from resultIO import loadResult
+from analytics import toIncrements, utility
 
 
-def calcUtility(deliveryRate, avgDelay, alpha, beta1, beta2, UDP_delivery, ARQ_delivery, UDP_delay, ARQ_delay):
-    # def sigmoid(x):
-    #     return 1/ (1 + np.exp(-x))
-    # r = beta1*deliveryRate + beta2/np.log(avgDelay+2)
-    # r = beta1 * deliveryRate + beta2 * ( -2 * sigmoid(avgDelay / 100) + 2 )
-    # linear utility
-
-    UDP_dlvy, UDP_dly = UDP_delivery*0.9, UDP_delay*0.9
-    ARQ_dlvy, ARQ_dly = ARQ_delivery*1.1, ARQ_delay*1.1
-
-    
-    dlvy = (deliveryRate - UDP_dlvy) / (ARQ_dlvy - UDP_dlvy)
-    q = (avgDelay - UDP_dly) / (ARQ_dly-UDP_dly)
-
-    # dlvy = deliveryRate
-    # q = avgDelay / 611.003
-
-    # r = beta1*normalized_dlvy + beta2 * (1 - normalized_dly) # (0.6, 101) & (1.0, 672)
-
-    r = -beta1*((1-dlvy)**alpha) - beta2*(q**alpha)
-
-    return r
-
 parser = argparse.ArgumentParser(description='Analyze MCP Stability 3 Data')
 parser.add_argument("-p", "--path", type=str, required=True,
-                    help="pkl file to be analyzed")
+                    help="result (.res or .pkl) to be analyzed")
 
 args = parser.parse_args()
 
@@ -38,8 +16,7 @@ args = parser.parse_args()
 pklFilename = args.path
 
 
-with open(pklFilename, 'rb') as handle:
-    data = pkl.load(handle)
+data = loadResult(pklFilename)
 
 utilParam = data["utilParam"]
 chParamInst = data["chParamInst"]
@@ -73,10 +50,7 @@ for idx in range(len(throughputData)):
 
     # plot throughput
     f = plt.figure(idx*4+0)
-    throughput_data_per_trial = np.asarray(throughputData[idx])
-
-    throughput_data_per_trial[1:-1, :] -= throughput_data_per_trial[0:-2, :] 
-    throughput_data_per_trial = throughput_data_per_trial[:-1, :]  # remove the last item
+    throughput_data_per_trial = toIncrements(throughputData[idx])[:-1, :]  # remove the last item
 
     timeline = np.asarray(range(len(throughput_data_per_trial[:, 0]))) * 30
 
@@ -88,10 +62,7 @@ for idx in range(len(throughputData)):
 
     # plot MCP retrans prob
     f = plt.figure(idx*4+1)
-    MCPretransAttempts = np.asarray(MCPPerf["retransAttempts"])
-
-    MCPretransAttempts[1:-1] -= MCPretransAttempts[0:-2] 
-    MCPretransAttempts = MCPretransAttempts[:-1]  # remove the last item
+    MCPretransAttempts = toIncrements(MCPPerf["retransAttempts"])[:-1]  # remove the last item
 
     timeline = np.asarray(range(len(MCPretransAttempts))) * 30
 
@@ -111,28 +82,12 @@ for idx in range(len(throughputData)):
 
     # plot UDP, MCP, ARQ utility vs time
     f = plt.figure(idx*4+3)
-    UDP_utilList, MCP_utilList, ARQ_utilList = [], [], []
-    for slotId in range(len(deliveryRateData[idx])):
-        UDP_util = calcUtility(
-            deliveryRate=deliveryRateData[idx][slotId][UDP_streamid], 
-            avgDelay=delayData[idx][slotId][UDP_streamid], 
-            alpha=alpha, beta1=beta1, beta2=beta2, UDP_delivery=UDP_delivery, ARQ_delivery=ARQ_delivery, 
-            UDP_delay=UDP_delay, ARQ_delay=ARQ_delay)
-        UDP_utilList.append(UDP_util)
-
-        MCP_util = calcUtility(
-            deliveryRate=deliveryRateData[idx][slotId][MCP_streamid], 
-            avgDelay=delayData[idx][slotId][MCP_streamid], 
-            alpha=alpha, beta1=beta1, beta2=beta2, UDP_delivery=UDP_delivery, ARQ_delivery=ARQ_delivery, 
-            UDP_delay=UDP_delay, ARQ_delay=ARQ_delay)
-        MCP_utilList.append(MCP_util)
-
-        ARQ_util = calcUtility(
-            deliveryRate=deliveryRateData[idx][slotId][ARQ_streamid], 
-            avgDelay=delayData[idx][slotId][ARQ_streamid], 
-            alpha=alpha, beta1=beta1, beta2=beta2, UDP_delivery=UDP_delivery, ARQ_delivery=ARQ_delivery, 
-            UDP_delay=UDP_delay, ARQ_delay=ARQ_delay)
-        ARQ_utilList.append(ARQ_util)
+    # utility of every slot and stream at once, shape slots x streams
+    utilData = utility(
+        deliveryRate=deliveryRateData[idx], avgDelay=delayData[idx], 
+        alpha=alpha, beta1=beta1, beta2=beta2, UDP_delivery=UDP_delivery, ARQ_delivery=ARQ_delivery, 
+        UDP_delay=UDP_delay, ARQ_delay=ARQ_delay)
+    UDP_utilList, MCP_utilList, ARQ_utilList = utilData[:, UDP_streamid], utilData[:, MCP_streamid], utilData[:, ARQ_streamid]
     
     plt.plot(timeline, UDP_utilList, label=dataDesc[UDP_streamid])
     plt.plot(timeline, MCP_utilList, label=dataDesc[MCP_streamid])
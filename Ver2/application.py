@@ -1,10 +1,14 @@
 """
 The original design in Ver1 is chaoatic. In this design, application.py only incharge of the Application layer of the 4-layer network stack (not the OSI, but the TCP/IP stack). 
 """
+import sys
 import numpy as np
+from collections import deque
 import pickle as pkl
-from packet import Packet
+from packet import Packet, packetPool
 from transportLayer import TransportLayerHelper
+from resultIO import dumpPklAtomic
+from metricsSink import MemorySink
 
 class EchoClient(object):
     """
@@ -72,10 +76,15 @@ class EchoClient(object):
         trafficParamHandleDict[trafficMode](trafficParam)
         
 
-    def __init__(self, clientId, serverId, protocolName, transportParam, trafficMode, trafficParam, txBufferLen=None, verbose=False):
+    def __init__(self, clientId, serverId, protocolName, transportParam, trafficMode, trafficParam, txBufferLen=None, verbose=False, rng=None):
+        """rng: source of the poisson traffic (np.random.RandomState / Generator), default the global numpy RNG"""
         self.uid = clientId
         self.duid = serverId
         self.verbose = verbose
+        self.protocolName = protocolName
+        self.transportParam = transportParam
+        self.txBufferLen = txBufferLen
+        self.rng = rng if rng is not None else np.random
 
         self.startTime=-1
         self.lastTime=-1
@@ -98,15 +107,52 @@ class EchoClient(object):
             self.pktsPerTick = self.trafficParam["lambda"]
     
     def ticking(self, ACKPktList=[]):
+        self.tickBegin()
+        return self.tickEnd(ACKPktList)
+
+    def tickBegin(self):
+        """first half of ticking(): advance the clock and feed the new packets to the transport layer"""
         self.time += 1
         # generate packets
         pktList = self.trafficGenerator()
         # feed packets to transport layer
         self.transportObj.receiveFromApplication(pktList)
 
-        pktToSend = self.transportObj.sendPkts(ACKPktList)
-        
-        return pktToSend
+    def tickEnd(self, ACKPktList=[]):
+        """second half of ticking(): the transport layer handles the ACKs and returns the packets to send"""
+        return self.transportObj.sendPkts(ACKPktList)
+
+    def nextWakeTime(self):
+        """
+        The earliest client time at which ticking() may do more than advancing the clock, 
+        assuming no ACK addressed to this client arrives before then.
+        """
+        # traffic generation
+        startTime, lastTime = self.trafficParam["startTime"], self.trafficParam["lastTime"]
+        genTime = max(self.time+1, startTime+1)
+        if self.trafficMode == "periodic":
+            period = self.trafficParam["period"]
+            if self.trafficParam["pktsPerPeriod"] <= 0:
+                genTime = sys.maxsize
+            elif (genTime - startTime) % period:
+                genTime += period - (genTime - startTime) % period
+        if lastTime != -1 and genTime > lastTime+startTime:
+            genTime = sys.maxsize
+        if genTime == self.time+1: # no need to look into the transport layer
+            return genTime
+
+        # transport layer, whose clock may have a different offset from ours
+        protocol = self.transportObj.instance
+        protocolWakeTime = protocol.nextWakeTime()
+        if protocolWakeTime != sys.maxsize:
+            protocolWakeTime += self.time - protocol.time
+
+        return min(genTime, protocolWakeTime)
+
+    def skipTicks(self, ticks):
+        """advance the client by $ticks idle ticks (see nextWakeTime)"""
+        self.time += ticks
+        self.transportObj.instance.skipTicks(ticks)
 
     def trafficGenerator(self):
         def periodicTrafficGenerator():
@@ -116,7 +162,7 @@ class EchoClient(object):
                 return []
         
         def poissonTrafficGenerator():
-            pktNum = np.random.poisson(lam=self.trafficParam["lambda"])
+            pktNum = self.rng.poisson(lam=self.trafficParam["lambda"])
             return self._genNewPkts(pktNum)
 
         # check start and end time
@@ -139,7 +185,7 @@ class EchoClient(object):
         pktList = []
         while num < pktNum:
             pktList.append(
-                Packet(
+                packetPool.acquire(
                     pid=self.pid,
                     suid=self.uid,
                     duid=self.duid,
@@ -157,6 +203,15 @@ class EchoClient(object):
     def getPktGen(self):
         return self.pid
     
+    # transport params that only observe a run (see tracer.py, metricsSink.py), they do not change its result
+    observerParams = {"tracer", "metricsSink"}
+
+    def getConfig(self):
+        """settings that determine the behavior of the client"""
+        transportParam = {key: value for key, value in self.transportParam.items() if key not in EchoClient.observerParams}
+        return {"uid": self.uid, "duid": self.duid, "protocolName": self.protocolName, "transportParam": transportParam,
+            "trafficMode": self.trafficMode, "trafficParam": self.trafficParam, "txBufferLen": self.txBufferLen}
+
     def getProtocolName(self):
         return self.transportObj.protocolName
 
@@ -180,8 +235,11 @@ class EchoServer(object):
         assert ACKMode in {"LC", "SACK"}, "ACKMode should be None or LC or SACK" 
         return ACKMode
 
-    def __init__(self, serverId, ACKMode=None, verbose=False):
+    def __init__(self, serverId, ACKMode=None, verbose=False, metricsSink=None):
         """
+        metricsSink: where pktsPerTick, delayPerPkt and perfRecords are recorded, see metricsSink.py. 
+            Default in memory lists.
+
         If you would like to save the current dataset for future evaluation, set 
             store_dataset=True
         If you simply want to save the time by reusing the transmission data from previous slot,
@@ -200,40 +258,55 @@ class EchoServer(object):
         self.time = -1
 
         # performance counter
-        self.pktInfo = {}
+        self.pktInfo = {} # None/SACK: pid -> delay
+        # LC: the delay of the packets received above self.ack, rcvWindow[0] is pid self.ack+1, None if not received yet.
+        # Packets up to self.ack only remain in self.deliveredDelay
+        self.rcvWindow = deque()
         self.maxSeenPid = -1
+        # sum of the delay of the delivered packets, updated on packet arrival:
+        # None/SACK: sum of self.pktInfo (the latest delay of each pid), LC: sum of the delay of pid 0 to self.ack
+        self.deliveredDelay = 0
 
         # a list recording the number of new acks in each tick
-        self.pktsPerTick = []
-        self.delayPerPkt = []
+        if metricsSink is None:
+            metricsSink = MemorySink()
+        self.pktsPerTick = metricsSink.series("server{}_pktsPerTick".format(self.uid), np.int64)
+        self.delayPerPkt = metricsSink.series("server{}_delayPerPkt".format(self.uid), np.int64)
         self.serverSidePerfRecord = []
 
         # param to record utility per tick
-        self.ack_prev = -1
         self.sumDelay = 0       # used to compute delay for all received packets
         self.sumDelay_prev = 0
         self.deliveredPkts = 0
         self.deliveredPkts_prev = 0
         self.clientSidePid = -1
         self.clientSidePid_prev = -1
-        self.perfRecords = []
+        # [time, deliveredPktsInc, deliveryRate, avgDelay, util]
+        self.perfRecords = metricsSink.series("server{}_perfRecords".format(self.uid), np.float64, numColumns=5)
         self.newPids = set()
 
         #
         self.loadFromDatafile = False 
 
+    def getConfig(self):
+        """settings that determine the behavior of the server"""
+        return {"uid": self.uid, "ACKMode": self.ACKMode}
+
     def storePerf(self, filename, clientPid, distincPktsSent, clientSidePerf):
         # store the current states to dictionary, then to file
         data = {}
-        data["perfRecords"] = self.perfRecords
+        # file backed series are copied, so that the stored file does not depend on the sink files
+        def materialize(series):
+            return series if isinstance(series, list) else np.asarray(series)
+
+        data["perfRecords"] = materialize(self.perfRecords)
         data["serverSidePerf"] = self.serverSidePerfRecord
         data["clientSidePerf"] = clientSidePerf
         data["clientPid"] = clientPid
         data["distincPktsSent"]=distincPktsSent
-        data["pktsPerTick"]=self.pktsPerTick
-        data["delayPerPkt"] = self.delayPerPkt
-        with open(filename, 'wb') as f:
-            pkl.dump(data, f, protocol=pkl.HIGHEST_PROTOCOL)
+        data["pktsPerTick"]=materialize(self.pktsPerTick)
+        data["delayPerPkt"] = materialize(self.delayPerPkt)
+        dumpPklAtomic(data, filename)
         
             
 
@@ -242,6 +315,8 @@ class EchoServer(object):
         with open(previous_dataFile, 'rb') as f:
             data = pkl.load(f)
         self.perfRecords = data["perfRecords"]
+        if not isinstance(self.perfRecords, list): # memory mapped series, read only
+            self.perfRecords = np.array(self.perfRecords)
         self.serverSidePerfRecord = data["serverSidePerf"]
         self.pktsPerTick = data["pktsPerTick"]
         self.delayPerPkt = data["delayPerPkt"]
@@ -276,6 +351,11 @@ class EchoServer(object):
 
         return ACKPktList
 
+    def skipTicks(self, ticks):
+        """advance the server by $ticks ticks in which no packet arrives"""
+        self.time += ticks
+        self.pktsPerTick.extend([0] * ticks)
+
 
     def _handlePkts(self, pktList=[]):
         usefulPktList = []
@@ -295,12 +375,16 @@ class EchoServer(object):
 
     def _handlePktList_None(self, usefulPktList):
         for pkt in usefulPktList:
+            delay = self.time - pkt.genTime
             if pkt.pid not in self.pktInfo:
                 self.pktsPerTick[-1] += 1
-                self.delayPerPkt.append(self.time - pkt.genTime)
+                self.delayPerPkt.append(delay)
                 self.newPids.add(pkt.pid)
+                self.deliveredDelay += delay
+            else:
+                self.deliveredDelay += delay - self.pktInfo[pkt.pid]
 
-            self.pktInfo[pkt.pid] = self.time - pkt.genTime
+            self.pktInfo[pkt.pid] = delay
             self.maxSeenPid = max(self.maxSeenPid, pkt.pid)
         return []
 
@@ -310,12 +394,16 @@ class EchoServer(object):
         
 
         for pkt in usefulPktList:
+            delay = self.time - pkt.genTime
             if pkt.pid not in self.pktInfo:
                 self.pktsPerTick[-1] += 1
-                self.delayPerPkt.append(self.time - pkt.genTime)
+                self.delayPerPkt.append(delay)
                 self.newPids.add(pkt.pid)
+                self.deliveredDelay += delay
+            else:
+                self.deliveredDelay += delay - self.pktInfo[pkt.pid]
 
-            self.pktInfo[pkt.pid] = self.time - pkt.genTime
+            self.pktInfo[pkt.pid] = delay
             self.maxSeenPid = max(self.maxSeenPid, pkt.pid)
 
             pkt.duid, pkt.suid = pkt.suid, pkt.duid
@@ -328,12 +416,10 @@ class EchoServer(object):
         # self.verbose = True
         def updateACK():
             """update self.ack to largest consecutive pkt id"""
-            # update self.ACK
-            for ack in range(self.ack+1, self.maxSeenPid+1):
-                if ack not in self.pktInfo: # we have cached this packet
-                    break
-                else:
-                    self.ack = ack
+            # slide the receive window over the consecutive received packets
+            while self.rcvWindow and self.rcvWindow[0] is not None:
+                self.deliveredDelay += self.rcvWindow.popleft()
+                self.ack += 1
 
         ACKPacketList = []
 
@@ -343,11 +429,14 @@ class EchoServer(object):
             # update ACK. Note that self.ack is the largest consecutive packet id
             if pkt.pid > self.ack:
                 # print("ACK @", self.time, " ", pkt.pid)
-                if pkt.pid not in self.pktInfo:
+                offset = pkt.pid - self.ack - 1
+                if offset >= len(self.rcvWindow):
+                    self.rcvWindow.extend([None] * (offset - len(self.rcvWindow) + 1))
+                if self.rcvWindow[offset] is None:
                     self.pktsPerTick[-1] += 1
                     self.delayPerPkt.append(self.time - pkt.genTime)
 
-                    self.pktInfo[pkt.pid] = self.time - pkt.genTime
+                    self.rcvWindow[offset] = self.time - pkt.genTime
                     self.maxSeenPid = max(self.maxSeenPid, pkt.pid)
 
                     updateACK()
@@ -381,15 +470,11 @@ class EchoServer(object):
             self.maxSeenPid = clientPid
 
         # overall delivery prob 
-        sumDelay = 0
+        sumDelay = self.deliveredDelay
         if self.ACKMode == "LC":
             deliveredPkts = self.ack+1
-            for pid in range(self.ack+1):
-                sumDelay += self.pktInfo[pid]
         else:
             deliveredPkts = len(self.pktInfo)
-            for pid in self.pktInfo:
-                sumDelay += self.pktInfo[pid]
         
         # deal with divide by 0 problem
         if deliveredPkts != 0:
@@ -417,8 +502,7 @@ class EchoServer(object):
         
         if self.ACKMode == "LC":
             self.deliveredPkts = self.ack+1
-            for pid in range(self.ack_prev+1, self.ack+1):
-                self.sumDelay += self.pktInfo[pid]
+            self.sumDelay = self.deliveredDelay
         else:
             self.deliveredPkts = len(self.pktInfo)
             for pid in self.newPids:
@@ -21,6 +21,9 @@ Channel Model:
                 "uniform":  {min: <min>, max: <max>}
             queue_size: int  if >= 1, finite queue, otherwise, infinite queue
          
+        VectorizedChannel is the same channel backed by NumPy arrays (see ArrayChannelBuffer). 
+        It draws the packet losses of a tick in one call, from its own generator.
+
     2. Hidden Markov Mode -> Class MarkoveChannel (Not implement yet. Seems to be not useful)
         The channel changes among each input modes following a discrete Markov process.
 
@@ -31,9 +34,10 @@ Channel Model:
             trans_prob: a N x N matrix storing the transition probability. row i col j: from state i to state j
 """
 import random
+import numpy as np
 
-from channelBuffer import ChannelBuffer
-from packet import Packet
+from channelBuffer import ChannelBuffer, ArrayChannelBuffer
+from packet import Packet, packetPool
 
 class SingleModeChannel(object):
     """
@@ -54,13 +58,15 @@ class SingleModeChannel(object):
         return processRate
 
     def ifKeepThePkt(self):
-        if random.uniform(0, 1) < self.pktDropProb:
+        if self.rng.uniform(0, 1) < self.pktDropProb:
             return False
         
         return True 
 
-    def __init__(self, processRate=1, rtt=0, bufferSize=0, pktDropProb=0, verbose=False):
+    def __init__(self, processRate=1, rtt=0, bufferSize=0, pktDropProb=0, verbose=False, rng=None):
+        """rng: source of the loss decisions, with a uniform(low, high) method (np.random.RandomState / Generator). Default the random module"""
         self.pktDropProb = pktDropProb
+        self.rng = rng if rng is not None else random
         
         self.bufferSize = self.parseQueueSize(bufferSize)
         self.processRate = self.parseProcessRate(processRate)
@@ -149,6 +155,17 @@ class SingleModeChannel(object):
     def setProcessRate(self, processRate):
         self.processRate = self.parseProcessRate(processRate)
 
+    """
+    event driven support
+    """
+    def nextWakeTime(self):
+        """the earliest channel time at which getPackets() may release a packet"""
+        return self.channelBuffer.nextReleaseTime(self.time)
+
+    def skipTicks(self, ticks):
+        """advance the channel by $ticks ticks in which no packet is put or released"""
+        self.time += ticks
+
     
     """
     buffer profile
@@ -161,6 +178,65 @@ class SingleModeChannel(object):
         print(self.channelBuffer)
 
 
+class VectorizedChannel(SingleModeChannel):
+    """
+    SingleModeChannel whose buffer is an ArrayChannelBuffer. 
+
+    Loss decisions of a tick are drawn at once from rng (a numpy Generator, default np.random.default_rng()), 
+    and up to processRate packets are released with one slice. 
+    The channel owns the packets put into it: accepted packets are copied into the buffer and released to packetPool, 
+    and packets leaving the channel are acquired from packetPool.
+
+    The fixed cost of the numpy calls pays off when many packets go through the channel per tick 
+    (several hundreds). For a handful of packets per tick SingleModeChannel is faster.
+    """
+    def __init__(self, processRate=1, rtt=0, bufferSize=0, pktDropProb=0, verbose=False, rng=None):
+        rng = rng if rng is not None else np.random.default_rng()
+        super(VectorizedChannel, self).__init__(processRate=processRate, rtt=rtt, bufferSize=bufferSize, pktDropProb=pktDropProb, verbose=verbose, rng=rng)
+
+    def _initBuffer(self):
+        self.channelBuffer = ArrayChannelBuffer(self.bufferSize, rtt=self.rtt)
+
+    def putPackets(self, packetList):
+        self.time += 1
+
+        if not packetList:
+            return []
+
+        if self.pktDropProb > 0:
+            keepList = (self.rng.random(len(packetList)) >= self.pktDropProb).tolist()
+            keptIdxs = [idx for idx, keep in enumerate(keepList) if keep]
+        else:
+            keepList = [True] * len(packetList)
+            keptIdxs = range(len(packetList))
+        
+        keptPktList = [packetList[idx] for idx in keptIdxs]
+        acceptedNum = self.channelBuffer.enqueueBatch(keptPktList, time=self.time)
+        # accepted packets have been copied into the buffer
+        packetPool.releaseList(keptPktList[:acceptedNum])
+
+        if acceptedNum == len(packetList): # nothing dropped
+            return []
+        
+        # kept packets after the first $acceptedNum ones are dropped because of the full queue
+        cutIdx = keptIdxs[acceptedNum] if acceptedNum < len(keptIdxs) else len(packetList)
+
+        if self.verbose:
+            lostPktList = [pkt for pkt, keep in zip(packetList, keepList) if not keep]
+            fullQueuePktList = [packetList[idx] for idx in keptIdxs[acceptedNum:]]
+            if lostPktList:
+                print("[-] Channel: {} loss {}".format(len(lostPktList), ["{suid}-{pid}".format(suid=pkt.suid, pid=pkt.pid) for pkt in lostPktList]))
+            if fullQueuePktList:
+                print("[-] Channel: {} drop {}".format(len(fullQueuePktList), ["{suid}-{pid}".format(suid=pkt.suid, pid=pkt.pid) for pkt in fullQueuePktList]))
+
+        # generate NACK packet inplace, in the order of packetList
+        NACKPacketList = [pkt for pkt, keep in zip(packetList[:cutIdx], keepList[:cutIdx]) if not keep] + packetList[cutIdx:]
+        return [self._genNACKFromPkt(pkt) for pkt in NACKPacketList]
+
+    def getPackets(self):
+        return self.channelBuffer.dequeueBatch(self.time, maxNum=self.processRate)
+
+
 
 if __name__ == "__main__":
     channel = SingleModeChannel(processRate=1, rtt=100, bufferSize=300)
@@ -1,6 +1,7 @@
 import sys
 from collections import deque
-from packet  import Packet
+import numpy as np
+from packet  import Packet, packetPool
 
 class ChannelBuffer(object):
     """
@@ -24,8 +25,8 @@ class ChannelBuffer(object):
         self.rtt = rtt
 
         self.numPacketsInBuffer = 0
-        self.FIFOQueue = deque(maxlen=self.bufferSize)
-        self.timeQueue = deque(maxlen=self.bufferSize) # used to store the enque time of each packet
+        self.FIFOQueue = deque(maxlen=self.bufferSize or None) # maxlen=None for an infinite queue
+        self.timeQueue = deque(maxlen=self.bufferSize or None) # used to store the enque time of each packet
     
     def isFull(self):
         """check whether the channel can still accept packets"""
@@ -61,9 +62,141 @@ class ChannelBuffer(object):
 
             return True, _packet
         return False, []
+
+    def nextReleaseTime(self, time):
+        """
+        The earliest time > $time at which dequeue() may return a packet.
+        Returns sys.maxsize if the buffer is empty.
+        """
+        if not self.FIFOQueue:
+            return sys.maxsize
+        return max(time+1, self.timeQueue[0]+self.rtt)
     
             
 
+class ArrayChannelBuffer(object):
+    """
+        Same FIFO queue as ChannelBuffer, but packets are stored as rows of a ring of fixed-width 
+        int64 arrays instead of Python objects, so that a whole tick of packets can be enqueued 
+        and released with slicing.
+
+        columns: pid, suid, duid, genTime, txTime, packetType, enqueue time
+
+        Packet objects are rebuilt (from packetPool) when they leave the buffer.
+        Attributes other than the columns above are not carried through the buffer.
+    """
+    PID, SUID, DUID, GEN_TIME, TX_TIME, TYPE, ENQ_TIME = range(7)
+    NUM_COLUMNS = 7
+
+    def __init__(self, bufferSize=0, rtt=0, initCapacity=1024):
+        self.bufferSize = 0 if bufferSize < 0 else bufferSize
+
+        self.rtt = rtt
+
+        self.numPacketsInBuffer = 0
+        # an infinite buffer starts with initCapacity slots and doubles its capacity when full
+        self.capacity = self.bufferSize if self.bufferSize > 0 else initCapacity
+        self.ring = np.zeros((self.capacity, ArrayChannelBuffer.NUM_COLUMNS), dtype=np.int64)
+        self.head = 0 # index of the oldest packet
+
+    def isFull(self):
+        """check whether the channel can still accept packets"""
+        return self.bufferSize > 0 and self.numPacketsInBuffer >= self.bufferSize
+
+    def isEmpty(self):
+        return self.numPacketsInBuffer == 0
+
+    def size(self):
+        return self.numPacketsInBuffer
+    
+    def availSpace(self):
+        if self.bufferSize > 0:
+            return self.bufferSize - self.numPacketsInBuffer
+        return sys.maxsize
+
+    def enqueue(self, packet, time=0):
+        return self.enqueueBatch([packet], time=time) == 1
+
+    def dequeue(self, time=-sys.maxsize):
+        packetList = self.dequeueBatch(time=time, maxNum=1)
+        if packetList:
+            return True, packetList[0]
+        return False, []
+
+    def enqueueBatch(self, packetList, time=0):
+        """
+        Enqueue packets in order until the buffer is full. 
+        Return the number of packets accepted, i.e. packetList[:num] are in the buffer.
+        """
+        num = min(len(packetList), self.availSpace())
+        if num <= 0:
+            return 0
+        
+        if self.numPacketsInBuffer + num > self.capacity:
+            self._grow(self.numPacketsInBuffer + num)
+
+        rows = np.array(
+            [(pkt.pid, pkt.suid, pkt.duid, pkt.genTime, pkt.txTime, pkt.packetType, time) for pkt in packetList[:num]], 
+            dtype=np.int64)
+        
+        # write to the ring, in at most two segments
+        tail = (self.head + self.numPacketsInBuffer) % self.capacity
+        firstSegLen = min(num, self.capacity - tail)
+        self.ring[tail:tail+firstSegLen] = rows[:firstSegLen]
+        self.ring[:num-firstSegLen] = rows[firstSegLen:]
+
+        self.numPacketsInBuffer += num
+
+        return num
+
+    def dequeueBatch(self, time=-sys.maxsize, maxNum=1):
+        """Release up to maxNum packets whose retention time in buffer >= rtt"""
+        num = min(maxNum, self.numPacketsInBuffer)
+        if num <= 0:
+            return []
+        
+        rows = self._peek(num)
+        # enqueue times are non-decreasing, so the releasable packets are a prefix
+        num = int(np.searchsorted(rows[:, ArrayChannelBuffer.ENQ_TIME], time-self.rtt, side="right"))
+        if num == 0:
+            return []
+
+        packetList = [
+            packetPool.acquire(pid=pid, suid=suid, duid=duid, genTime=genTime, txTime=txTime, packetType=packetType) 
+            for pid, suid, duid, genTime, txTime, packetType, _ in rows[:num].tolist()]
+
+        self.head = (self.head + num) % self.capacity
+        self.numPacketsInBuffer -= num
+
+        return packetList
+
+    def nextReleaseTime(self, time):
+        """
+        The earliest time > $time at which dequeue() may return a packet.
+        Returns sys.maxsize if the buffer is empty.
+        """
+        if self.numPacketsInBuffer == 0:
+            return sys.maxsize
+        return max(time+1, int(self.ring[self.head, ArrayChannelBuffer.ENQ_TIME])+self.rtt)
+
+    def _peek(self, num):
+        """the oldest num rows, copied out of the ring if they wrap around"""
+        if self.head + num <= self.capacity:
+            return self.ring[self.head:self.head+num]
+        return np.concatenate((self.ring[self.head:], self.ring[:self.head+num-self.capacity]))
+
+    def _grow(self, minCapacity):
+        capacity = self.capacity
+        while capacity < minCapacity:
+            capacity *= 2
+        ring = np.zeros((capacity, ArrayChannelBuffer.NUM_COLUMNS), dtype=np.int64)
+        ring[:self.numPacketsInBuffer] = self._peek(self.numPacketsInBuffer)
+        self.ring = ring
+        self.capacity = capacity
+        self.head = 0
+
+
+
 if __name__ == "__main__":
 
     buffer = ChannelBuffer(bufferSize=3, rtt=2)
@@ -0,0 +1,97 @@
+"""
+Run the same scenario with several seeds in parallel worker processes, and report the mean and the 95% confidence
+interval of its metrics.
+
+A scenario is a module level function scenario(rngs, **params) -> {metric name: value}. It builds its components with
+their own RNG stream rngs.get(name) (np.random.RandomState), e.g.
+
+    channel = SingleModeChannel(..., rng=rngs.get("channel"))
+    client = EchoClient(..., rng=rngs.get("client1"))
+    EventScheduler(clientList, serverList, channel, rng=rngs.get("scheduler"))
+
+The stream of a component only depends on the seed and on its name, so adding a component does not change the
+streams of the others. torch (DQN weight initialization) is seeded with the seed in each worker, if installed.
+
+Usage:
+    results = runEnsemble(scenario, seeds=range(8), params={...})
+    printEnsemble(results)
+"""
+import os
+import zlib
+import random
+import multiprocessing
+import numpy as np
+from tabulate import tabulate
+
+
+class RNGStreams(object):
+    """independent RNG streams of one seed, one per component name"""
+    def __init__(self, seed):
+        self.seed = seed
+        self.streams = {}
+
+    def get(self, name):
+        if name not in self.streams:
+            seedSeq = np.random.SeedSequence([self.seed, zlib.crc32(name.encode())])
+            self.streams[name] = np.random.RandomState(np.random.MT19937(seedSeq))
+        return self.streams[name]
+
+
+def _runSeed(task):
+    scenario, seed, params = task
+
+    try: # the baselines (UDP, ARQ, TCP) run without torch
+        import torch
+    except ImportError:
+        torch = None
+    if torch is not None:
+        torch.manual_seed(seed)
+        torch.set_num_threads(1) # one process per core already
+    # anything left on the global RNGs is seeded as well
+    np.random.seed(seed)
+    random.seed(seed)
+
+    return seed, scenario(RNGStreams(seed), **params)
+
+
+def runEnsemble(scenario, seeds, params={}, processes=None):
+    """run scenario(RNGStreams(seed), **params) for each seed. Returns [(seed, metrics), ...] in the order of seeds"""
+    seeds = list(seeds)
+    processes = processes if processes else min(os.cpu_count(), len(seeds))
+    tasks = [(scenario, seed, params) for seed in seeds]
+
+    if processes == 1:
+        return [_runSeed(task) for task in tasks]
+
+    with multiprocessing.Pool(processes, maxtasksperchild=1) as pool:
+        return pool.map(_runSeed, tasks, chunksize=1)
+
+
+# two-sided 95% quantile of the student t distribution, by degree of freedom
+_t975 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+         2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+         2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+def summarizeEnsemble(results):
+    """{metric: (mean, std, ciLow, ciHigh)}, ci is the 95% confidence interval of the mean"""
+    summary = {}
+    for metric in results[0][1]:
+        values = np.asarray([metrics[metric] for _, metrics in results], dtype=np.float64)
+        mean = values.mean()
+        if len(values) < 2:
+            summary[metric] = (mean, 0, mean, mean)
+            continue
+        std = values.std(ddof=1)
+        df = len(values) - 1
+        t = _t975[df-1] if df <= len(_t975) else 1.96
+        halfWidth = t * std / np.sqrt(len(values))
+        summary[metric] = (mean, std, mean - halfWidth, mean + halfWidth)
+    return summary
+
+
+def printEnsemble(results):
+    header = ["metric", "mean", "std", "95% ci low", "95% ci high"]
+    table = [[metric] + list(stats) for metric, stats in summarizeEnsemble(results).items()]
+    print("{} seeds".format(len(results)))
+    print(tabulate(table, headers=header))
@@ -0,0 +1,269 @@
+"""
+Event driven version of the simulation loop used by the drivers (SimulationEnvironment2.py, TestMCPStability*.py).
+
+The drivers advance the time tick by tick:
+
+    for time in range(1, simulationPeriod+1):
+        step 1: each server processes the pkts dequeued from the channel in the previous tick -> ACKPacketList
+        step 2: clients (in random permutation order) tick with ACKPacketList -> packetList_enCh
+        step 3: channel.putPackets(packetList_enCh)
+        step 4: packetList_deCh = channel.getPackets()
+
+At low load most of these ticks are no-ops. EventScheduler keeps a priority queue of the next wake up time of each
+client (packet generation, protocol timeout) together with the channel release time and the hook times, and jumps
+straight to the next event. Components that are not involved in a tick are left behind and caught up lazily
+(skipTicks) before they are used, so the results are identical to the tick loop.
+
+Packets are routed by destination once per tick (routeByDestination): each server only receives the packets 
+addressed to it and each client only the ACKs addressed to it, instead of every endpoint scanning the whole list.
+With N flows this is O(N) per tick instead of O(N^2).
+
+The scheduler owns the packet lists passed between the steps and recycles the packets through packetPool once 
+they are consumed: the ACKs after all clients ticked, the NACKs returned by the channel (no channel feedback), 
+and the dequeued packets that no server turned into an ACK.
+
+Usage:
+    scheduler = EventScheduler(clientList, serverList, channel)
+    scheduler.addPeriodicHook(30, recordPerf)   # recordPerf(time) is called after tick 30, 60, ...
+    scheduler.run(startTime=1, endTime=simulationPeriod)
+"""
+import sys
+import heapq
+import numpy as np
+
+from packet import Packet, packetPool
+
+
+def routeByDestination(pktList):
+    """bucket packets by destination uid. Returns {duid: [pkt, ...]}, the order of pktList is kept in each bucket"""
+    pktsByDuid = {}
+    for pkt in pktList:
+        bucket = pktsByDuid.get(pkt.duid)
+        if bucket is None:
+            pktsByDuid[pkt.duid] = [pkt]
+        else:
+            bucket.append(pkt)
+    return pktsByDuid
+
+
+class EventScheduler(object):
+    """
+    clientList: list of EchoClient
+    serverList: list of EchoServer
+    channel: SingleModeChannel shared by all clients
+    eventDriven: False to tick every component in every tick (the original loop)
+    keepRNGInSync: draw the client permutation of skipped ticks as well, so that the global numpy RNG stream
+        (poisson traffic, DQN) is the same as in the tick loop. Set to False to skip the draws; results are then
+        statistically equivalent but no longer identical.
+    rng: source of the client permutations (np.random.RandomState / Generator), default the global numpy RNG
+    profiler: profiler.Profiler to time the components with, None (default) for no profiling
+    """
+
+    def __init__(self, clientList, serverList, channel, eventDriven=True, keepRNGInSync=True, rng=None, profiler=None):
+        self.clientList = clientList
+        self.serverList = serverList
+        self.channel = channel
+        self.eventDriven = eventDriven
+        self.keepRNGInSync = keepRNGInSync
+        self.rng = rng if rng is not None else np.random
+
+        self.clientIdxByUid = {}
+        for idx, client in enumerate(self.clientList):
+            self.clientIdxByUid.setdefault(client.uid, []).append(idx)
+        self.serverIdxByUid = {}
+        for idx, server in enumerate(self.serverList):
+            self.serverIdxByUid.setdefault(server.uid, []).append(idx)
+
+        self.hooks = [] # [period or None, time or None, callback]
+
+        self.time = 0
+        self.packetList_deCh = []
+
+        # performance check
+        self.perfDict = {"activeTicks": 0, "skippedTicks": 0}
+        if profiler is not None:
+            profiler.instrument(self)
+
+    """
+    hooks
+    """
+    def addPeriodicHook(self, period, callback):
+        """call callback(time) after each tick whose time is a multiple of period"""
+        assert isinstance(period, int) and period > 0, "period must be a positive integer"
+        self.hooks.append([period, None, callback])
+
+    def addHook(self, time, callback):
+        """
+        call callback(time) once after tick $time.
+        An action that should take place at the beginning of tick t can be hooked at t-1.
+        """
+        self.hooks.append([None, time, callback])
+
+    def _nextHookTime(self):
+        nextTime = sys.maxsize
+        for period, time, _ in self.hooks:
+            if period:
+                nextTime = min(nextTime, (self.time // period + 1) * period)
+            elif time > self.time:
+                nextTime = min(nextTime, time)
+        return nextTime
+
+    def _runHooks(self, time):
+        for period, hookTime, callback in self.hooks:
+            if (period and time % period == 0) or (not period and hookTime == time):
+                if self.eventDriven:
+                    self._syncAll(time)
+                callback(time)
+
+    """
+    simulation
+    """
+    def run(self, startTime, endTime):
+        """simulate tick startTime to tick endTime (both included)"""
+        self.time = startTime - 1
+        self.packetList_deCh = []
+
+        if not self.eventDriven:
+            for time in range(startTime, endTime+1):
+                self._tickAll(time)
+                self._runHooks(time)
+            return
+
+        # every component is in sync with self.time
+        self.clientSyncTime = [self.time] * len(self.clientList)
+        self.serverSyncTime = [self.time] * len(self.serverList)
+        self.clientWakeTime = [sys.maxsize] * len(self.clientList)
+        self.wakeHeap = []
+        for idx in range(len(self.clientList)):
+            self._scheduleClient(idx)
+
+        while self.time < endTime:
+            nextTime = self._nextEventTime()
+            if nextTime > endTime:
+                self._skipTo(endTime)
+                break
+            self._skipTo(nextTime-1)
+            self._tickActive(nextTime)
+            self._runHooks(nextTime)
+
+        self._syncAll(self.time)
+
+    def _tickAll(self, time):
+        self.time = time
+
+        deChByDuid = routeByDestination(self.packetList_deCh)
+        ACKPacketList = []
+        for server in self.serverList:
+            ACKPacketList += server.ticking(deChByDuid.get(server.uid, []))
+        self._releaseDequeuedPkts()
+
+        ACKByDuid = routeByDestination(ACKPacketList)
+        packetList_enCh = []
+        for clientIdx in self.rng.permutation(len(self.clientList)):
+            client = self.clientList[clientIdx]
+            packetList_enCh += client.ticking(ACKByDuid.get(client.uid, []))
+        packetPool.releaseList(ACKPacketList)
+
+        packetPool.releaseList(self.channel.putPackets(packetList_enCh))
+        self.packetList_deCh = self.channel.getPackets()
+
+    def _tickActive(self, time):
+        """tick $time, only involving the servers that receive packets and the clients that are due or receive ACKs"""
+        self.time = time
+        self.perfDict["activeTicks"] += 1
+
+        # step 1: servers receiving packets
+        ACKPacketList = []
+        if self.packetList_deCh:
+            deChByDuid = routeByDestination(self.packetList_deCh)
+            serverIdxs = []
+            for duid in deChByDuid:
+                serverIdxs += self.serverIdxByUid.get(duid, [])
+            for idx in sorted(serverIdxs):
+                self._syncServer(idx, time-1)
+                ACKPacketList += self.serverList[idx].ticking(deChByDuid[self.serverList[idx].uid])
+                self.serverSyncTime[idx] = time
+            self._releaseDequeuedPkts()
+
+        # step 2: clients that are due or receive ACKs
+        clientOrder = self.rng.permutation(len(self.clientList))
+
+        activeClientIdxs = set()
+        while self.wakeHeap and self.wakeHeap[0][0] <= time:
+            wakeTime, idx = heapq.heappop(self.wakeHeap)
+            if self.clientWakeTime[idx] == wakeTime:
+                activeClientIdxs.add(idx)
+        ACKByDuid = routeByDestination(ACKPacketList)
+        for duid in ACKByDuid:
+            activeClientIdxs.update(self.clientIdxByUid.get(duid, []))
+
+        packetList_enCh = []
+        if activeClientIdxs:
+            for idx in clientOrder:
+                if idx not in activeClientIdxs:
+                    continue
+                self._syncClient(idx, time-1)
+                client = self.clientList[idx]
+                packetList_enCh += client.ticking(ACKByDuid.get(client.uid, []))
+                self.clientSyncTime[idx] = time
+                self._scheduleClient(idx)
+        packetPool.releaseList(ACKPacketList)
+
+        # step 3 & 4: channel
+        packetPool.releaseList(self.channel.putPackets(packetList_enCh))
+        self.packetList_deCh = self.channel.getPackets()
+
+    def _releaseDequeuedPkts(self):
+        """release the dequeued packets that have not been turned into ACKs by the servers"""
+        packetPool.releaseList([pkt for pkt in self.packetList_deCh if pkt.packetType != Packet.ACK])
+
+    def _nextEventTime(self):
+        if self.packetList_deCh:
+            return self.time + 1
+
+        # drop outdated heap entries
+        while self.wakeHeap and self.clientWakeTime[self.wakeHeap[0][1]] != self.wakeHeap[0][0]:
+            heapq.heappop(self.wakeHeap)
+        nextTime = self.wakeHeap[0][0] if self.wakeHeap else sys.maxsize
+
+        channelWakeTime = self.channel.nextWakeTime()
+        if channelWakeTime != sys.maxsize:
+            nextTime = min(nextTime, self.time + channelWakeTime - self.channel.time)
+
+        return max(self.time + 1, min(nextTime, self._nextHookTime()))
+
+    def _skipTo(self, time):
+        """skip the idle ticks up to $time (included). Only the channel and the RNG are kept in sync"""
+        ticks = time - self.time
+        if ticks <= 0:
+            return
+        if self.keepRNGInSync:
+            for _ in range(ticks):
+                self.rng.permutation(len(self.clientList))
+        self.channel.skipTicks(ticks)
+        self.perfDict["skippedTicks"] += ticks
+        self.time = time
+
+    def _scheduleClient(self, idx):
+        client = self.clientList[idx]
+        wakeTime = client.nextWakeTime()
+        if wakeTime != sys.maxsize:
+            wakeTime += self.clientSyncTime[idx] - client.time
+            heapq.heappush(self.wakeHeap, (wakeTime, idx))
+        self.clientWakeTime[idx] = wakeTime
+
+    def _syncClient(self, idx, time):
+        if time > self.clientSyncTime[idx]:
+            self.clientList[idx].skipTicks(time - self.clientSyncTime[idx])
+            self.clientSyncTime[idx] = time
+
+    def _syncServer(self, idx, time):
+        if time > self.serverSyncTime[idx]:
+            self.serverList[idx].skipTicks(time - self.serverSyncTime[idx])
+            self.serverSyncTime[idx] = time
+
+    def _syncAll(self, time):
+        for idx in range(len(self.clientList)):
+            self._syncClient(idx, time)
+        for idx in range(len(self.serverList)):
+            self._syncServer(idx, time)
@@ -0,0 +1,174 @@
+"""
+Sinks for the series recorded during a simulation (EchoServer.pktsPerTick, delayPerPkt, perfRecords,
+MCP.pktIgnoredCounter ...).
+
+A sink hands out one series per name. The series is used like a list: append, extend, len, indexing and
+slicing, and series[-1] += 1 on the last record.
+
+MemorySink: plain python lists, everything stays in memory (default).
+ChunkedFileSink: each series is an append-only binary file of fixed-schema records <dirname>/<name>.bin
+    (raw array of dtype, numColumns values per record) with its schema in <name>.json. Only the last chunkSize
+    records are kept in memory, older ones are read back from the file when indexed.
+    Pickling a series (e.g. storePerf, the result pkl of the drivers) stores a reference to its file,
+    unpickling memory-maps it.
+
+Usage:
+    sink = ChunkedFileSink("results/run1")
+    server = EchoServer(serverId=111, ACKMode="SACK", metricsSink=sink)
+    ...
+    sink.close()
+    pktsPerTick = openSeries("results/run1/server111_pktsPerTick.bin") # np.memmap
+"""
+import os
+import json
+import numpy as np
+
+
+def openSeries(filename, mode='r'):
+    """memory-map a series written by ChunkedFileSink. Returns an array of shape (n,) or (n, numColumns)"""
+    with open(filename[:-4] + ".json", 'r') as f:
+        schema = json.load(f)
+    dtype = np.dtype(schema["dtype"])
+    numColumns = schema["numColumns"]
+
+    if os.path.getsize(filename) == 0: # np.memmap refuses empty files
+        data = np.zeros(0, dtype=dtype)
+    else:
+        data = np.memmap(filename, dtype=dtype, mode=mode)
+    if numColumns > 1:
+        data = data.reshape(-1, numColumns)
+    return data
+
+
+class MemorySink(object):
+    def series(self, name, dtype=np.int64, numColumns=1):
+        return []
+
+    def close(self):
+        pass
+
+
+class ChunkedFileSink(object):
+    def __init__(self, dirname, chunkSize=65536):
+        self.dirname = dirname
+        self.chunkSize = chunkSize
+        self.seriesDict = {}
+        os.makedirs(self.dirname, exist_ok=True)
+
+    def series(self, name, dtype=np.int64, numColumns=1):
+        assert name not in self.seriesDict, "series {} already exists".format(name)
+        self.seriesDict[name] = ChunkedSeries(os.path.join(self.dirname, name + ".bin"), dtype, numColumns, self.chunkSize)
+        return self.seriesDict[name]
+
+    def close(self):
+        for series in self.seriesDict.values():
+            series.flush()
+
+
+class ChunkedSeries(object):
+    """
+    list-like series backed by an append-only file.
+    Records are buffered in a chunk of chunkSize records and the chunk is appended to the file once full.
+    The last record is always in the buffer, so it can be modified (series[-1] += 1).
+    Records already in the file are read-only.
+    """
+    def __init__(self, filename, dtype=np.int64, numColumns=1, chunkSize=65536):
+        self.filename = filename
+        self.dtype = np.dtype(dtype)
+        self.numColumns = numColumns
+        self.chunkSize = chunkSize
+
+        shape = (chunkSize, numColumns) if numColumns > 1 else (chunkSize, )
+        self.buffer = np.zeros(shape, dtype=self.dtype)
+        self.bufferLen = 0
+        self.flushedLen = 0 # records in the file
+        self.flushedData = None # memory map of the file, invalidated by flush
+
+        with open(self.filename[:-4] + ".json", 'w') as f:
+            json.dump({"dtype": self.dtype.str, "numColumns": numColumns}, f)
+        open(self.filename, 'wb').close()
+
+    def append(self, record):
+        if self.bufferLen == self.chunkSize:
+            self.flush()
+        self.buffer[self.bufferLen] = record
+        self.bufferLen += 1
+
+    def extend(self, records):
+        records = np.asarray(records, dtype=self.dtype)
+        while len(records):
+            if self.bufferLen == self.chunkSize:
+                self.flush()
+            num = min(len(records), self.chunkSize - self.bufferLen)
+            self.buffer[self.bufferLen:self.bufferLen+num] = records[:num]
+            self.bufferLen += num
+            records = records[num:]
+
+    def flush(self):
+        if self.bufferLen == 0:
+            return
+        with open(self.filename, 'ab') as f:
+            f.write(self.buffer[:self.bufferLen].tobytes())
+        self.flushedLen += self.bufferLen
+        self.bufferLen = 0
+        self.flushedData = None
+
+    def _flushed(self):
+        if self.flushedData is None:
+            self.flushedData = openSeries(self.filename)
+        return self.flushedData
+
+    def __len__(self):
+        return self.flushedLen + self.bufferLen
+
+    def _bufferIdx(self, idx):
+        """index in self.buffer of record idx, negative if the record is in the file"""
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("series index out of range")
+        return idx - self.flushedLen
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return self.toArray()[key]
+            stop = max(start, stop)
+            parts = []
+            if start < self.flushedLen:
+                parts.append(self._flushed()[start:min(stop, self.flushedLen)])
+            if stop > self.flushedLen:
+                parts.append(self.buffer[max(start-self.flushedLen, 0):stop-self.flushedLen])
+            if not parts:
+                return self.buffer[:0].copy()
+            return np.concatenate(parts)
+
+        bufferIdx = self._bufferIdx(key)
+        if bufferIdx < 0:
+            return self._flushed()[bufferIdx + self.flushedLen]
+        return self.buffer[bufferIdx].copy() # the buffer is reused after a flush
+
+    def __setitem__(self, key, record):
+        bufferIdx = self._bufferIdx(key)
+        if bufferIdx < 0:
+            raise IndexError("records already written to {} can not be modified".format(self.filename))
+        self.buffer[bufferIdx] = record
+
+    def __iter__(self):
+        for start in range(0, self.flushedLen, self.chunkSize):
+            yield from self._flushed()[start:start+self.chunkSize]
+        yield from self.buffer[:self.bufferLen].copy()
+
+    def toArray(self):
+        """the whole series in memory"""
+        return self[:]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self.toArray()
+        return data if dtype is None else data.astype(dtype)
+
+    def __reduce__(self):
+        # pickle as a reference to the file
+        self.flush()
+        return (openSeries, (os.path.abspath(self.filename), ))
@@ -0,0 +1,65 @@
+"""
+Frozen DQN policy with a pure numpy forward pass, for evaluation runs of MCP.
+
+A trained DQNNet (protocols/mcpNet.py: linear layers with sigmoid in between) is exported to a .npz file of its
+weights. NumpyPolicy computes the same Q values in numpy (float32) and takes the argmax, i.e. the greedy action of
+DQN.chooseAction(s). This module only needs numpy: no torch call is made to act with the policy.
+For a network this small the numpy forward costs a few microseconds per call, torch mostly dispatch overhead.
+
+Usage:
+    NumpyPolicy.fromNet(mcp.RL_Brain.evalNet).save("policy.npz")
+    client = EchoClient(..., protocolName="mcp", transportParam={..., "policy": "policy.npz"})
+"""
+import numpy as np
+
+
+class NumpyPolicy(object):
+    """
+    layers: list of (weight, bias), weight of shape out x in as torch.nn.Linear. Sigmoid after every layer but the last
+    """
+    def __init__(self, layers):
+        # transposed once, so that the forward is states @ weight + bias
+        self.weights = [np.ascontiguousarray(np.asarray(weight, dtype=np.float32).T) for weight, _ in layers]
+        self.biases = [np.asarray(bias, dtype=np.float32) for _, bias in layers]
+        self.nStates = self.weights[0].shape[0]
+        self.nActions = self.weights[-1].shape[1]
+
+        # what MCP reads from its brain: a frozen policy is converged and always greedy
+        self.loss = 0
+        self.epsilon = 1
+        self.isConverge = True
+
+    @staticmethod
+    def fromNet(net):
+        """freeze a network of linear layers (e.g. DQNNet), whose forward is the one of NumpyPolicy"""
+        stateDict = net.state_dict()
+        layerNames = [name[:-len(".weight")] for name in stateDict if name.endswith(".weight")]
+        return NumpyPolicy([(stateDict[name + ".weight"].detach().cpu().numpy(),
+            stateDict[name + ".bias"].detach().cpu().numpy()) for name in layerNames])
+
+    @staticmethod
+    def load(filename):
+        with np.load(filename) as data:
+            numLayers = len(data.files) // 2
+            return NumpyPolicy([(data["weight{}".format(i)], data["bias{}".format(i)]) for i in range(numLayers)])
+
+    def save(self, filename):
+        arrays = {}
+        for i, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            arrays["weight{}".format(i)] = weight.T
+            arrays["bias{}".format(i)] = bias
+        np.savez(filename, **arrays)
+
+    def forward(self, states):
+        """Q values of states (n x nStates), of shape n x nActions"""
+        x = np.asarray(states, dtype=np.float32).reshape(-1, self.nStates)
+        for weight, bias in zip(self.weights[:-1], self.biases[:-1]):
+            x = 0.5 + 0.5 * np.tanh(0.5 * (x @ weight + bias)) # sigmoid, without overflow of exp
+        return x @ self.weights[-1] + self.biases[-1]
+
+    def chooseAction(self, state, evalOn=True):
+        return int(np.argmax(self.forward(state)[0]))
+
+    def chooseActions(self, states, evalOn=True):
+        """greedy action of each state, an int array"""
+        return np.argmax(self.forward(states), axis=1)
@@ -1,5 +1,11 @@
 """
 Packet class defines the packet instance in the simulation
+
+Packet and PacketInfo are created for every packet (and every retransmission), so both use __slots__ 
+instead of a per-instance __dict__. Assigning an attribute that is not listed in __slots__ raises AttributeError.
+See TestPacketMemory.py for the memory / speed comparison.
+
+Packets can be recycled through packetPool (see PacketPool) instead of being left to the garbage collector.
 """
 
 class Packet(object):
@@ -10,8 +16,10 @@ class Packet(object):
     MSG = 0
     ACK = 1
     NACK = 2
+
+    __slots__ = ("pid", "suid", "duid", "packetType", "genTime", "txTime", "initTxTime")
     
-    def __init__(self, pid=0, suid=0, duid=0, genTime=0, txTime=0, packetType=MSG):
+    def __init__(self, pid=0, suid=0, duid=0, genTime=0, txTime=0, packetType=MSG, initTxTime=0):
         self.pid = pid
         self.suid= suid
         self.duid= duid
@@ -20,7 +28,7 @@ class Packet(object):
         self.txTime=txTime
         # self.txAttempts=txAttempts
         
-        # self.initTxTime=initTxTime
+        self.initTxTime=initTxTime
         # self.rttHat=rttHat
         # self.pktLossHat=pktLossHat
     
@@ -37,6 +45,8 @@ class PacketInfo(object):
     """
     A class helps to record packet info
     """
+    __slots__ = ("pid", "suid", "duid", "genTime", "txTime", "initTxTime", "txAttempts", "isFlying", "RLState", "util")
+
     def __init__(self, pid, suid, duid, genTime=0, txTime=0, initTxTime=0, txAttempts=0, isFlying=True, util=0, RLState=[]):
         self.pid=pid
         self.suid=suid
@@ -50,7 +60,7 @@ class PacketInfo(object):
         self.util=util
     
     def toPacket(self):
-        pkt = Packet(
+        pkt = packetPool.acquire(
             pid= self.pid,
             suid= self.suid,
             duid= self.duid,
@@ -61,4 +71,82 @@ class PacketInfo(object):
         return pkt
 
     def __str__(self):
-        return "Packet Info: pid:{pid} {suid}->{duid} gen@{genTime} initTx@{initTxTime} lastTx@{txTime} txAttempts:{txAttempts} isFlying:{isFlying}".format(pid=self.pid, suid=self.suid, duid=self.duid, genTime=self.genTime, txTime=self.txTime, initTxTime=self.initTxTime, txAttempts=self.txAttempts, isFlying=self.isFlying)
\ No newline at end of file
+        return "Packet Info: pid:{pid} {suid}->{duid} gen@{genTime} initTx@{initTxTime} lastTx@{txTime} txAttempts:{txAttempts} isFlying:{isFlying}".format(pid=self.pid, suid=self.suid, duid=self.duid, genTime=self.genTime, txTime=self.txTime, initTxTime=self.initTxTime, txAttempts=self.txAttempts, isFlying=self.isFlying)
+
+
+class ReleasedPacket(Packet):
+    """
+    Class of the packets held by a PacketPool in debug mode. 
+    Reading or writing any attribute raises, which catches a use after release.
+    """
+    __slots__ = ()
+
+    def __getattribute__(self, name):
+        if name == "__class__":
+            return object.__getattribute__(self, name)
+        raise RuntimeError("packet used after being released to the PacketPool (reading {})".format(name))
+    
+    def __setattr__(self, name, value):
+        if name == "__class__":
+            return object.__setattr__(self, name, value)
+        raise RuntimeError("packet used after being released to the PacketPool (writing {})".format(name))
+
+
+class PacketPool(object):
+    """
+    A free list of Packet objects.
+
+    acquire() takes the same arguments as Packet() and reuses a released packet if there is one.
+    release() hands a packet back. The caller must own the packet: nobody else may hold a reference to it.
+
+    Ownership in the simulation:
+        clients / protocols -> channel -> servers (turned into ACK in place) -> clients
+    The simulation loop (EventScheduler) releases the ACKs once all clients consumed them, 
+    the NACKs returned by the channel, and the dequeued packets no server turned into an ACK.
+
+    debug: released packets become ReleasedPacket until acquired again, so that any use after release 
+        or double release raises RuntimeError. Set it before the simulation starts.
+    """
+    def __init__(self, debug=False):
+        self.debug = debug
+        self.freeList = []
+
+        # performance check
+        self.perfDict = {"acquired": 0, "reused": 0, "released": 0}
+
+    def acquire(self, pid=0, suid=0, duid=0, genTime=0, txTime=0, packetType=Packet.MSG, initTxTime=0):
+        self.perfDict["acquired"] += 1
+        if not self.freeList:
+            return Packet(pid=pid, suid=suid, duid=duid, genTime=genTime, txTime=txTime, packetType=packetType, initTxTime=initTxTime)
+        
+        self.perfDict["reused"] += 1
+        pkt = self.freeList.pop()
+        if self.debug:
+            pkt.__class__ = Packet
+        pkt.pid = pid
+        pkt.suid = suid
+        pkt.duid = duid
+        pkt.packetType = packetType
+        pkt.genTime = genTime
+        pkt.txTime = txTime
+        pkt.initTxTime = initTxTime
+        return pkt
+
+    def release(self, pkt):
+        if self.debug:
+            if type(pkt) is ReleasedPacket:
+                raise RuntimeError("packet released twice")
+            pkt.__class__ = ReleasedPacket
+        self.perfDict["released"] += 1
+        self.freeList.append(pkt)
+
+    def releaseList(self, pktList):
+        for pkt in pktList:
+            self.release(pkt)
+
+    def size(self):
+        return len(self.freeList)
+
+
+# the pool shared by the whole simulation
+packetPool = PacketPool()
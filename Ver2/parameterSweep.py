@@ -0,0 +1,173 @@
+"""
+Run SimulationEnvironment2.py over a grid of utility and channel settings in parallel.
+
+Each run is one (alpha, beta1, beta2, channel) tuple, executed in a worker process of a pool sized to the machine.
+The result (.res, see resultIO.saveResult) of each run is written atomically by SimulationEnvironment2.py, and its stdout goes to a .log file
+next to it. The worker sends the MCP summary row back to the main process, which keeps the rows of the finished
+runs in sweepIndex.pkl under the result root. A later sweep with the same grid skips the runs already in the index
+(resume), and summary.csv of each result directory is written from the index without re-reading the results.
+
+Layout (same as experiment1.py used to produce):
+    results/alpha{alpha}/perfData2_{alpha}_{beta1}_{beta2}.res              default channel
+    results/alpha{alpha}/{channelTag}/perfData2_{alpha}_{beta1}_{beta2}.res  other channels
+    results/alpha{alpha}[/{channelTag}]/summary.csv                         one column per (beta1, beta2), as summary_all.py
+
+Usage:
+    sweep = ParameterSweep(alphaList=[2], beta1List=[0, 0.5, 1], simulationTime=20000)
+    sweep.run()
+"""
+import os
+import sys
+import time
+import runpy
+import pickle as pkl
+import contextlib
+import multiprocessing
+import numpy as np
+from tabulate import tabulate
+
+from resultIO import dumpPklAtomic
+
+
+defaultChannelParam = {"processRate":3, "bufferSize":300, "rtt":100, "pktDropProb":0.1}
+
+
+def channelTag(channelParam):
+    """subdirectory of a channel setting, empty for the default channel"""
+    if channelParam == defaultChannelParam:
+        return ""
+    return "ch_{processRate}_{bufferSize}_{rtt}_{pktDropProb}".format(**channelParam)
+
+
+def _runSimulation(task):
+    """
+    worker: run SimulationEnvironment2.py for one setting.
+    Returns (key, summary row or None, error message or None, duration)
+    """
+    key, argv, logFilename = task
+
+    # forked workers inherit the RNG state of the parent, draw a fresh one as a separate process would
+    np.random.seed()
+    import torch
+    torch.seed()
+    torch.set_num_threads(1) # one process per core already
+
+    startTime = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(logFilename), exist_ok=True)
+        with open(logFilename, 'w') as logFile, contextlib.redirect_stdout(logFile):
+            sys.argv = ["SimulationEnvironment2.py"] + argv
+            simGlobals = runpy.run_path("SimulationEnvironment2.py", run_name="__main__")
+    except Exception as e:
+        return key, None, repr(e), time.perf_counter() - startTime
+
+    data = simGlobals["deliveredPktsPerSlot"]
+    row = None
+    for item in data["general"]:
+        if item[0] == "MCP":
+            row = item[4:11] + [data["MCP"]["clientPerf"]["retranProb"]]
+            break
+    return key, row, None, time.perf_counter() - startTime
+
+
+class ParameterSweep(object):
+    """
+    alphaList, beta1List: utility settings to test
+    beta2List: None for beta2 = 1 - beta1, otherwise every (beta1, beta2) pair is tested
+    channelList: list of channel settings {"processRate", "bufferSize", "rtt", "pktDropProb"}, default the channel of SimulationEnvironment2.py
+    processes: size of the process pool, default os.cpu_count()
+    resume: False to discard the index and run everything again. Cached baseline results (resultCache) are kept, 
+        they are only reused for the same configuration
+    """
+
+    def __init__(self, alphaList, beta1List, beta2List=None, channelList=None, simulationTime=20000,
+        processes=None, resume=True, resultRoot="results"):
+        self.alphaList = alphaList
+        self.beta1List = beta1List
+        self.beta2List = beta2List
+        self.channelList = channelList if channelList else [defaultChannelParam]
+        self.simulationTime = simulationTime
+        self.processes = processes if processes else os.cpu_count()
+        self.resume = resume
+        self.resultRoot = resultRoot
+        self.indexFilename = os.path.join(resultRoot, "sweepIndex.pkl")
+
+        self.index = {} # key -> {"resultDir", "beta1", "beta2", "row"}
+
+    def _tasks(self):
+        """list of (key, argv, logFilename, resultDir, beta1, beta2)"""
+        tasks = []
+        for alpha in self.alphaList:
+            alpha = np.round(alpha, 2)
+            for channelParam in self.channelList:
+                tag = channelTag(channelParam)
+                for beta1 in self.beta1List:
+                    beta1 = float(beta1)
+                    beta2List = [1 - beta1] if self.beta2List is None else self.beta2List
+                    for beta2 in beta2List:
+                        beta2 = float(beta2)
+                        resultFilename = "perfData2_{alpha}_{beta1}_{beta2}.res".format(alpha=alpha, beta1=beta1, beta2=beta2)
+                        # SimulationEnvironment2.py stores to results/alpha{alpha}/resultFilename
+                        resultFilename = os.path.join(tag, resultFilename)
+                        resultDir = os.path.join(self.resultRoot, "alpha{alpha}".format(alpha=alpha), tag)
+                        argv = [str(alpha), str(beta1), str(beta2), resultFilename, str(self.simulationTime)]
+                        if tag:
+                            argv += [str(channelParam[k]) for k in ["processRate", "bufferSize", "rtt", "pktDropProb"]]
+                        key = " ".join(argv)
+                        logFilename = os.path.join(resultDir, os.path.basename(resultFilename)[:-4] + ".log")
+                        tasks.append((key, argv, logFilename, resultDir, beta1, beta2))
+        return tasks
+
+    def _loadIndex(self):
+        if self.resume and os.path.exists(self.indexFilename):
+            with open(self.indexFilename, 'rb') as f:
+                self.index = pkl.load(f)
+        else:
+            self.index = {}
+
+    def run(self):
+        self._loadIndex()
+
+        tasks = self._tasks()
+        todo = [task for task in tasks if task[0] not in self.index]
+        taskInfo = {task[0]: task for task in todo}
+        print("{} runs, {} done, {} to go on {} processes".format(len(tasks), len(tasks)-len(todo), len(todo), self.processes))
+
+        failed = []
+        if todo:
+            # one task per child: SimulationEnvironment2.py keeps its state in module globals
+            with multiprocessing.Pool(self.processes, maxtasksperchild=1) as pool:
+                for key, row, err, duration in pool.imap_unordered(_runSimulation, [task[:3] for task in todo]):
+                    if err:
+                        failed.append(key)
+                        print("failed  [{}] {}".format(key, err))
+                        continue
+                    _, _, _, resultDir, beta1, beta2 = taskInfo[key]
+                    self.index[key] = {"resultDir": resultDir, "beta1": beta1, "beta2": beta2, "row": row}
+                    dumpPklAtomic(self.index, self.indexFilename)
+                    print("done    [{}] {:.1f}s".format(key, duration))
+
+        self.summarize(tasks)
+        if failed:
+            print("{} runs failed, run the sweep again to retry them".format(len(failed)))
+        return failed
+
+    def summarize(self, tasks=None):
+        """write summary.csv of each result directory of the sweep, from the index"""
+        if tasks is None:
+            tasks = self._tasks()
+        keys = {task[0] for task in tasks}
+
+        rowsByDir = {}
+        for key, entry in self.index.items():
+            if key in keys and entry["row"] is not None:
+                rowsByDir.setdefault(entry["resultDir"], []).append([entry["beta1"], entry["beta2"]] + entry["row"])
+
+        for resultDir, rows in rowsByDir.items():
+            rows.sort()
+            cleanedRst = np.asarray(rows)
+            np.savetxt(os.path.join(resultDir, "summary.csv"), cleanedRst.T, delimiter=",", fmt='%f')
+
+            header = ["beta1", "beta2", "dlvy perc", "avg dly", "sys util", "l25p dlvy", "l25p dlvy perc", "l25p dly", "l25p util", "retrans prob"]
+            print(resultDir)
+            print(tabulate(rows, headers=header))
@@ -1,18 +1,18 @@
 import matplotlib.pyplot as plt
-import pickle as pkl
 import numpy as np
 import sys
 from tabulate import tabulate
+from resultIO import loadResult, isResult, resultName
+from analytics import rollingSum
 
 
 if len(sys.argv) > 1:
-    if isinstance(sys.argv[1], str) and sys.argv[1].endswith(".pkl"):
-        datafileName = sys.argv[1]
+    if isinstance(sys.argv[1], str) and isResult(sys.argv[1].rstrip("/")):
+        datafileName = sys.argv[1].rstrip("/")
 else:
-    datafileName = 'perfData2.pkl'
+    datafileName = 'perfData2.res'
 
-with open(datafileName, 'rb') as handle:
-    data = pkl.load(handle)
+data = loadResult(datafileName)
 
 generalData = data["general"]
 header = data["header"]
@@ -29,7 +29,7 @@ for protocol in data["protocols"]:
 
 print(tabulate(generalData, headers=header))
 
-with open(datafileName[:-4]+".txt", 'w') as f:
+with open(resultName(datafileName)+".txt", 'w') as f:
     f.write(tabulate(generalData, headers=header).__str__())
 
 
@@ -49,9 +49,8 @@ for protocolName in data["protocols"]:
     dataToPlot = perfData[:, 4]
     xdata = perfData[:, 0]
 
-    """method 1: convolution"""
-    dataToPlot = np.convolve(dataToPlot, np.ones((slidingWindow, )))
-    dataToPlot = dataToPlot[:-slidingWindow+1]
+    """method 1: rolling sum"""
+    dataToPlot = rollingSum(dataToPlot, slidingWindow)
     """method 2: count per $slidingWindow tick"""
     # dataToPlot = np.concatenate((dataToPlot, np.zeros(slidingWindow - len(dataToPlot) % slidingWindow)))
     # dataToPlot = np.reshape(dataToPlot, [slidingWindow, len(dataToPlot)//slidingWindow])
@@ -0,0 +1,122 @@
+"""
+Lookup table of the retransmission decisions of a trained MCP policy.
+
+The decision of MCP only depends on the state of the timeout packet [txAttempts, age, SRTT, pktLossHat, avgDelay]
+(see MCP._getTimeoutStates). PolicyTable.compile cuts the state space into cells, one grid of cell centers per state
+dimension, asks the policy (a DQN, or numpyPolicy.NumpyPolicy) the action of each cell center once and keeps the
+actions in a uint8 array. A state is then decided by the action of the cell of the nearest centers: no network at
+all. The cost of the quantization is measured by agreement(), the ratio of states on which table and policy agree.
+
+Usage:
+    grids = quantileGrids(mcp.RL_Brain.memory.states[:mcp.RL_Brain.memory.size()].numpy(), cellsPerDim=16)
+    PolicyTable.compile(policy, grids).save("table.npz")
+    client = EchoClient(..., protocolName="mcp", transportParam={..., "policy": "table.npz"})
+"""
+import bisect
+import numpy as np
+
+from numpyPolicy import NumpyPolicy
+
+
+class PolicyTable(object):
+    """
+    grids: list of the sorted cell centers of each state dimension
+    table: actions of the cells, of shape (len(grid) for grid in grids)
+    """
+    def __init__(self, grids, table):
+        self.grids = [np.asarray(grid, dtype=np.float64) for grid in grids]
+        self.table = np.asarray(table, dtype=np.uint8)
+        assert self.table.shape == tuple(len(grid) for grid in self.grids), "table shape does not match the grids"
+        self.nStates = len(self.grids)
+
+        # a value falls in the cell of the nearest center: cells are separated by the midpoints of the centers
+        self.boundaries = [(grid[1:] + grid[:-1]) / 2 for grid in self.grids]
+        self.boundaryLists = [boundary.tolist() for boundary in self.boundaries] # bisect is faster for one state
+        self.flatTable = self.table.ravel()
+        self.strides = [int(np.prod(self.table.shape[dim+1:])) for dim in range(self.nStates)]
+
+        # what MCP reads from its brain: a frozen policy is converged and always greedy
+        self.loss = 0
+        self.epsilon = 1
+        self.isConverge = True
+
+    @staticmethod
+    def compile(policy, grids, batchSize=1<<16):
+        """actions of policy (chooseActions of greedy policy) at every cell center of grids"""
+        grids = [np.asarray(grid, dtype=np.float64) for grid in grids]
+        shape = tuple(len(grid) for grid in grids)
+        numCells = int(np.prod(shape))
+
+        table = np.empty(numCells, dtype=np.uint8)
+        for start in range(0, numCells, batchSize): # the states of all the cells may not fit in memory at once
+            cellIdxs = np.unravel_index(np.arange(start, min(start+batchSize, numCells)), shape)
+            states = np.stack([grid[idx] for grid, idx in zip(grids, cellIdxs)], axis=1).astype(np.float32)
+            table[start:start+len(states)] = policy.chooseActions(states)
+
+        return PolicyTable(grids, table.reshape(shape))
+
+    @staticmethod
+    def load(filename):
+        with np.load(filename) as data:
+            numDims = len(data.files) - 1
+            return PolicyTable([data["grid{}".format(dim)] for dim in range(numDims)], data["table"])
+
+    def save(self, filename):
+        arrays = {"grid{}".format(dim): grid for dim, grid in enumerate(self.grids)}
+        np.savez_compressed(filename, table=self.table, **arrays)
+
+    def nbytes(self):
+        return self.table.nbytes + sum(grid.nbytes for grid in self.grids)
+
+    def cellIndexes(self, states):
+        """flat table index of each state (n x nStates)"""
+        states = np.asarray(states, dtype=np.float64).reshape(-1, self.nStates)
+        flatIdxs = np.zeros(len(states), dtype=np.int64)
+        for dim in range(self.nStates):
+            flatIdxs += np.searchsorted(self.boundaries[dim], states[:, dim]) * self.strides[dim]
+        return flatIdxs
+
+    def chooseAction(self, state, evalOn=True):
+        flatIdx = 0
+        for boundary, stride, value in zip(self.boundaryLists, self.strides, state):
+            flatIdx += bisect.bisect_left(boundary, value) * stride
+        return int(self.flatTable[flatIdx])
+
+    def chooseActions(self, states, evalOn=True):
+        """action of each state, an int array"""
+        return self.flatTable[self.cellIndexes(states)].astype(np.int64)
+
+    def agreement(self, policy, states):
+        """ratio of states on which the table takes the action of policy"""
+        states = np.asarray(states, dtype=np.float32).reshape(-1, self.nStates)
+        if len(states) == 0:
+            return 1.0
+        return float(np.mean(self.chooseActions(states) == np.asarray(policy.chooseActions(states))))
+
+
+def quantileGrids(states, cellsPerDim=16):
+    """
+    grids following the distribution of states (e.g. the states in the replay memory): the cell centers of a
+    dimension are its quantiles, so that cells are fine where the states are dense. A dimension of few distinct
+    values (e.g. txAttempts) gets one cell per value.
+    cellsPerDim: an int, or one int per dimension
+    """
+    states = np.asarray(states, dtype=np.float64)
+    if np.isscalar(cellsPerDim):
+        cellsPerDim = [cellsPerDim] * states.shape[1]
+
+    grids = []
+    for dim, numCells in enumerate(cellsPerDim):
+        values = np.unique(states[:, dim])
+        if len(values) <= numCells:
+            grids.append(values)
+        else:
+            grids.append(np.unique(np.quantile(states[:, dim], np.linspace(0, 1, numCells))))
+    return grids
+
+
+def loadPolicy(filename):
+    """the PolicyTable or NumpyPolicy saved in filename"""
+    with np.load(filename) as data:
+        isTable = "table" in data.files
+    return PolicyTable.load(filename) if isTable else NumpyPolicy.load(filename)
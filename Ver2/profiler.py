@@ -0,0 +1,124 @@
+"""
+Opt-in per-component profiler of the simulation loop.
+
+Profiler.instrument(scheduler) wraps the hot methods of the components of an EventScheduler with monotonic clock
+accumulators (time.perf_counter): the wrapper is an attribute of the instance, so the classes and the runs without
+a profiler are untouched. Components (times are inclusive, a component contains the ones below it):
+
+    server                      EchoServer.ticking
+    client                      EchoClient.ticking
+    client/traffic              EchoClient.trafficGenerator
+    client/protocol             TransportLayerHelper.sendPkts (protocol ticking)
+    client/protocol/dqn.infer   DQN.chooseAction / chooseActions (MCP, or its NumpyPolicy / PolicyTable)
+    client/protocol/dqn.learn   DQN.learn (MCP)
+    channel.put                 SingleModeChannel.putPackets
+    channel.get                 SingleModeChannel.getPackets
+    scheduler                   the rest of EventScheduler.run: routing, skipped ticks, hooks
+
+Usage:
+    profiler = Profiler()
+    scheduler = EventScheduler(clientList, serverList, channel, profiler=profiler)
+    scheduler.run(startTime=1, endTime=simulationPeriod)
+    profiler.printReport()
+    profiler.save("profile.json") # or "profile.csv"
+"""
+import csv
+import json
+import time
+from tabulate import tabulate
+
+
+class Profiler(object):
+    header = ["component", "calls", "seconds", "% of run", "us per call", "calls per 1k ticks", "ms per 1k ticks"]
+
+    def __init__(self):
+        self.stats = {} # component -> [calls, seconds]
+        self.ticks = 0
+        self.runTime = 0
+        self.wrapped = [] # (obj, methodName) to restore
+
+    def wrap(self, obj, methodName, component):
+        """time obj.methodName() under component"""
+        method = getattr(obj, methodName)
+        stat = self.stats.setdefault(component, [0, 0.0])
+        perf_counter = time.perf_counter
+
+        def timed(*args, **kwargs):
+            startTime = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                stat[1] += perf_counter() - startTime
+                stat[0] += 1
+
+        setattr(obj, methodName, timed)
+        self.wrapped.append((obj, methodName))
+
+    def instrument(self, scheduler):
+        """wrap the components of an EventScheduler, see the module doc"""
+        for server in scheduler.serverList:
+            self.wrap(server, "ticking", "server")
+
+        for client in scheduler.clientList:
+            self.wrap(client, "ticking", "client")
+            self.wrap(client, "trafficGenerator", "client/traffic")
+            self.wrap(client.transportObj, "sendPkts", "client/protocol")
+            brain = getattr(client.transportObj.instance, "RL_Brain", None)
+            if brain is not None:
+                self.wrap(brain, "chooseAction", "client/protocol/dqn.infer")
+                self.wrap(brain, "chooseActions", "client/protocol/dqn.infer")
+                if hasattr(brain, "learn"): # frozen policies of the evaluation mode do not learn
+                    self.wrap(brain, "learn", "client/protocol/dqn.learn")
+
+        self.wrap(scheduler.channel, "putPackets", "channel.put")
+        self.wrap(scheduler.channel, "getPackets", "channel.get")
+
+        run = scheduler.run
+        def timedRun(startTime, endTime):
+            runStartTime = time.perf_counter()
+            try:
+                return run(startTime, endTime)
+            finally:
+                self.runTime += time.perf_counter() - runStartTime
+                self.ticks += max(0, endTime - startTime + 1)
+        scheduler.run = timedRun
+        self.wrapped.append((scheduler, "run"))
+
+    def restore(self):
+        """remove the wrappers, the collected stats are kept"""
+        for obj, methodName in self.wrapped:
+            obj.__dict__.pop(methodName, None)
+        self.wrapped = []
+
+    def report(self):
+        """rows of Profiler.header, one per component"""
+        ticks = max(self.ticks, 1)
+        runTime = self.runTime if self.runTime > 0 else 1
+
+        stats = dict(self.stats)
+        topLevel = sum(stats[c][1] for c in stats if "/" not in c)
+        stats["scheduler"] = [self.ticks, max(0.0, self.runTime - topLevel)]
+
+        rows = []
+        for component in sorted(stats):
+            calls, seconds = stats[component]
+            rows.append([component, calls, seconds, 100 * seconds / runTime,
+                1e6 * seconds / calls if calls else 0, 1000 * calls / ticks, 1e6 * seconds / ticks])
+        return rows
+
+    def printReport(self):
+        print("{} ticks in {:.3f}s".format(self.ticks, self.runTime))
+        print(tabulate(self.report(), headers=Profiler.header, floatfmt=".3f"))
+
+    def save(self, filename):
+        """export the report to a .json or a .csv file"""
+        rows = self.report()
+        if filename.endswith(".csv"):
+            with open(filename, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(Profiler.header)
+                writer.writerows(rows)
+        else:
+            with open(filename, 'w') as f:
+                json.dump({"ticks": self.ticks, "runTime": self.runTime,
+                    "components": [dict(zip(Profiler.header, row)) for row in rows]}, f, indent=1)
@@ -109,6 +109,22 @@ class BaseTransportLayerProtocol(object):
         """
         print("you need to implement this")
         return
+
+    def nextWakeTime(self):
+        """
+        The earliest time at which ticking() may do more than advancing the clock, 
+        assuming no ACK arrives before then. sys.maxsize if the protocol never wakes up by itself.
+
+        Used by the event driven scheduler to skip idle ticks. The default is conservative (wake up every tick).
+        """
+        return self.time + 1
+
+    def skipTicks(self, ticks):
+        """
+        Advance the clock by $ticks idle ticks. Must leave the protocol in the same state as 
+        calling ticking() $ticks times with no ACK, given that nextWakeTime() > self.time + ticks.
+        """
+        self.time += ticks
         
     def _printProgress(self, retransPkts=[], newPktList=[]):
         if not retransPkts and not newPktList:
@@ -137,7 +153,11 @@ class BaseTransportLayerProtocol(object):
         return
     
     @staticmethod
-    def calcUtility(deliveryRate, avgDelay, alpha, beta1, beta2):
+    def calcUtility(deliveryRate, avgDelay, alpha, beta1, beta2, UDP_delivery=0.58306, ARQ_delivery=0.86000, UDP_delay=261.415, ARQ_delay=1204.294):
+        """
+        utility of a flow. Delivery rate and delay are normalized between the UDP (x0.9) and ARQ (x1.1) references.
+        Also works on numpy arrays (see analytics.utility)
+        """
         # def sigmoid(x):
         #     return 1/ (1 + np.exp(-x))
         # r = beta1*deliveryRate + beta2/np.log(avgDelay+2)
@@ -146,8 +166,8 @@ class BaseTransportLayerProtocol(object):
 
         # UDP_dlvy, UDP_dly = 0.59548*0.9, 101.071*0.9
         # ARQ_dlvy, ARQ_dly = 0.966048*1.1, 611.003*1.1
-        UDP_dlvy, UDP_dly = 0.58306*0.9, 261.415*0.9
-        ARQ_dlvy, ARQ_dly = 0.86000*1.1, 1204.294*1.1
+        UDP_dlvy, UDP_dly = UDP_delivery*0.9, UDP_delay*0.9
+        ARQ_dlvy, ARQ_dly = ARQ_delivery*1.1, ARQ_delay*1.1
 
         
         dlvy = (deliveryRate - UDP_dlvy) / (ARQ_dlvy - UDP_dlvy)
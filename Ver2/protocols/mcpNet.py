@@ -0,0 +1,37 @@
+"""
+The decision making network of MCP, kept apart from mcp_v2.py so that MCP evaluating a frozen policy (param
+"policy") does not import torch.
+"""
+import torch
+import torch.nn as nn
+
+
+class DQNNet(nn.Module):
+    """Our decision making network"""
+    def __init__(self, nStates, nActions):
+        super(DQNNet, self).__init__()
+        # one layer
+        # self.fc1 = nn.Linear(nStates, 50)
+        # self.out = nn.Linear(50, nActions)
+
+        # self.fc1.weight.data.normal_(0, 1)
+        # self.out.weight.data.normal_(0, 1)
+
+        # two layers
+        self.fc1 = nn.Linear(nStates, 20)
+        self.fc2 = nn.Linear(20, 30)
+        self.out = nn.Linear(30, nActions)
+
+        # self.fc1.weight.data.normal_(0, 1)
+        # self.fc2.weight.data.normal_(0, 1)
+        # self.out.weight.data.normal_(0, 1)
+    
+    def forward(self, state):
+        # one layer
+        # x = torch.sigmoid(self.fc1(state))
+
+        # two layers
+        x = torch.sigmoid(self.fc1(state))
+        x = torch.sigmoid(self.fc2(x))
+
+        return self.out(x)
@@ -1,44 +1,12 @@
 import numpy as np
 import sys
-
-import torch
-import torch.nn as nn
-import torch.nn.functional as F
+import math
 
 from protocols.baseTransportLayerProtocol import BaseTransportLayerProtocol
-from RL_Brain import DQN
 from packet import Packet, PacketInfo
-
-
-class DQNNet(nn.Module):
-    """Our decision making network"""
-    def __init__(self, nStates, nActions):
-        super(DQNNet, self).__init__()
-        # one layer
-        # self.fc1 = nn.Linear(nStates, 50)
-        # self.out = nn.Linear(50, nActions)
-
-        # self.fc1.weight.data.normal_(0, 1)
-        # self.out.weight.data.normal_(0, 1)
-
-        # two layers
-        self.fc1 = nn.Linear(nStates, 20)
-        self.fc2 = nn.Linear(20, 30)
-        self.out = nn.Linear(30, nActions)
-
-        # self.fc1.weight.data.normal_(0, 1)
-        # self.fc2.weight.data.normal_(0, 1)
-        # self.out.weight.data.normal_(0, 1)
-    
-    def forward(self, state):
-        # one layer
-        # x = torch.sigmoid(self.fc1(state))
-
-        # two layers
-        x = torch.sigmoid(self.fc1(state))
-        x = torch.sigmoid(self.fc2(x))
-
-        return self.out(x)
+from metricsSink import MemorySink
+from protocols.utils import TimerHeap
+from policyTable import loadPolicy
 
 
 class MCP(BaseTransportLayerProtocol):
@@ -47,7 +15,20 @@ class MCP(BaseTransportLayerProtocol):
     "alpha":2, # shape of utility function
     "beta1":0.9, "beta2":0.1, # beta1: emphasis on delivery, beta2: emphasis on delay
     "gamma":0.9,
-    "learnRetransmissionOnly": False
+    "learnRetransmissionOnly": False,
+    # when to run gradient steps, see RL_Brain.TrainScheduler
+    "trainMode": "experience", # "experience", "every", "tick", or "budget"
+    "trainEveryK": 8,          # "every": one step every K experiences
+    "trainStepsPerTick": 1,    # "tick": steps per tick
+    "trainBudget": 1e-3,       # "budget": seconds of training per tick
+    "metricsSink": None,       # where pktIgnoredCounter is recorded, see metricsSink.py. Default in memory
+    "rng": None,               # np.random.RandomState of the DQN (exploration, replay sampling). Default the global numpy RNG
+    "trainScheduler": None,    # RL_Brain.TrainScheduler whose DQN is shared with other MCP flows (see vecEnv.py).
+                               # Its owner calls tickEnded. Default a DQN of this flow only
+    "policy": None,            # numpyPolicy.NumpyPolicy or policyTable.PolicyTable, or the .npz file of one, to act with,
+                               # without exploration nor learning (evaluation runs). Default None: act and learn with the DQN
+    "checkpoint": None,        # directory of a RL_Brain.DQN.save checkpoint to warm start the DQN of this flow from
+                               # (replay memory memory-mapped copy on write). Default None: train from scratch
     }
 
     def __init__(self, suid, duid, params, txBufferLen=-1, verbose=False):
@@ -63,24 +44,7 @@ class MCP(BaseTransportLayerProtocol):
         self.verbose = verbose
         self.time = -1
 
-        # RL related variables
-        self.RL_Brain = DQN(
-            nActions=2, nStates=5, 
-            evalNet=DQNNet(nActions=2, nStates=5),
-            tgtNet=DQNNet(nActions=2, nStates=5),
-            batchSize=32,           #
-            memoryCapacity=1e5,     # maximum number of experiences to store
-            learningRate=1e-2,      #
-            updateFrequency=100,    # period to replace target network with evaluation network 
-            epsilon=0.7,            # greedy policy parameter 
-            gamma=0.9,              # initial gamma
-            weight_decay=1,
-            epsilon_decay=0.7,
-            convergeLossThresh=0.01,# below which we consider the network as converged
-            verbose=False
-        )
-        self.learnCounter = 0
-        self.learnPeriod = 8 # number of new data before calling learn
+        self.learnPeriod = 8 # number of new data before calling learn, once converged
 
         # self.SRTT = 0 # implemented in base class
 
@@ -89,12 +53,47 @@ class MCP(BaseTransportLayerProtocol):
         self.pktLossInfoQueue = np.zeros(self.pktLossTrackingNum) # keep track of the most recent 100 packets
         self.pktLossInfoPtr = 0
 
+        # timeout packets between tickBegin and tickEnd
+        self.timeoutPids = []
+        self.timeoutStates = []
+
         # performance collection
         self.parseParamByMode(params=params, requiredKeys=MCP.requiredKeys, optionalKeys=MCP.optionalKeys)
 
+        # RL related variables
+        self.evalMode = self.policy is not None
+        self.sharedBrain = self.trainScheduler is not None
+        if self.evalMode:
+            if isinstance(self.policy, str):
+                self.policy = loadPolicy(self.policy)
+            self.RL_Brain = self.policy
+            self.trainScheduler = None
+        elif self.sharedBrain:
+            self.RL_Brain = self.trainScheduler.brain
+        else:
+            from RL_Brain import TrainScheduler # the training stack (torch) is only imported by flows that learn
+            self.RL_Brain = MCP.newBrain()
+            if self.rng is not None:
+                self.RL_Brain.rng = self.rng
+            if self.checkpoint is not None:
+                self.RL_Brain.load(self.checkpoint)
+
+            self.trainScheduler = TrainScheduler(
+                brain=self.RL_Brain, 
+                mode=self.trainMode, 
+                K=self.trainEveryK, 
+                stepsPerTick=self.trainStepsPerTick, 
+                budget=self.trainBudget, 
+                convergedPeriod=self.learnPeriod)
+
         # initialize the congestion window 
         self.buffer = {}
 
+        # timer indexes, so that timeouts are found without scanning the buffer
+        self.txTimeHeap = TimerHeap(self.buffer, "txTime")
+        self.genTimeHeap = TimerHeap(self.buffer, "genTime")
+        self.exhaustedPids = [] # pids that reached maxTxAttempts, ignored by the next _cleanWindow
+
         # override perfDict
         self.perfDict["ignorePkts_RL"] = 0 # pkts ignored by RL
         self.perfDict["ignorePkts"] = 0 # pkts ignored by RL and max tx attempts
@@ -112,9 +111,44 @@ class MCP(BaseTransportLayerProtocol):
         self.perfDict["maxWin"] = 0
 
         # for debug
-        self.pktIgnoredCounter = []
+        if self.metricsSink is None:
+            self.metricsSink = MemorySink()
+        self.pktIgnoredCounter = self.metricsSink.series("mcp{}_pktIgnoredCounter".format(self.suid), np.int64)
+
+    @staticmethod
+    def newBrain(memory=None):
+        """the DQN making the retransmission decisions of MCP. memory: its ReplayMemory, default a new one"""
+        from RL_Brain import DQN
+        from protocols.mcpNet import DQNNet
+        return DQN(
+            nActions=2, nStates=5, 
+            evalNet=DQNNet(nActions=2, nStates=5),
+            tgtNet=DQNNet(nActions=2, nStates=5),
+            batchSize=32,           #
+            memoryCapacity=1e5,     # maximum number of experiences to store
+            learningRate=1e-2,      #
+            updateFrequency=100,    # period to replace target network with evaluation network 
+            epsilon=0.7,            # greedy policy parameter 
+            gamma=0.9,              # initial gamma
+            weight_decay=1,
+            epsilon_decay=0.7,
+            convergeLossThresh=0.01,# below which we consider the network as converged
+            verbose=False,
+            memory=memory
+        )
 
     def ticking(self, ACKPktList=[]):
+        curStates = self.tickBegin(ACKPktList)
+        # use RL to make all decisions in one forward pass
+        actions = self.RL_Brain.chooseActions(states=curStates) if curStates else []
+        return self.tickEnd(actions)
+
+    def tickBegin(self, ACKPktList=[]):
+        """
+        first half of ticking(): process the ACKs and find the timeout packets.
+        Returns the states of the timeout packets, whose actions are given to tickEnd.
+        Several flows can batch their decisions between tickBegin and tickEnd (see vecEnv.py)
+        """
         self.time += 1
 
         self._RL_lossUpdate(self.RL_Brain.loss)
@@ -125,8 +159,15 @@ class MCP(BaseTransportLayerProtocol):
         # process ACK packets
         self._handleACK(ACKPktList)
 
+        # timeout packets
+        self.timeoutPids, self.timeoutStates = self._getTimeoutStates()
+        return self.timeoutStates
+
+    def tickEnd(self, actions):
+        """second half of ticking(): apply the actions of the timeout packets, send the packets"""
         # handle timeout packets
-        pktsToRetransmit = self._getRetransPkts()
+        pktsToRetransmit = self._applyTimeoutActions(self.timeoutPids, self.timeoutStates, actions)
+        self.timeoutPids, self.timeoutStates = [], []
         self.perfDict["retransAttempts"] += len(pktsToRetransmit)
 
         # fetch new packets based on cwnd and packets in buffer
@@ -142,8 +183,49 @@ class MCP(BaseTransportLayerProtocol):
         
         self.pktIgnoredCounter.append(self.perfDict["ignorePkts"])
 
+        if not (self.sharedBrain or self.evalMode):
+            self.trainScheduler.tickEnded()
+
         return pktsToRetransmit + newPktList
 
+    def nextWakeTime(self):
+        if self.verbose or self.txBuffer:
+            return self.time + 1
+
+        # "tick" and "budget" train at the end of every tick. Deferring those steps to skipTicks would change the
+        # order of the RNG draws, hence the results of the tick loop
+        if self.trainScheduler is not None and self.trainScheduler.mode in {"tick", "budget"}:
+            return self.time + 1
+
+        if self.maxTxAttempts > -1 and any(pid in self.buffer for pid in self.exhaustedPids):
+            return self.time + 1
+
+        wakeTime = sys.maxsize
+        earliestTxTime = self.txTimeHeap.earliest()
+        if earliestTxTime is not None:
+            # floor(txTime + timeout) + 1 is the exact timeout tick. Waking up one tick early is harmless
+            wakeTime = math.floor(earliestTxTime + self.timeout)
+        if self.maxPktTxDDL > -1:
+            earliestGenTime = self.genTimeHeap.earliest()
+            if earliestGenTime is not None:
+                wakeTime = min(wakeTime, earliestGenTime + self.maxPktTxDDL + 1)
+        
+        return max(self.time + 1, wakeTime)
+
+    def skipTicks(self, ticks):
+        if ticks <= 0:
+            return
+        # replay the per tick bookkeeping of ticking()
+        for _ in range(ticks):
+            self.time += 1
+            self._RL_lossUpdate(self.RL_Brain.loss)
+            if self.RL_Brain.isConverge and self.time < self.perfDict["convergeAt"]:
+                self.perfDict["convergeAt"] = self.time
+            if not (self.sharedBrain or self.evalMode):
+                self.trainScheduler.tickEnded()
+        self.perfDict["epsilon"] = self.RL_Brain.epsilon
+        self.pktIgnoredCounter.extend([self.perfDict["ignorePkts"]] * ticks)
+
 
 
     def _handleACK(self, ACKPktList):
@@ -175,7 +257,7 @@ class MCP(BaseTransportLayerProtocol):
             self.perfDict["deliveredPkts"] += 1
 
 
-            if self.buffer[pid].txAttempts > 1 or not self.learnRetransmissionOnly:
+            if not self.evalMode and (self.buffer[pid].txAttempts > 1 or not self.learnRetransmissionOnly):
                 reward = self.calcUtility(1, delay, self.alpha, self.beta1, self.beta2)
 
                 # store the ACKed packet info
@@ -219,30 +301,35 @@ class MCP(BaseTransportLayerProtocol):
 
 
 
-    def _getRetransPkts(self):
+    def _getTimeoutStates(self):
+        """pids and states of the timeout packets"""
         # wipe out packets that exceed maxTxAttempts and/or maxPktTxDDL
         self._cleanWindow()
 
         # pkts to retransmit
         timeoutPidSet = self._collectTimeoutPkts()
 
-        # generate pkts and update buffer information
-        retransPktList = []
+        # states of the timeout packets. Each lost packet updates the loss estimation before its state is taken
+        curStates = []
         for pid in timeoutPidSet:
             # update lost packet estimation 
             self._pktLossUpdate(isLost=True)
 
-            # use RL to make a decision
-            curState = [
+            curStates.append([
                 self.buffer[pid].txAttempts,
                 self.time - self.buffer[pid].genTime,
                 self.SRTT,
                 self.perfDict["pktLossHat"],
                 self.perfDict["avgDelay"]
-            ]
+            ])
 
+        return timeoutPidSet, curStates
 
-            action = self.RL_Brain.chooseAction(state=curState)
+    def _applyTimeoutActions(self, timeoutPidSet, curStates, actions):
+        """ignore (action 0) or retransmit (action 1) each timeout packet"""
+        # generate pkts and update buffer information
+        retransPktList = []
+        for pid, curState, action in zip(timeoutPidSet, curStates, np.asarray(actions).tolist()):
 
             self._RL_retransUpdate(action)
 
@@ -256,30 +343,23 @@ class MCP(BaseTransportLayerProtocol):
                 self.buffer[pid].txAttempts += 1
                 self.buffer[pid].txTime = self.time
                 self.buffer[pid].util = self.getSysUtil()
-                self.buffer[pid].RLState = [
-                    self.buffer[pid].txAttempts,
-                    self.time - self.buffer[pid].genTime,
-                    self.SRTT,
-                    self.perfDict["pktLossHat"],
-                    self.perfDict["avgDelay"]
-                ]
+                self.buffer[pid].RLState = [self.buffer[pid].txAttempts] + curState[1:]
+                self._indexPkt(pid)
         
         return retransPktList
 
 
     def _cleanWindow(self):
         if self.maxTxAttempts > -1:
-            pktsToConsider = set(self.buffer.keys())
-            for pid in pktsToConsider:
-                if self.buffer[pid].txAttempts >= self.maxTxAttempts:
+            exhaustedPids, self.exhaustedPids = self.exhaustedPids, []
+            for pid in exhaustedPids:
+                if pid in self.buffer:
                     self.ignorePktAndUpdateMemory(pid, popKey=True)
 
         if self.maxPktTxDDL > -1:
-            pktsToConsider = set(self.buffer.keys())
             timeDDL = self.time - self.maxPktTxDDL
-            for pid in pktsToConsider:
-                if self.buffer[pid].genTime < timeDDL:
-                    self.ignorePktAndUpdateMemory(pid, popKey=True)
+            for pid in self.genTimeHeap.popExpired(timeDDL):
+                self.ignorePktAndUpdateMemory(pid, popKey=True)
         return
 
     def ignorePktAndUpdateMemory(self, pid, popKey=True):
@@ -289,7 +369,7 @@ class MCP(BaseTransportLayerProtocol):
         # ignore a packet contributes to no delay penalty
         self._deliveryRateUpdate(isDelivered=False) # update delivery rate
 
-        if pid in self.buffer:
+        if pid in self.buffer and not self.evalMode:
             delay = self.time - self.buffer[pid].genTime
             
             reward = self.getSysUtil() # ignore a packet results in zero changes of system utility, so getSysUtil
@@ -330,17 +410,19 @@ class MCP(BaseTransportLayerProtocol):
                     self.perfDict["pktLossHat"],
                     self.perfDict["avgDelay"]
                 ])
+        self._indexPkt(pkt.pid)
 
+    def _indexPkt(self, pid):
+        """add pid to the timer indexes, after it entered the buffer or was retransmitted"""
+        self.txTimeHeap.push(pid)
+        if self.buffer[pid].txAttempts == 1:
+            self.genTimeHeap.push(pid)
+        if self.maxTxAttempts > -1 and self.buffer[pid].txAttempts >= self.maxTxAttempts:
+            self.exhaustedPids.append(pid)
 
     def _collectTimeoutPkts(self):
-        timoutPidList = []
-
-        for pid in self.buffer:
-            timeDDL = self.time - self.timeout
-            if self.buffer[pid].txTime < timeDDL:
-                timoutPidList.append(pid)
-        
-        return timoutPidList
+        """pids whose txTime < time - timeout, in the order they entered the buffer. Taken out of self.txTimeHeap"""
+        return self.txTimeHeap.popExpired(self.time - self.timeout)
 
 
     """RL related functions"""
@@ -395,6 +477,8 @@ class MCP(BaseTransportLayerProtocol):
     def clientSidePerf(self, verbose=False):
 
         # self.perfDict["retranProb"] = self.perfDict["retransAttempts"]/(self.perfDict["ignorePkts_RL"] + self.perfDict["retransAttempts"])
+        if self.trainScheduler is not None:
+            self.perfDict.update(self.trainScheduler.getPerf())
         if verbose:
             for key in self.perfDict:
                 print("{key}:{val}".format(key=key, val=self.perfDict[key]))
@@ -405,15 +489,14 @@ class MCP(BaseTransportLayerProtocol):
         # reset the object
         self.perfDict = BaseTransportLayerProtocol.perfDictDefault
         self.buffer.clear()
+        self.txTimeHeap.clear()
+        self.genTimeHeap.clear()
+        self.exhaustedPids = []
         
         return 
     
     def learn(self):
-        
-        if not self.RL_Brain.isConverge:
-            self.RL_Brain.learn()
-        else:
-            self.learnCounter += 1
-            if self.learnCounter >= self.learnPeriod:
-                self.learnCounter = 0
-                self.RL_Brain.learn()
\ No newline at end of file
+        """called after each new experience. Whether to run a gradient step is up to self.trainScheduler"""
+        if self.evalMode:
+            return
+        self.trainScheduler.experienceAdded()
\ No newline at end of file
@@ -1,8 +1,10 @@
 from protocols.baseTransportLayerProtocol import BaseTransportLayerProtocol
 from packet import Packet, PacketInfo
+from protocols.utils import TimerHeap
 
 from collections import deque
 import sys
+import math
 
 class TCP_NewReno(BaseTransportLayerProtocol):
     
@@ -23,6 +25,9 @@ class TCP_NewReno(BaseTransportLayerProtocol):
 
         # for TCP reno, only packet not ACK are in pktInfo. NACK/Timeout pkts will be wiped out and moved to txBuffer
         self.window = {} 
+        # ordered views of the window: by txTime for the timeouts, by pid for the cumulative ACKs
+        self.txTimeHeap = TimerHeap(self.window, "txTime")
+        self.pidHeap = TimerHeap(self.window, "pid")
 
         self.IW = 4 # initial cwnd window
         self.maxTxAttempts = -1
@@ -78,6 +83,18 @@ class TCP_NewReno(BaseTransportLayerProtocol):
             ))
         return pktList
     
+    def nextWakeTime(self):
+        if self.verbose or self.pktToRetransmit:
+            return self.time + 1
+        if self.txBuffer and self.cwnd - len(self.window) > 0:
+            return self.time + 1
+
+        earliestTxTime = self.txTimeHeap.earliest()
+        if earliestTxTime is None:
+            return sys.maxsize
+        # floor(txTime + timeout) + 1 is the exact timeout tick. Waking up one tick early is harmless
+        return max(self.time + 1, math.floor(earliestTxTime + self.timeout))
+    
     def _handleACK(self, ACKPktList):
         # filter out ACK and NACK
         # process ACK
@@ -157,11 +174,10 @@ class TCP_NewReno(BaseTransportLayerProtocol):
                         
                     self._timeoutUpdate()
                     
-                for oldPid in list(self.window.keys()):
-                    if oldPid <= pid:
-                        self.window.pop(oldPid, None)
-                        if self.curTxMode == TCP_NewReno.FAST_RECOVERY:
-                            self.cwnd -= 1
+                for oldPid in self.pidHeap.popExpired(pid, inclusive=True):
+                    self.window.pop(oldPid, None)
+                    if self.curTxMode == TCP_NewReno.FAST_RECOVERY:
+                        self.cwnd -= 1
 
             if self.lastACKCounter[1] >= 3:
                 # triple dup ack
@@ -181,7 +197,7 @@ class TCP_NewReno(BaseTransportLayerProtocol):
         pktList = []
 
         for pkt in self.pktToRetransmit:
-            self.window[pkt.pid] = self._genNewPktInfoFromPkt(pkt)
+            self._addToWindow(pkt)
         pktList += self.pktToRetransmit
 
         # include retransmission 
@@ -201,13 +217,18 @@ class TCP_NewReno(BaseTransportLayerProtocol):
                 self.maxPidSent = pkt.pid
                 self.distincPktsSent += 1
 
-            self.window[pkt.pid] = self._genNewPktInfoFromPkt(pkt)
+            self._addToWindow(pkt)
 
         
         self.pktToRetransmit = []
 
         return pktList
     
+    def _addToWindow(self, pkt):
+        self.window[pkt.pid] = self._genNewPktInfoFromPkt(pkt)
+        self.txTimeHeap.push(pkt.pid)
+        self.pidHeap.push(pkt.pid)
+
     def _genNewPktInfoFromPkt(self, pkt):
         pktInfo = PacketInfo(
             pid=pkt.pid, 
@@ -226,13 +247,17 @@ class TCP_NewReno(BaseTransportLayerProtocol):
         # Once there is at least one timeout ack, switch to Retransmission mode
         # 
 
-        pidList = list(self.window.keys())
-        pidList.sort()
+        # candidates: packets timed out under the current timeout (inclusive, in case time - timeout rounds).
+        # The timeout grows in the loop, so each one is checked again
+        pidList = self.txTimeHeap.popExpired(self.time - self.timeout, inclusive=True)
 
         # print("cur timeout is ", self.timeout)
         for pid in pidList:
             # print("pkt {} queuingTime {}".format(pid, self.time-self.window[pid].txTime))
-            if (self.time-self.window[pid].txTime) > self.timeout:
+            if (self.time-self.window[pid].txTime) <= self.timeout:
+                # not timeout (anymore), keep it indexed
+                self.txTimeHeap.push(pid)
+            else:
                 if self.verbose:
                     print("[-]Client {uid} @ {time} Pkt {pid} is timeout {queuingTime} >= {timeout}".format(uid=self.suid, time=self.time, pid=pid, queuingTime=self.time-self.window[pid].txTime, timeout=self.timeout))
                 # switch to Retransmission mode 
@@ -284,6 +309,8 @@ class TCP_NewReno(BaseTransportLayerProtocol):
         self.perfDict = BaseTransportLayerProtocol.perfDictDefault
 
         self.window.clear()
+        self.txTimeHeap.clear()
+        self.pidHeap.clear()
         return 
     
     def clientSidePerf(self, verbose=False):
@@ -1,6 +1,7 @@
 from protocols.baseTransportLayerProtocol import BaseTransportLayerProtocol
 
 from collections import deque
+import sys
 
 class UDP(BaseTransportLayerProtocol):
     """
@@ -45,6 +46,11 @@ class UDP(BaseTransportLayerProtocol):
                 )
         
         return pktList
+
+    def nextWakeTime(self):
+        if self.txBuffer:
+            return self.time + 1
+        return sys.maxsize
     
     def clientSidePerf(self, verbose=False):
         if verbose:
@@ -1,13 +1,75 @@
 from packet import Packet, PacketInfo
+import tracer
 
 import sys
-import logging
+import math
+import heapq
+
+
+class TimerHeap(object):
+    """
+    Timer index over a packet buffer {pid: PacketInfo}: a min-heap of (time, pid), where time is the attribute
+    timeAttr (txTime or genTime) of the packet when it was pushed.
+
+    Deletion is lazy. An entry is stale once its packet left the buffer (ACKed, ignored) or its time changed
+    (retransmitted), and stale entries are dropped when they reach the top. Finding the expired packets costs
+    O(expired + log n) instead of a scan of the buffer.
+
+    Any attribute works as the key, e.g. timeAttr="pid" keeps the buffer in pid order.
+    """
+    def __init__(self, buffer, timeAttr="txTime"):
+        self.buffer = buffer
+        self.timeAttr = timeAttr
+        self.heap = []
+
+    def push(self, pid):
+        """index pid with its current time. Call again after the time of the packet is updated"""
+        heapq.heappush(self.heap, (getattr(self.buffer[pid], self.timeAttr), pid))
+        # mostly stale entries (e.g. ACKed packets under a long timeout), rebuild from the buffer
+        if len(self.heap) > 2 * len(self.buffer) + 64:
+            self.rebuild()
+
+    def rebuild(self):
+        self.heap = [(getattr(pktInfo, self.timeAttr), pid) for pid, pktInfo in self.buffer.items()]
+        heapq.heapify(self.heap)
+
+    def clear(self):
+        self.heap = []
+
+    def _isValid(self, entry):
+        time, pid = entry
+        return pid in self.buffer and getattr(self.buffer[pid], self.timeAttr) == time
+
+    def earliest(self):
+        """smallest time of the packets in the buffer, None if the buffer is empty"""
+        while self.heap and not self._isValid(self.heap[0]):
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def popExpired(self, timeDDL, inclusive=False):
+        """
+        remove the packets with time < timeDDL (<= timeDDL if inclusive) from the index and return their pids,
+        in increasing pid order, i.e. the order in which they entered the buffer
+        """
+        pidList = []
+        while self.heap:
+            time, pid = self.heap[0]
+            if time > timeDDL or (time == timeDDL and not inclusive):
+                break
+            heapq.heappop(self.heap)
+            # a pid pushed twice with the same time (packet info replaced in place) pops twice in a row
+            if self._isValid((time, pid)) and (not pidList or pidList[-1] != pid):
+                pidList.append(pid)
+        pidList.sort()
+        return pidList
+
 
 class Window(object):
     """
     This class manages the cwnd. The client no longer needs to manually handle packets.
 
     cwnd: the expected maximum number of packets to send without being acked.
+    tracer: tracer.Tracer to record the packet events to, None (default) to record nothing
     
     """
 
@@ -16,9 +78,10 @@ class Window(object):
     }
     
 
-    def __init__(self, uid, cwnd=-1, maxPktTxDDL=-1, maxTxAttempts=-1, logLevel=logging.DEBUG):
+    def __init__(self, uid, cwnd=-1, maxPktTxDDL=-1, maxTxAttempts=-1, tracer=None):
 
         self.uid = uid
+        self.tracer = tracer
         self.defaultValue = {
             "maxPktTxDDL": 0,
             "maxTxAttempts": 0,
@@ -32,6 +95,11 @@ class Window(object):
 
         self.buffer = dict() # used to store packets and packet information
 
+        # timer indexes, so that timeouts are found without scanning the buffer
+        self.txTimeHeap = TimerHeap(self.buffer, "txTime")
+        self.genTimeHeap = TimerHeap(self.buffer, "genTime")
+        self.exhaustedPids = [] # pids that reached maxTxAttempts, dropped by the next cleanBuffer
+
         self.maxPktTxDDL = maxPktTxDDL
         self.maxTxAttempts = maxTxAttempts
 
@@ -46,6 +114,9 @@ class Window(object):
     def reset(self):
         self.perfDict = Window.perfDictDefault
         self.buffer.clear()
+        self.txTimeHeap.clear()
+        self.genTimeHeap.clear()
+        self.exhaustedPids = []
 
         self.maxPktTxDDL = self.defaultValue["maxPktTxDDL"]
         self.maxTxAttempts = self.defaultValue["maxTxAttempts"]
@@ -78,26 +149,29 @@ class Window(object):
             if pid not in self.buffer:
                 if self._hasSpace():
                     self.buffer[pid] = self._genNewPktInfoFromPkt(pkt)
+                    self._indexPkt(pid)
 
-
-                    logging.info("included pkt {pid}. {bufferSize} pkts in buffer (size={cwnd})".format(pid=pid, bufferSize=self.bufferSize(), cwnd=self.cwnd))
+                    if self.tracer is not None:
+                        self.tracer.record(curTime, self.uid, pid, tracer.PKT_PUSHED, self.bufferSize())
 
                     # performance update
                     self.perfDict["maxWinCap"] = max(self.perfDict["maxWinCap"], self.bufferSize())
 
                 else: # no room for new packets
 
-                    logging.info("no room for pkt {pid}. {bufferSize} pkts in buffer (size={cwnd})".format(pid=pid, bufferSize=self.bufferSize(), cwnd=self.cwnd))
+                    if self.tracer is not None:
+                        self.tracer.record(curTime, self.uid, pid, tracer.PKT_NO_ROOM, self.bufferSize())
             else:
                 # TODO when we push another packet? Should we just ignore it?
                 # self.buffer[pid].txAttempts += 1
                 # self.buffer[pid].isFlying = True
 
-                logging.debug("pkt {pid} already in buffer. What happened?".format(pid=pid))
+                if self.tracer is not None:
+                    self.tracer.record(curTime, self.uid, pid, tracer.PKT_DUPLICATED)
         
         return
     
-    def ACKPkts_SACK(self, SACKPidList):
+    def ACKPkts_SACK(self, SACKPidList, curTime=-1):
         if not SACKPidList: # nothing to do
             return 
 
@@ -106,11 +180,12 @@ class Window(object):
                 self.buffer.pop(pid, None)
                 # add performance counting related codes
 
-                logging.info("SACK: ACK pkt {pid}".format(pid=pid))
+                if self.tracer is not None:
+                    self.tracer.record(curTime, self.uid, pid, tracer.ACK_SACK)
             
         return
     
-    def ACKPkts_LC(self, LCPidList):       
+    def ACKPkts_LC(self, LCPidList, curTime=-1):       
         if isinstance(LCPidList, int):
             LCPidList = [LCPidList]
         
@@ -126,53 +201,77 @@ class Window(object):
                 self.buffer.pop(pid, None)
                 # add performance counting related codes
 
-                logging.info("LC: ACK pkt {pid}".format(pid=pid))
+                if self.tracer is not None:
+                    self.tracer.record(curTime, self.uid, pid, tracer.ACK_LC, LCPid)
     
+    def _indexPkt(self, pid):
+        """add pid to the timer indexes, after it entered the buffer or was retransmitted"""
+        self.txTimeHeap.push(pid)
+        if self.buffer[pid].txAttempts == 1:
+            self.genTimeHeap.push(pid)
+        if self.maxTxAttempts > -1 and self.buffer[pid].txAttempts >= self.maxTxAttempts:
+            self.exhaustedPids.append(pid)
+
     def cleanBuffer(self, curTime=-1):
         # wipe out packets that exceed maxTxAttempts and/or maxPktTxDDL
         
         if self.maxTxAttempts > -1:
-            pktsToConsider = set(self.buffer.keys())
-            for pid in pktsToConsider:
-                if self.buffer[pid].txAttempts >= self.maxTxAttempts:
-                    self.buffer.pop(pid, None)
+            for pid in self.exhaustedPids:
+                if pid in self.buffer:
+                    if self.tracer is not None:
+                        self.tracer.record(curTime, self.uid, pid, tracer.DROP_MAX_TX, self.buffer[pid].txAttempts)
 
-                    logging.info("Pkt {pid} exceeds max Tx attempts ({txAttempts} >= {maxTxAttempts}) Give up".format(
-                        pid=pid, txAttempts=self.buffer[pid].txAttempts , maxTxAttempts=self.maxTxAttempts
-                    ))
+                    self.buffer.pop(pid, None)
+            self.exhaustedPids = []
         
         if self.maxPktTxDDL > -1 and curTime > -1:
             timeDDL = curTime - self.maxPktTxDDL
-            pktsToConsider = set(self.buffer.keys())
-            for pid in pktsToConsider:
-                if self.buffer[pid].genTime < timeDDL:
-                    self.buffer.pop(pid, None)
+            for pid in self.genTimeHeap.popExpired(timeDDL):
+                if self.tracer is not None:
+                    self.tracer.record(curTime, self.uid, pid, tracer.DROP_DDL, curTime-self.buffer[pid].initTxTime)
 
-                    logging.info("Pkt {pid} exceeds max queuing delay ({delay} >= {maxPktTxDDL}) Give up".format(
-                        pid=pid, delay=curTime-self.buffer[pid].initTxTime, maxPktTxDDL=self.maxPktTxDDL
-                    ))
+                self.buffer.pop(pid, None)
 
     def getRetransPkts(self, curTime, RTO=-1):
         # clean packets in buffer
         self.cleanBuffer(curTime)
 
         pktList = []
-        # search for packets that exceeds RTO
-        for pid in self.buffer:
-            timeDDL = curTime - RTO
-            if self.buffer[pid].txTime <= timeDDL:
+        # packets that exceed RTO
+        timeDDL = curTime - RTO
+        for pid in self.txTimeHeap.popExpired(timeDDL, inclusive=True):
 
-                logging.info("Pkt {pid} exceeds RTO ({retention} >= {RTO}) Retransmitted".format(
-                    pid=pid, retention=curTime-self.buffer[pid].txTime, RTO=RTO
-                ))
+            if self.tracer is not None:
+                self.tracer.record(curTime, self.uid, pid, tracer.RETRANS, curTime-self.buffer[pid].txTime)
 
-                pktList.append(self.buffer[pid].toPacket())
+            pktList.append(self.buffer[pid].toPacket())
 
-                self.buffer[pid].txTime = curTime
-                self.buffer[pid].txAttempts += 1
+            self.buffer[pid].txTime = curTime
+            self.buffer[pid].txAttempts += 1
+            self._indexPkt(pid)
         
         return pktList
     
+    def nextRetransTime(self, curTime, RTO=-1):
+        """
+        The earliest time > curTime at which getRetransPkts(time, RTO) may drop or retransmit a packet.
+        sys.maxsize if the buffer is empty.
+        """
+        if self.maxTxAttempts > -1 and any(pid in self.buffer for pid in self.exhaustedPids):
+            return curTime + 1
+
+        wakeTime = sys.maxsize
+        earliestTxTime = self.txTimeHeap.earliest()
+        if earliestTxTime is not None:
+            # floor instead of ceil: waking up one tick early is harmless
+            wakeTime = math.floor(earliestTxTime + RTO)
+        if self.maxPktTxDDL > -1:
+            earliestGenTime = self.genTimeHeap.earliest()
+            if earliestGenTime is not None:
+                wakeTime = min(wakeTime, earliestGenTime + self.maxPktTxDDL + 1)
+        
+        return max(curTime + 1, wakeTime)
+
     def _genNewPktInfoFromPkt(self, pkt):
         return PacketInfo(
             pid=pkt.pid, 
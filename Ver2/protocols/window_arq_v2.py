@@ -5,17 +5,9 @@ This implementation targets at some messy confusing design.
 from protocols.baseTransportLayerProtocol import BaseTransportLayerProtocol
 from packet import Packet, PacketInfo
 from protocols.utils import Window
+import tracer
 
 import sys
-import logging
-
-# logging.debug('This is a debug message')
-# logging.info('This is an info message')
-# logging.warning('This is a warning message')
-# logging.error('This is an error message')
-# logging.critical('This is a critical message')
-
-# logging.exception("Exception occurred") # when recording exception info
 
 
 
@@ -32,29 +24,18 @@ class Window_ARQ(BaseTransportLayerProtocol):
     2. not ACKed after timeout
 
     Once a packet needs retransmission, it is pushed at the top of the transmission buffer (txBuffer)
+
+    Packet events (push, ACK, drop, retransmission) are recorded to the tracer.Tracer given as param "tracer",
+    see tracer.py. Nothing is recorded by default.
     """
 
     requiredKeys={"cwnd", "ACKMode"}
-    optionalKeys={"maxTxAttempts":-1, "timeout":30, "maxPktTxDDL":-1}
+    optionalKeys={"maxTxAttempts":-1, "timeout":30, "maxPktTxDDL":-1, "tracer":None}
 
     def __init__(self, suid, duid, params, txBufferLen=None, verbose=False):
         super(Window_ARQ, self).__init__(suid=suid, duid=duid, params={}, txBufferLen=txBufferLen)
 
 
-
-        if verbose:
-            logLevel = logging.DEBUG
-        else:
-            logLevel = logging.WARNING
-
-        logging.basicConfig(
-            format="%(asctime)s %(name)s:%(levelname)s:%(message)s", 
-            level=logLevel,
-            handlers=[
-                logging.FileHandler("host-"+str(self.suid)+".log"),
-                logging.StreamHandler()
-            ])
-
         self.timeout = -1
         self.maxTxAttempts = -1
         self.maxPktTxDDL = -1
@@ -74,7 +55,7 @@ class Window_ARQ(BaseTransportLayerProtocol):
 
 
         # initialize the congestion window 
-        self.window = Window(uid=suid, cwnd=self.cwnd, maxPktTxDDL=self.maxPidSent, maxTxAttempts=self.maxTxAttempts, logLevel=logLevel)
+        self.window = Window(uid=suid, cwnd=self.cwnd, maxPktTxDDL=self.maxPidSent, maxTxAttempts=self.maxTxAttempts, tracer=self.tracer)
 
         # performance 
         self.perfDict["newPktsSent"] = 0
@@ -84,7 +65,8 @@ class Window_ARQ(BaseTransportLayerProtocol):
     def ticking(self, ACKPktList):
         self.time += 1
 
-        logging.info("host-{uid}@{time}: before processing, {windowSize} pkts in cwnd".format(uid=self.suid, time=self.time, windowSize=self.window.bufferSize()))
+        if self.tracer is not None:
+            self.tracer.record(self.time, self.suid, -1, tracer.TICK, self.window.bufferSize())
 
         # process ACK packets
         self._handleACK(ACKPktList)
@@ -128,9 +110,9 @@ class Window_ARQ(BaseTransportLayerProtocol):
                 self._timeoutUpdate()
 
         if self.ACKMode == "SACK":
-            self.window.ACKPkts_SACK(SACKPidList=ACKPidList)
+            self.window.ACKPkts_SACK(SACKPidList=ACKPidList, curTime=self.time)
         elif self.ACKMode == "LC":
-            self.window.ACKPkts_LC(LCPidList=ACKPidList)
+            self.window.ACKPkts_LC(LCPidList=ACKPidList, curTime=self.time)
     
 
     def _getNewPktsToSend(self):
@@ -155,6 +137,13 @@ class Window_ARQ(BaseTransportLayerProtocol):
 
         return newPktList
 
+    def nextWakeTime(self):
+        if self.verbose:
+            return self.time + 1
+        if self.txBuffer and self.window.availSpace() > 0:
+            return self.time + 1
+        return self.window.nextRetransTime(curTime=self.time, RTO=self.timeout)
+
     def clientSidePerf(self):
         # generate performance report
         self.perfDict["maxWin"] = self.window.perfDict["maxWinCap"]
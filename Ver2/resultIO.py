@@ -0,0 +1,230 @@
+"""
+Helpers to store simulation results.
+"""
+import os
+import glob
+import json
+import shutil
+import hashlib
+import tempfile
+import pickle as pkl
+import numpy as np
+
+
+def dumpPklAtomic(data, filename):
+    """
+    pickle data to filename through a temporary file in the same directory, then rename it.
+    Readers (and parallel runs writing the same file) never see a partially written file.
+    """
+    dirname = os.path.dirname(os.path.abspath(filename))
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmpFilename = tempfile.mkstemp(dir=dirname, prefix=".tmp_", suffix=".pkl")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pkl.dump(data, f, protocol=pkl.HIGHEST_PROTOCOL)
+        os.replace(tmpFilename, filename)
+    except BaseException:
+        os.remove(tmpFilename)
+        raise
+
+
+# modules whose code determines the outcome of a simulation
+simulatorSourceFiles = ["application.py", "channel.py", "channelBuffer.py", "packet.py", "transportLayer.py",
+    "eventScheduler.py", "RL_Brain.py", os.path.join("protocols", "*.py")]
+
+
+def codeVersion(extraFiles=[]):
+    """hash of the source code of the simulator (and of extraFiles, e.g. the driver script)"""
+    srcDir = os.path.dirname(os.path.abspath(__file__))
+    filenames = []
+    for pattern in simulatorSourceFiles:
+        filenames += sorted(glob.glob(os.path.join(srcDir, pattern)))
+    filenames += list(extraFiles)
+
+    h = hashlib.sha256()
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            h.update(os.path.basename(filename).encode())
+            h.update(f.read())
+    return h.hexdigest()
+
+
+class ResultCache(object):
+    """
+    Content addressed cache of result files. 
+    A result is stored under the hash of the full configuration that produced it (protocol, traffic, channel, 
+    simulation length, seed, code version ...), so it is only reused for the very same configuration.
+    The cache is bounded to maxBytes, the least recently used files are evicted first.
+
+    config: any json serializable dict, TypeError is raised for other values
+
+    Usage:
+        filename = cache.get(config)
+        if filename is None:
+            filename = cache.path(config)
+            ... write the result to filename (atomically) ...
+            cache.evict()
+    """
+
+    def __init__(self, cacheDir="resultCache", maxBytes=2*1024**3):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        os.makedirs(self.cacheDir, exist_ok=True)
+
+    def key(self, config):
+        def notSerializable(obj):
+            # the repr of an object (tracer, metricsSink, rng ...) holds its address, the key would never match again
+            raise TypeError("{} in the config of a cached result is not json serializable".format(type(obj).__name__))
+        configStr = json.dumps(config, sort_keys=True, default=notSerializable)
+        return hashlib.sha256(configStr.encode()).hexdigest()
+
+    def path(self, config):
+        return os.path.join(self.cacheDir, self.key(config) + ".pkl")
+
+    def get(self, config):
+        """return the filename of the cached result of config, None if not cached"""
+        filename = self.path(config)
+        try:
+            os.utime(filename) # mark as recently used
+        except FileNotFoundError:
+            return None
+        return filename
+
+    def evict(self):
+        """remove the least recently used files until the cache fits in maxBytes"""
+        entries = []
+        for filename in glob.glob(os.path.join(self.cacheDir, "*.pkl")):
+            try:
+                stat = os.stat(filename)
+            except FileNotFoundError: # removed by a parallel run
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filename))
+
+        totalBytes = sum(entry[1] for entry in entries)
+        for _, size, filename in sorted(entries):
+            if totalBytes <= self.maxBytes:
+                break
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            totalBytes -= size
+
+
+"""
+Columnar result format
+
+A result (nested dicts / lists, e.g. deliveredPktsPerSlot of SimulationEnvironment2.py) is stored as a directory 
+<name>.res:
+    meta.json   the structure, the scalars, the strings and the small lists
+    *.npy       each numeric series of at least arraySizeThresh values, as a typed contiguous array
+loadResult memory-maps the .npy files, so reading a few values of a result does not load its series.
+"""
+arraySizeThresh = 64
+
+
+def _isScalar(value):
+    return value is None or isinstance(value, (bool, int, float, str, np.generic))
+
+
+def _toJSONScalar(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _encodeKey(key):
+    """dict keys: scalars, or tuples of them (restored as tuples by _decodeKey)"""
+    if isinstance(key, tuple):
+        return {"__tuple__": [_encodeKey(item) for item in key]}
+    if not _isScalar(key):
+        raise TypeError("result dict keys must be scalars or tuples, got {}".format(type(key).__name__))
+    return _toJSONScalar(key)
+
+
+def _decodeKey(key):
+    if isinstance(key, dict):
+        return tuple(_decodeKey(item) for item in key["__tuple__"])
+    return key
+
+
+def saveResult(data, dirname):
+    """store data (dicts, lists, arrays, scalars) to the directory dirname atomically"""
+    dirname = os.path.abspath(dirname)
+    parentDir = os.path.dirname(dirname)
+    os.makedirs(parentDir, exist_ok=True)
+    tmpDirname = tempfile.mkdtemp(dir=parentDir, prefix=".tmp_")
+
+    arrayFilenames = set()
+
+    def encode(value, keyPath):
+        if isinstance(value, dict):
+            return {"__dict__": [[_encodeKey(key), encode(item, keyPath + [str(key)])] for key, item in value.items()]}
+        if _isScalar(value):
+            return _toJSONScalar(value)
+
+        try:
+            array = np.asarray(value)
+        except ValueError: # ragged
+            array = None
+        if array is not None and array.dtype.kind in "biuf" and array.ndim >= 1 and array.size >= arraySizeThresh:
+            filename = "".join(c if c.isalnum() or c in "-_" else "_" for c in ".".join(keyPath)) or "data"
+            while filename in arrayFilenames:
+                filename += "_"
+            arrayFilenames.add(filename)
+            np.save(os.path.join(tmpDirname, filename + ".npy"), np.ascontiguousarray(array))
+            return {"__array__": filename + ".npy"}
+
+        if array is not None and array.dtype.kind in "biuf":
+            return array.tolist()
+        if all(_isScalar(item) for item in value):
+            return [_toJSONScalar(item) for item in value]
+        return {"__list__": [encode(item, keyPath + [str(idx)]) for idx, item in enumerate(value)]}
+
+    try:
+        with open(os.path.join(tmpDirname, "meta.json"), 'w') as f:
+            json.dump(encode(data, []), f)
+
+        # swap in the new directory
+        oldDirname = None
+        if os.path.exists(dirname):
+            oldDirname = tempfile.mkdtemp(dir=parentDir, prefix=".old_")
+            os.rmdir(oldDirname)
+            os.replace(dirname, oldDirname)
+        os.replace(tmpDirname, dirname)
+        if oldDirname:
+            shutil.rmtree(oldDirname)
+    except BaseException:
+        shutil.rmtree(tmpDirname, ignore_errors=True)
+        raise
+
+
+def loadResult(path, mmap=True):
+    """
+    load a result stored by saveResult (a .res directory), series are np.memmap unless mmap=False.
+    Pickled results (.pkl) are loaded as they are.
+    """
+    if not os.path.isdir(path):
+        with open(path, 'rb') as f:
+            return pkl.load(f)
+
+    def decode(node):
+        if isinstance(node, dict):
+            if "__dict__" in node:
+                return {_decodeKey(key): decode(item) for key, item in node["__dict__"]}
+            if "__list__" in node:
+                return [decode(item) for item in node["__list__"]]
+            if "__array__" in node:
+                return np.load(os.path.join(path, node["__array__"]), mmap_mode='r' if mmap else None)
+        return node
+
+    with open(os.path.join(path, "meta.json"), 'r') as f:
+        return decode(json.load(f))
+
+
+def isResult(filename):
+    """whether filename is a stored result (.res directory or .pkl file)"""
+    return filename.endswith(".res") or filename.endswith(".pkl")
+
+
+def resultName(filename):
+    """name of a result without extension"""
+    return filename[:-4] if isResult(filename) else filename
@@ -1,18 +1,17 @@
 import matplotlib.pyplot as plt
-import pickle as pkl
 import numpy as np
 import sys
 from tabulate import tabulate
+from resultIO import loadResult, isResult
 
 
 if len(sys.argv) > 1:
-    if isinstance(sys.argv[1], str) and sys.argv[1].endswith(".pkl"):
-        datafileName = sys.argv[1]
+    if isinstance(sys.argv[1], str) and isResult(sys.argv[1].rstrip("/")):
+        datafileName = sys.argv[1].rstrip("/")
 else:
-    datafileName = 'perfData2.pkl'
+    datafileName = 'perfData2.res'
 
-with open(datafileName, 'rb') as handle:
-    data = pkl.load(handle)
+data = loadResult(datafileName)
 
 generalData = data["general"]
 header = data["header"]
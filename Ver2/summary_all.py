@@ -1,24 +1,23 @@
-import pickle as pkl
 import os, sys
 import numpy as np
+from resultIO import loadResult, isResult, resultName
 
 
 rstPath = sys.argv[1]
 pklFileList = os.listdir(rstPath)
 
-pklFileList = list(filter(lambda filename: filename[-3:] == "pkl", pklFileList))
+pklFileList = list(filter(isResult, pklFileList))
 
 betaFilenameDict = {}           # for overall MCP performance
 
 for filename in pklFileList:
-    beta1 = float(filename[:-4].split("_")[-2])
-    beta2 = float(filename[:-4].split("_")[-1])
-
-    with open(os.path.join(rstPath, filename), 'rb') as handle:
-        data = pkl.load(handle)
-        generalData = data["general"]
-        header = data["header"]
-        utilityParam = data["utilityParam"]
+    beta1 = float(resultName(filename).split("_")[-2])
+    beta2 = float(resultName(filename).split("_")[-1])
+
+    data = loadResult(os.path.join(rstPath, filename))
+    generalData = data["general"]
+    header = data["header"]
+    utilityParam = data["utilityParam"]
 
     for item in generalData:
         if item[0] == 'MCP':
@@ -0,0 +1,72 @@
+"""
+Binary event trace of the transport protocols (protocols.utils.Window and Window_ARQ).
+
+Tracing is off unless a Tracer is given to the protocol (transport param "tracer"). When off, each trace point is
+a single `if self.tracer is not None` check, no string is formatted.
+When on, each event is one record (tick, flow, pid, event, value) of int64, appended to a buffered series of a
+ChunkedFileSink (see metricsSink.py), i.e. <dirname>/<name>.bin. Several flows can share one tracer, flow is the
+uid of the sender.
+
+Usage:
+    trace = Tracer("results/run1")
+    client = EchoClient(..., protocolName="window arq", transportParam={..., "tracer": trace})
+    ...
+    trace.close()
+    records = openTrace("results/run1/trace.bin") # np.memmap of shape (n, 5)
+    for line in formatTrace(records):
+        print(line)
+"""
+import numpy as np
+
+from metricsSink import ChunkedFileSink, openSeries
+
+
+# event types, and what the value column holds
+TICK = 0            # value: pkts in window before processing the tick. pid -1
+PKT_PUSHED = 1      # value: pkts in window after the push
+PKT_NO_ROOM = 2     # value: pkts in window
+PKT_DUPLICATED = 3  # pkt already in window. value: 0
+ACK_SACK = 4        # value: 0
+ACK_LC = 5          # value: the cumulative ACK pid
+DROP_MAX_TX = 6     # value: txAttempts
+DROP_DDL = 7        # value: ticks since the first transmission
+RETRANS = 8         # value: ticks since the last transmission
+
+eventNames = {
+    TICK: "TICK",
+    PKT_PUSHED: "PKT_PUSHED",
+    PKT_NO_ROOM: "PKT_NO_ROOM",
+    PKT_DUPLICATED: "PKT_DUPLICATED",
+    ACK_SACK: "ACK_SACK",
+    ACK_LC: "ACK_LC",
+    DROP_MAX_TX: "DROP_MAX_TX",
+    DROP_DDL: "DROP_DDL",
+    RETRANS: "RETRANS",
+}
+
+TICK_COL, FLOW_COL, PID_COL, EVENT_COL, VALUE_COL = range(5)
+
+
+class Tracer(object):
+    def __init__(self, dirname, name="trace", chunkSize=65536):
+        self.sink = ChunkedFileSink(dirname, chunkSize=chunkSize)
+        self.records = self.sink.series(name, np.int64, numColumns=5)
+
+    def record(self, tick, flow, pid, event, value=0):
+        self.records.append((tick, flow, pid, event, value))
+
+    def close(self):
+        """write the buffered records to the file"""
+        self.sink.close()
+
+
+def openTrace(filename):
+    """memory-map a trace written by Tracer. Returns an int64 array of shape (n, 5), columns *_COL"""
+    return openSeries(filename).reshape(-1, 5)
+
+
+def formatTrace(records):
+    """human readable lines of trace records"""
+    for tick, flow, pid, event, value in np.asarray(records).tolist():
+        yield "host-{flow}@{tick}: {event} pid={pid} value={value}".format(
+            flow=flow, tick=tick, event=eventNames.get(event, event), pid=pid, value=value)
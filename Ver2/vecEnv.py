@@ -0,0 +1,219 @@
+"""
+Lockstep vectorized environments for MCP training.
+
+VecEnv advances numEnvs independent copies of a scenario (channel, background clients, MCP flows) tick by tick, in
+the order of the tick loop (see eventScheduler.py). All MCP flows share one DQN through one RL_Brain.TrainScheduler
+(MCP transport param "trainScheduler"), so the DQN collects experiences numEnvs times faster per tick.
+In each tick the clients of all copies stop between EchoClient.tickBegin and EchoClient.tickEnd (the MCP flows
+between MCP.tickBegin and MCP.tickEnd), and the decisions on the timeout packets of the MCP flows are made in one
+batched DQN.chooseActions call. The TrainScheduler ends the tick once per lockstep
+tick, i.e. "tick" and "budget" train modes spend the same learning effort per tick whatever numEnvs is.
+
+Usage:
+    trainScheduler = TrainScheduler(MCP.newBrain(), mode="tick", stepsPerTick=1)
+    vecEnv = VecEnv([makeMCPScenario(trainScheduler, rng=np.random.RandomState(envIdx)) for envIdx in range(8)],
+        trainScheduler)
+    vecEnv.run(startTime=1, endTime=5000)
+    vecEnv.perfDict["convergeAt"], vecEnv.perfDict["convergeTime"]
+
+runScenario runs one copy of the scenario with EventScheduler, as the single flow drivers (TestMCP*.py) do.
+"""
+import sys
+import time
+import numpy as np
+
+from application import EchoClient, EchoServer
+from channel import SingleModeChannel
+from eventScheduler import EventScheduler, routeByDestination
+from packet import Packet, packetPool
+
+
+def makeMCPScenario(trainScheduler, transportParam={}, channelParam=None, rng=None, protocolName="mcp",
+    ACKMode="SACK", rngs=None):
+    """
+    the scenario of SimulationEnvironment2.py: 4 UDP flows as background traffic and one flow of the protocol under
+    test, by default MCP using the DQN of trainScheduler (None for a DQN of its own). The channel is filled with
+    background packets.
+    protocolName, ACKMode: protocol under test (see TransportLayerHelper) and ACK mode of its server. transportParam
+        completes the default MCP params for "mcp", and is the whole param dict of the other protocols
+    rngs: per-component RNG streams (see ensemble.RNGStreams), instead of rng shared by all components
+    Returns (clientList, serverList, channel, rng), rng draws the client order of each tick
+    """
+    if rngs is not None:
+        getRNG = rngs.get
+    else:
+        rng = rng if rng is not None else np.random
+        getRNG = lambda name: rng
+    channelParam = channelParam if channelParam else {"processRate":3, "bufferSize":300, "rtt":100, "pktDropProb":0.1}
+    channel = SingleModeChannel(**channelParam, verbose=False, rng=getRNG("channel"))
+
+    env_clients, env_servers = [], []
+    for clientId in range(1, 4+1):
+        env_clients.append(EchoClient(clientId=clientId, serverId=10+clientId,
+            protocolName="UDP", transportParam={},
+            trafficMode="periodic", trafficParam={"period":1, "pktsPerPeriod":1},
+            verbose=False, rng=getRNG("client{}".format(clientId))))
+        env_servers.append(EchoServer(serverId=10+clientId, ACKMode=None, verbose=False))
+
+    if protocolName.lower() == "mcp":
+        param = {"maxTxAttempts":-1, "timeout":30, "maxPktTxDDL":-1, "alpha":2, "beta1":0.8, "beta2":0.2,
+            "gamma":0.9, "learnRetransmissionOnly": True}
+        param.update(transportParam)
+        param["trainScheduler"] = trainScheduler
+        if rngs is not None:
+            param.setdefault("rng", rngs.get("mcp"))
+    else:
+        param = dict(transportParam)
+    client = EchoClient(clientId=101, serverId=111,
+        protocolName=protocolName, transportParam=param,
+        trafficMode="periodic", trafficParam={"period":1, "pktsPerPeriod":1},
+        verbose=False, rng=getRNG("client101"))
+    server = EchoServer(serverId=111, ACKMode=ACKMode, verbose=False)
+
+    clientList = env_clients + [client]
+    serverList = env_servers + [server]
+    for c, s in zip(clientList, serverList):
+        c.transportObj.instance.time = -1
+        c.pid = 0
+        c.time = -1
+        s.time = -1
+
+    fillRNG = getRNG("fill")
+    while not channel.isFull(): # fill the channel with environment packets
+        packetList_enCh = []
+        for clientId in fillRNG.permutation(len(env_clients)):
+            packetList_enCh += env_clients[clientId].ticking([])
+        channel.putPackets(packetList_enCh)
+    channel.time = 0
+
+    return clientList, serverList, channel, getRNG("scheduler")
+
+
+def scenarioPerf(clientList, serverList):
+    """performance of the MCP flow (the last client) of a scenario of makeMCPScenario"""
+    client, server = clientList[-1], serverList[-1]
+    protocol = client.transportObj.instance
+    _, deliveryRate, avgDelay = server.serverSidePerf(client.getPktGen())
+    util = protocol.calcUtility(deliveryRate=deliveryRate, avgDelay=avgDelay,
+        alpha=protocol.alpha, beta1=protocol.beta1, beta2=protocol.beta2)
+    return {"deliveryRate": deliveryRate, "avgDelay": avgDelay, "utility": util,
+        "convergeAt": protocol.perfDict["convergeAt"]}
+
+
+def runScenario(simulationPeriod, transportParam={}, seed=1):
+    """
+    seed the global numpy RNG and the torch one (DQN weights), then run makeMCPScenario with a DQN of its own for
+    simulationPeriod ticks.
+    Returns (the MCP instance, scenarioPerf with the run time in "time")
+    """
+    np.random.seed(seed)
+    if transportParam.get("policy") is None: # evaluation runs do not import torch
+        import torch
+        torch.manual_seed(seed)
+    clientList, serverList, channel, rng = makeMCPScenario(None, transportParam=transportParam, rng=np.random.RandomState(seed))
+
+    startTime = time.perf_counter()
+    EventScheduler(clientList, serverList, channel, rng=rng).run(startTime=1, endTime=simulationPeriod)
+    perf = scenarioPerf(clientList, serverList)
+    perf["time"] = time.perf_counter() - startTime
+    return clientList[-1].transportObj.instance, perf
+
+
+def perCall(func, args, repeat=2000):
+    """microseconds per call of func(*args)"""
+    startTime = time.perf_counter()
+    for _ in range(repeat):
+        func(*args)
+    return 1e6 * (time.perf_counter() - startTime) / repeat
+
+
+class VecEnv(object):
+    """
+    envs: list of (clientList, serverList, channel, rng), see makeMCPScenario. rng draws the client order of each tick
+    trainScheduler: the RL_Brain.TrainScheduler shared by the MCP flows of the envs (MCP param "trainScheduler")
+    """
+
+    def __init__(self, envs, trainScheduler):
+        self.envs = envs
+        self.trainScheduler = trainScheduler
+        self.brain = trainScheduler.brain
+
+        # client indexes of the MCP flows sharing trainScheduler in each env, their decisions are batched.
+        # The other MCP flows (own DQN, evaluation of a policy) tick as any client with their own brain
+        self.mcpIdxs = []
+        for clientList, _, _, _ in self.envs:
+            self.mcpIdxs.append([idx for idx, client in enumerate(clientList)
+                if getattr(client.transportObj.instance, "trainScheduler", None) is trainScheduler])
+
+        self.time = 0
+        self.packetList_deCh = [[] for _ in self.envs]
+
+        # performance check
+        self.perfDict = {"ticks": 0, "decisions": 0, "runTime": 0,
+            "convergeAt": sys.maxsize,  # first tick at which the shared DQN is converged
+            "convergeTime": -1}         # seconds of run() until then
+
+    def run(self, startTime, endTime):
+        """simulate tick startTime to tick endTime (both included) in all envs"""
+        runStartTime = time.perf_counter()
+        for tick in range(startTime, endTime+1):
+            self.step(tick)
+            if self.brain.isConverge and tick < self.perfDict["convergeAt"]:
+                self.perfDict["convergeAt"] = tick
+                self.perfDict["convergeTime"] = self.perfDict["runTime"] + time.perf_counter() - runStartTime
+        self.perfDict["runTime"] += time.perf_counter() - runStartTime
+
+    def step(self, tick):
+        self.time = tick
+        self.perfDict["ticks"] += 1
+
+        # step 1 of each env, and the first half of the MCP flows
+        ACKLists, ACKByDuids, clientOrders, statesPerEnv = [], [], [], []
+        for envIdx, (clientList, serverList, channel, rng) in enumerate(self.envs):
+            deChByDuid = routeByDestination(self.packetList_deCh[envIdx])
+            ACKPacketList = []
+            for server in serverList:
+                ACKPacketList += server.ticking(deChByDuid.get(server.uid, []))
+            packetPool.releaseList([pkt for pkt in self.packetList_deCh[envIdx] if pkt.packetType != Packet.ACK])
+
+            ACKByDuid = routeByDestination(ACKPacketList)
+            ACKLists.append(ACKPacketList)
+            ACKByDuids.append(ACKByDuid)
+            clientOrder = rng.permutation(len(clientList))
+            clientOrders.append(clientOrder)
+
+            # the traffic of all clients in the order of the tick loop, the MCP flows up to their decisions
+            envStates = {} # client idx -> states of its timeout packets
+            for idx in clientOrder:
+                client = clientList[idx]
+                client.tickBegin()
+                if idx in self.mcpIdxs[envIdx]:
+                    envStates[idx] = client.transportObj.instance.tickBegin(ACKByDuid.get(client.uid, []))
+            statesPerEnv.append(envStates)
+
+        # decisions of all the timeout packets in one forward pass
+        allStates = [state for envStates in statesPerEnv for states in envStates.values() for state in states]
+        actions = self.brain.chooseActions(states=allStates) if allStates else []
+        self.perfDict["decisions"] += len(allStates)
+
+        # step 2 to 4 of each env, the MCP flows end their ticks with their actions
+        actionIdx = 0
+        for envIdx, (clientList, serverList, channel, rng) in enumerate(self.envs):
+            mcpActions = {}
+            for idx, states in statesPerEnv[envIdx].items():
+                mcpActions[idx] = actions[actionIdx:actionIdx+len(states)]
+                actionIdx += len(states)
+
+            packetList_enCh = []
+            for idx in clientOrders[envIdx]:
+                client = clientList[idx]
+                if idx in mcpActions:
+                    packetList_enCh += client.transportObj.instance.tickEnd(mcpActions[idx])
+                else:
+                    packetList_enCh += client.tickEnd(ACKByDuids[envIdx].get(client.uid, []))
+            packetPool.releaseList(ACKLists[envIdx])
+
+            packetPool.releaseList(channel.putPackets(packetList_enCh))
+            self.packetList_deCh[envIdx] = channel.getPackets()
+
+        self.trainScheduler.tickEnded()